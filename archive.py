@@ -0,0 +1,143 @@
+"""Append-only archive of raw pages fetched by the scrapers.
+
+Every page body is zlib compressed and appended to ``pages.dat``. A fixed width
+index (``pages.idx``) maps a digest of the url to the offset and length of the
+record so pages can be read back without touching the network. Pages can be put
+from several threads at once, e.g. footy wire pages fetched on a worker thread.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+from logger import logger
+
+# url digest (16 bytes), offset into the data file, compressed length
+INDEX_ENTRY = struct.Struct("<16sQI")
+
+
+def url_digest(url: str) -> bytes:
+    """Digest used as the index key for a url
+
+    Args:
+        url (str): Absolute url of the page
+
+    Returns:
+        bytes: 16 byte blake2b digest of the url
+    """
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+
+
+class PageArchive():
+    def __init__(self, directory: str = "page_archive", compression_level: int = 6):
+        self.directory = directory
+        self.compression_level = compression_level
+        self._data_path = os.path.join(directory, "pages.dat")
+        self._index_path = os.path.join(directory, "pages.idx")
+        self._data_fd: Optional[int] = None
+        self._index_file = None
+        self._index: Dict[bytes, Tuple[int, int]] = {}
+        self._write_lock = threading.Lock() # keeps each record's offset, data and index entry together
+
+    def open(self) -> "PageArchive":
+        """Open the archive files and load the index through a memory map
+
+        Returns:
+            PageArchive: The opened archive
+        """
+        if self._data_fd is not None:
+            return self
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._data_fd = os.open(self._data_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._index_file = open(self._index_path, "ab")
+        self._load_index()
+        logger.info(f"Page archive opened with {len(self._index)} pages")
+
+        return self
+
+    def close(self) -> None:
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+        if self._data_fd is not None:
+            os.close(self._data_fd)
+            self._data_fd = None
+
+    def __enter__(self) -> "PageArchive":
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, url: str) -> bool:
+        return url_digest(url) in self._index
+
+    def _load_index(self) -> None:
+        """Read every entry of the index file. Later entries for the same url win,
+        so a re-fetched page replaces the older copy without rewriting the archive.
+        """
+        self._index.clear()
+        size = os.path.getsize(self._index_path)
+        usable = size - size % INDEX_ENTRY.size # ignore a partially written trailing entry
+        if usable == 0:
+            return
+
+        with open(self._index_path, "rb") as index_file:
+            with mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index_map:
+                for digest, offset, length in INDEX_ENTRY.iter_unpack(index_map[:usable]):
+                    self._index[digest] = (offset, length)
+
+    def get(self, url: str) -> Optional[str]:
+        """Read an archived page
+
+        Args:
+            url (str): Absolute url of the page
+
+        Returns:
+            Optional[str]: The page body, or None if the url has not been archived
+        """
+        entry = self._index.get(url_digest(url))
+        if entry is None:
+            return None
+
+        offset, length = entry
+        return zlib.decompress(os.pread(self._data_fd, length, offset)).decode("utf-8")
+
+    def pages(self) -> Iterator[str]:
+        """Iterate over the body of every archived page, in the order they were archived"""
+        for offset, length in sorted(self._index.values()):
+            yield zlib.decompress(os.pread(self._data_fd, length, offset)).decode("utf-8")
+
+    def put(self, url: str, text: str) -> bool:
+        """Append a page to the archive. Pages identical to the archived copy are skipped.
+
+        Args:
+            url (str): Absolute url of the page
+            text (str): Page body
+
+        Returns:
+            bool: True if the page was written, False if it was already archived
+        """
+        if self.get(url) == text:
+            return False
+
+        record = zlib.compress(text.encode("utf-8"), self.compression_level)
+        digest = url_digest(url)
+        with self._write_lock:
+            offset = os.lseek(self._data_fd, 0, os.SEEK_END)
+            os.write(self._data_fd, record)
+
+            # index entry is written after the data so a crash never leaves an entry pointing at nothing
+            self._index_file.write(INDEX_ENTRY.pack(digest, offset, len(record)))
+            self._index_file.flush()
+            self._index[digest] = (offset, len(record))
+
+        return True
@@ -0,0 +1,235 @@
+"""Walk-forward backtest of the result prediction model.
+
+Every round is a fold: the model is trained on every game dated before the round's
+first game and predicts the round's games, walking forward through the stored history.
+A postponed game stays in its round's fold, and since training is cut off by date
+rather than by round it is never trained on by a round played before it. The games
+predicted by a fold get their features from the ratings and form as they stood when
+the round started, as a real prediction before the round would. Folds run in
+a process pool. The feature matrix is built once, in date order, and saved to a
+temporary .npy file which every worker memory maps read only, so it is never copied
+into the workers and each fold trains on a slice of the shared rows.
+
+    python cli.py backtest --start-year 2000 --end-year 2024
+"""
+
+import datetime
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from logger import logger
+from model import FEATURE_NAMES, GameFeatures, GameResult, as_date, build_features, build_features_as_of, fit_model
+from repositories.game_repository import GameRepository
+
+# columns of the shared matrix after the features, followed by the features as of the start of each game's round
+HOME_RESULT, MARGIN, YEAR = range(len(FEATURE_NAMES), len(FEATURE_NAMES) + 3)
+ROUND_START_FEATURES = slice(YEAR + 1, YEAR + 1 + len(FEATURE_NAMES))
+
+# (first training row, end of the training rows, rows of the round's games)
+Fold = Tuple[int, int, np.ndarray]
+
+_matrix: Optional[np.ndarray] = None # the shared matrix, memory mapped by each worker
+
+
+def _attach(path: str) -> None:
+    global _matrix
+    _matrix = np.load(path, mmap_mode="r")
+
+
+def _run_folds(folds: List[Fold], ridge: float) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Train and predict a batch of folds against the shared matrix
+
+    Returns:
+        List[Tuple[np.ndarray, np.ndarray, np.ndarray]]: Test rows, win probabilities and margins of each fold
+    """
+    features = len(FEATURE_NAMES)
+    predictions = []
+    for train_start, train_end, test_rows in folds:
+        train = _matrix[train_start:train_end]
+        model = fit_model(train[:, :features], train[:, HOME_RESULT], train[:, MARGIN], ridge=ridge)
+        probability, margin = model.predict(np.asarray(_matrix[test_rows, ROUND_START_FEATURES]))
+        predictions.append((test_rows, probability, margin))
+
+    return predictions
+
+
+async def load_results(game_repository: GameRepository, end_year: Optional[int] = None) -> List[GameResult]:
+    """Read every completed game up to a season
+
+    Args:
+        game_repository (GameRepository): Repository the games are read from
+        end_year (Optional[int], optional): Last season read. Defaults to every season.
+
+    Returns:
+        List[GameResult]: The games
+    """
+    rows = await game_repository.get_results(end_year)
+    return [GameResult(*row) for row in rows]
+
+
+def round_start_dates(games: Sequence[GameResult]) -> np.ndarray:
+    """Ordinal of the date of the first game of each game's round"""
+    dates = [as_date(game.date).toordinal() for game in games]
+    starts: Dict[Tuple[int, str], int] = {}
+    for game, date in zip(games, dates):
+        key = (game.year, game.round_id)
+        starts[key] = min(starts.get(key, date), date)
+
+    return np.array([starts[(game.year, game.round_id)] for game in games])
+
+
+def walk_forward_folds(
+        game_features: GameFeatures,
+        start_year: int,
+        end_year: int,
+        train_seasons: Optional[int] = None,
+        min_train_games: int = 200,
+) -> List[Fold]:
+    """Split the games into one fold per round, each trained on the games dated before the round starts
+
+    Args:
+        game_features (GameFeatures): Games in date order with their features
+        start_year (int): First season predicted
+        end_year (int): Last season predicted
+        train_seasons (Optional[int], optional): Only train on this many seasons before the one
+        predicted. Defaults to every earlier season.
+        min_train_games (int, optional): Rounds with fewer games to train on are skipped. Defaults to 200.
+
+    Returns:
+        List[Fold]: The folds, over the rows of the games in date order
+    """
+    games = game_features.games
+    rounds: Dict[Tuple[int, str], int] = {}
+    fold_ids = np.array([rounds.setdefault((game.year, game.round_id), len(rounds)) for game in games])
+    dates = np.array([as_date(game.date).toordinal() for game in games])
+    round_starts = round_start_dates(games)
+    years = np.array([game.year for game in games])
+
+    # rows of each round, a postponed game keeps its round even when later rounds were played before it
+    order = np.argsort(fold_ids, kind="stable")
+    boundaries = np.flatnonzero(np.diff(fold_ids[order])) + 1
+
+    folds = []
+    for test_rows in np.split(order, boundaries):
+        year = years[test_rows[0]]
+        if not start_year <= year <= end_year:
+            continue
+        # the games are in date order, so training stops at the first game on or after the round's first date
+        train_end = int(np.searchsorted(dates, round_starts[test_rows[0]], side="left"))
+        train_start = 0
+        if train_seasons is not None:
+            train_start = int(np.searchsorted(years[:train_end], year - train_seasons))
+        if train_end - train_start >= min_train_games:
+            folds.append((train_start, train_end, test_rows))
+
+    return folds
+
+
+def season_metrics(
+        years: np.ndarray,
+        home_result: np.ndarray,
+        probability: np.ndarray,
+        margin: np.ndarray,
+        predicted_margin: np.ndarray,
+) -> Dict[int, Dict[str, float]]:
+    """Accuracy, log loss and margin MAE of each season. A draw, or a 50% tip, counts as half a correct tip."""
+    clipped = np.clip(probability, 1e-12, 1 - 1e-12)
+    log_loss = -(home_result * np.log(clipped) + (1 - home_result) * np.log(1 - clipped))
+    tipped = np.sign(probability - 0.5)
+    correct = np.where((tipped == 0) | (home_result == 0.5), 0.5, (tipped > 0) == (home_result == 1))
+    errors = np.abs(margin - predicted_margin)
+
+    metrics = {}
+    for year in np.unique(years):
+        season = years == year
+        metrics[int(year)] = {
+            "games": int(season.sum()),
+            "accuracy": float(correct[season].mean()),
+            "log_loss": float(log_loss[season].mean()),
+            "margin_mae": float(errors[season].mean()),
+        }
+
+    return metrics
+
+
+def run_backtest(
+        games: Sequence[GameResult],
+        start_year: int,
+        end_year: int,
+        workers: Optional[int] = None,
+        train_seasons: Optional[int] = None,
+        ridge: float = 1.0,
+) -> Dict[int, Dict[str, float]]:
+    """Walk forward through the seasons, predicting each round from the games before it
+
+    Args:
+        games (Sequence[GameResult]): Every completed game, including the seasons before start_year
+        start_year (int): First season predicted
+        end_year (int): Last season predicted
+        workers (Optional[int], optional): Worker processes. Defaults to the number of cores.
+        train_seasons (Optional[int], optional): Seasons trained on before each one predicted. Defaults to all of them.
+        ridge (float, optional): L2 penalty of the models. Defaults to 1.0.
+
+    Returns:
+        Dict[int, Dict[str, float]]: Games, accuracy, log loss and margin MAE of each season
+    """
+    start_time = time.perf_counter()
+    game_features = build_features(games)
+    folds = walk_forward_folds(game_features, start_year, end_year, train_seasons)
+    if not folds:
+        logger.warning(f"No rounds between {start_year} and {end_year} have enough earlier games to train on")
+        return {}
+
+    years = np.array([game.year for game in game_features.games], dtype=np.float64)
+    # predictions before a round can't see the results of the round's earlier games
+    cutoffs = [datetime.date.fromordinal(int(start)) for start in round_start_dates(game_features.games)]
+    matrix = np.column_stack([
+        game_features.features, game_features.home_result, game_features.margin, years,
+        build_features_as_of(game_features.games, cutoffs),
+    ])
+    logger.info(f"Built {matrix.shape[0]} x {len(FEATURE_NAMES)} features in {time.perf_counter() - start_time:.1f} seconds")
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(folds)))
+    # later folds train on more rows, so batches take every nth fold to even out the work
+    batch_count = min(len(folds), workers * 4)
+    batches = [folds[i::batch_count] for i in range(batch_count)]
+
+    with tempfile.TemporaryDirectory(prefix="backtest-") as directory:
+        path = os.path.join(directory, "features.npy")
+        np.save(path, matrix)
+
+        if workers == 1:
+            global _matrix
+            _attach(path)
+            try:
+                results = [_run_folds(batch, ridge) for batch in batches]
+            finally:
+                _matrix = None # drop the map before its file is removed
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(path,)) as executor:
+                results = list(executor.map(_run_folds, batches, [ridge] * len(batches)))
+
+    tested = np.zeros(len(matrix), dtype=bool)
+    probability = np.zeros(len(matrix))
+    predicted_margin = np.zeros(len(matrix))
+    for batch in results:
+        for test_rows, fold_probability, fold_margin in batch:
+            tested[test_rows] = True
+            probability[test_rows] = fold_probability
+            predicted_margin[test_rows] = fold_margin
+
+    metrics = season_metrics(
+        matrix[tested, YEAR].astype(int),
+        matrix[tested, HOME_RESULT],
+        probability[tested],
+        matrix[tested, MARGIN],
+        predicted_margin[tested],
+    )
+    logger.info(f"Backtested {len(folds)} rounds with {workers} workers in {time.perf_counter() - start_time:.1f} seconds")
+
+    return metrics
@@ -0,0 +1,656 @@
+"""Command line entry point.
+
+Each subcommand imports only the modules it needs inside its handler, so a run
+doesn't pay for httpx, BeautifulSoup or asyncpg unless it uses them. Logging is
+set up once the subcommand is known.
+
+    python cli.py migrate
+    python cli.py scrape --year 2025
+    python cli.py backfill 1990 2024 --replay
+    python cli.py scrape --year 2025 --profile scrape.folded
+    python cli.py export stats stats.csv --year 2024
+    python cli.py import --players players.csv --games games.csv --stats stats.csv
+    python cli.py backtest --start-year 2000 --end-year 2024
+    python cli.py simulate --year 2025 --fixtures fixtures.csv
+    python cli.py refresh --year 2025
+    python cli.py predict --year 2025 --fixtures fixtures.csv
+    python cli.py simulate --year 2024 --after-round 12 --workers 4
+    python cli.py bench
+    python cli.py bench --store --sink sqlite:local.db
+    python cli.py bench --extract
+    python cli.py bench --read --sink sqlite:local.db
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+# modules each subcommand imports, used by bench to measure the cold start cost
+SUBCOMMAND_MODULES: Dict[str, List[str]] = {
+    "migrate": ["schema"],
+    "scrape": ["archive", "main"],
+    "backfill": ["archive", "main", "replay"],
+    "export": ["export"],
+    "import": ["importer", "storage"],
+    "weather": ["weather", "storage"],
+    "backtest": ["backtest", "storage"],
+    "simulate": ["backtest", "simulator", "storage"],
+    "refresh": ["archive", "refresh"],
+    "predict": ["backtest", "refresh", "storage"],
+    "bench": [],
+}
+
+
+def _migrate(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from database import AsyncDatabaseConnection
+    from schema import apply_migrations
+
+    async def migrate():
+        db_manager = AsyncDatabaseConnection()
+        try:
+            return await apply_migrations(db_manager)
+        finally:
+            await db_manager.close_all()
+
+    applied = asyncio.run(migrate())
+    print(f"Applied migrations: {', '.join(map(str, applied)) if applied else 'none'}")
+    return 0
+
+
+def _scrape(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from archive import PageArchive
+    from main import scrape_stats
+
+    start_time = time.time()
+    if args.no_archive:
+        counts = asyncio.run(scrape_stats(
+            year=args.year,
+            memory_budget_mb=args.memory_budget,
+            sink_url=args.sink,
+            weather_csv=args.weather,
+            profile_output=args.profile
+        ))
+    else:
+        with PageArchive(args.archive) as page_archive:
+            counts = asyncio.run(scrape_stats(
+                year=args.year,
+                page_archive=page_archive,
+                memory_budget_mb=args.memory_budget,
+                sink_url=args.sink,
+                weather_csv=args.weather,
+                profile_output=args.profile
+            ))
+
+    print(f"Scraped {args.year}: {counts[0]} games, {counts[1]} players, {counts[2]} stats "
+          f"in {time.time() - start_time:.1f} seconds")
+    return 0
+
+
+def _backfill(args: argparse.Namespace) -> int:
+    years = range(args.start_year, args.end_year + 1)
+
+    if args.replay:
+        from replay import replay_archive
+
+        replay_archive(
+            years, args.archive, args.workers, args.memory_budget, args.sink, args.weather, args.profile,
+            args.log_file,
+        )
+        return 0
+
+    import asyncio
+
+    from archive import PageArchive
+    from main import scrape_stats
+    from profiler import season_profile_output
+
+    with PageArchive(args.archive) as page_archive:
+        for year in years:
+            counts = asyncio.run(scrape_stats(
+                year=year,
+                page_archive=page_archive,
+                memory_budget_mb=args.memory_budget,
+                sink_url=args.sink,
+                weather_csv=args.weather,
+                profile_output=season_profile_output(args.profile, year)
+            ))
+            print(f"Scraped {year}: {counts[0]} games, {counts[1]} players, {counts[2]} stats")
+
+    return 0
+
+
+def _export(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from export import export_table
+
+    asyncio.run(export_table(args.table, args.output, args.year))
+    return 0
+
+
+def _import(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from importer import import_csv_files
+    from storage import create_sink
+
+    if not (args.players or args.games or args.stats):
+        print("Nothing to import, pass --players, --games and/or --stats", file=sys.stderr)
+        return 2
+
+    async def load():
+        sink = create_sink(args.sink)
+        try:
+            return await import_csv_files(sink, args.players, args.games, args.stats, args.chunk_size)
+        finally:
+            await sink.close()
+
+    start_time = time.time()
+    counts = asyncio.run(load())
+    print(", ".join(f"{count} {name}" for name, count in counts.items()) + f" in {time.time() - start_time:.1f} seconds")
+    return 0
+
+
+def _weather(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from repositories.game_repository import GameRepository
+    from storage import create_sink
+    from weather import WeatherIndex, backfill_weather
+
+    async def backfill() -> int:
+        sink = create_sink(args.sink)
+        try:
+            return await backfill_weather(GameRepository(sink), WeatherIndex.from_csv(args.csv), args.year)
+        finally:
+            await sink.close()
+
+    filled = asyncio.run(backfill())
+    print(f"Filled weather for {filled} games")
+    return 0
+
+
+def _backtest(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from backtest import load_results, run_backtest
+    from repositories.game_repository import GameRepository
+    from storage import create_sink
+
+    async def load():
+        sink = create_sink(args.sink)
+        try:
+            return await load_results(GameRepository(sink), args.end_year)
+        finally:
+            await sink.close()
+
+    metrics = run_backtest(
+        asyncio.run(load()),
+        args.start_year,
+        args.end_year,
+        workers=args.workers,
+        train_seasons=args.train_seasons,
+    )
+    if not metrics:
+        print("Nothing to backtest")
+        return 1
+
+    print(f"{'season':<8}{'games':>7}{'accuracy':>10}{'log loss':>10}{'margin mae':>12}")
+    for year, season in metrics.items():
+        print(f"{year:<8}{season['games']:>7}{season['accuracy']:>10.3f}{season['log_loss']:>10.3f}{season['margin_mae']:>12.1f}")
+
+    games = sum(season["games"] for season in metrics.values())
+    overall = {
+        name: sum(season[name] * season["games"] for season in metrics.values()) / games
+        for name in ("accuracy", "log_loss", "margin_mae")
+    }
+    print(f"{'all':<8}{games:>7}{overall['accuracy']:>10.3f}{overall['log_loss']:>10.3f}{overall['margin_mae']:>12.1f}")
+    return 0
+
+
+def _simulate(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from backtest import load_results
+    from repositories.game_repository import GameRepository
+    from simulator import STAGES, build_season_state, read_fixtures_csv, simulate_season, split_season
+    from storage import create_sink
+
+    if (args.fixtures is None) == (args.after_round is None):
+        print("Pass either --fixtures or --after-round", file=sys.stderr)
+        return 2
+
+    async def load():
+        sink = create_sink(args.sink)
+        try:
+            return await load_results(GameRepository(sink), args.year)
+        finally:
+            await sink.close()
+
+    games = asyncio.run(load())
+    if args.fixtures:
+        history, fixtures = games, read_fixtures_csv(args.fixtures)
+    else:
+        history, fixtures = split_season(games, args.year, args.after_round)
+
+    state = build_season_state(history, args.year, fixtures)
+    result = simulate_season(state, args.simulations, workers=args.workers, seed=args.seed)
+
+    columns = ["position", "wins", "top 8", "top 4", "minor", "semi", "prelim", "grand", "premiers"]
+    print(f"{'team':<24}" + "".join(f"{column:>10}" for column in columns))
+    for row in result.summary():
+        values = [row["expected_position"], row["expected_wins"], row["top_8"], row["top_4"], row["minor_premiers"]]
+        values += [row[stage] for stage in STAGES[1:]]
+        print(f"{row['team']:<24}" + "".join(f"{value:>10.2f}" if i < 2 else f"{value:>10.1%}" for i, value in enumerate(values)))
+
+    return 0
+
+
+def _print_predictions(predictions, output: Optional[str] = None) -> None:
+    print(f"{'round':<7}{'date':<12}{'home':<24}{'away':<24}{'home win':>10}{'margin':>8}")
+    for prediction in predictions:
+        print(f"{prediction.round_id:<7}{str(prediction.date or ''):<12}{prediction.home_team:<24}"
+              f"{prediction.away_team:<24}{prediction.home_win_probability:>10.1%}{prediction.expected_margin:>8.1f}")
+
+    if output:
+        import csv
+
+        with open(output, "w", newline="", encoding="utf-8") as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(["Round", "Date", "HomeTeam", "AwayTeam", "HomeWinProbability", "ExpectedMargin"])
+            writer.writerows(predictions)
+
+
+def _refresh(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from archive import PageArchive
+    from refresh import refresh_season
+
+    with PageArchive(args.archive) as page_archive:
+        result = asyncio.run(refresh_season(
+            year=args.year,
+            page_archive=page_archive,
+            replay=args.replay,
+            sink_url=args.sink,
+            lookback_days=args.lookback_days,
+            concurrency=args.concurrency,
+        ))
+
+    counts = result.counts
+    print(f"Refreshed {args.year}: {counts[0]} games, {counts[1]} players, {counts[2]} stats, "
+          f"{result.skipped_pages} older match pages skipped, ingested in {result.ingest_seconds:.1f} seconds")
+    if not result.predictions:
+        print("No upcoming games on the fixture")
+        return 0
+
+    print(f"Predictions ready {result.total_seconds:.1f} seconds after the refresh started")
+    _print_predictions(result.predictions, args.output)
+    return 0
+
+
+def _predict(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from backtest import load_results
+    from refresh import predict_next_round, unplayed_fixtures, upcoming_fixtures
+    from repositories.game_repository import GameRepository
+    from storage import create_sink
+
+    async def load():
+        sink = create_sink(args.sink)
+        try:
+            return await load_results(GameRepository(sink), args.year)
+        finally:
+            await sink.close()
+
+    history = asyncio.run(load())
+    if args.fixtures:
+        from simulator import read_fixtures_csv
+
+        fixtures = unplayed_fixtures(read_fixtures_csv(args.fixtures), history)
+    else:
+        from scrapers.footy_wire_scraper import FootyWireScraper
+
+        fixture_dtos = FootyWireScraper("https://www.footywire.com/afl/footy").get_fixtures(args.year)
+        fixtures = upcoming_fixtures(fixture_dtos, history)
+
+    predictions = predict_next_round(history, args.year, fixtures)
+    if not predictions:
+        print("No upcoming games to predict")
+        return 1
+
+    _print_predictions(predictions, args.output)
+    return 0
+
+
+def _measure_import_time(modules: List[str]) -> Dict[str, float]:
+    """Import the modules in a fresh interpreter with -X importtime
+
+    Args:
+        modules (List[str]): Modules to import after cli
+
+    Returns:
+        Dict[str, float]: Wall clock time of the interpreter plus the cumulative import
+        time of every top level module, in milliseconds
+    """
+    import re
+    import subprocess
+
+    statement = "; ".join(f"import {module}" for module in ["cli", *modules])
+    start_time = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)), # -c imports from the cwd, run it from the repo
+    )
+    wall_ms = (time.perf_counter() - start_time) * 1000
+
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    # lines look like "import time:       self [us] |  cumulative | imported package"
+    # top level imports are the ones whose name isn't indented
+    timings = {"wall": wall_ms}
+    for line in completed.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\S.*)$", line)
+        if match:
+            timings[match.group(3)] = int(match.group(2)) / 1000
+
+    return timings
+
+
+def _bench_store(args: argparse.Namespace) -> int:
+    """Write synthetic stats through the repositories and report the throughput of the sink"""
+    import asyncio
+
+    from dtos.stats_dto import PlayerMatchStatsDTO
+    from helpers import field_names
+    from repositories.stats_repository import StatRepository
+    from storage import create_sink
+
+    # 9 games a round, 22 players a side drawn from 18 teams
+    stat_dtos = []
+    for game in range(args.games):
+        for player in range(44):
+            team = game % 18 if player < 22 else (game + 1) % 18
+            stat_dtos.append(PlayerMatchStatsDTO(
+                game_id=f"2025R{game // 9 + 1:02d}{game % 9 + 1:02d}",
+                team=f"Team {team}",
+                year=2025,
+                round=str(game // 9 + 1),
+                player_id=f"p{team * 22 + player % 22:09d}",
+                player_name=f"Player {team * 22 + player % 22}",
+                **{field: (game + player + i) % 30 for i, field in enumerate(field_names)}
+            ))
+
+    async def write() -> float:
+        sink = create_sink(args.sink)
+        repository = StatRepository(sink)
+        start_time = time.perf_counter()
+        try:
+            for start in range(0, len(stat_dtos), args.chunk_size):
+                await repository.insert_stats(stat_dtos[start:start + args.chunk_size])
+        finally:
+            await sink.close()
+        return time.perf_counter() - start_time
+
+    seconds = asyncio.run(write())
+    print(f"{args.sink}: wrote {len(stat_dtos)} stats in {seconds:.2f} seconds "
+          f"({len(stat_dtos) / seconds:,.0f} rows/sec, aggregates included)")
+    return 0
+
+
+def _bench_read(args: argparse.Namespace) -> int:
+    """Read the full history of stats and results as rows and as column arrays, reporting rows/sec and peak memory"""
+    import asyncio
+    import tracemalloc
+
+    from repositories.game_repository import GameRepository
+    from repositories.stats_repository import StatRepository
+    from storage import create_sink
+
+    async def measure(read) -> tuple:
+        start_time = time.perf_counter()
+        result = await read()
+        rows = len(result) if isinstance(result, list) else len(next(iter(result.values()), []))
+        seconds = time.perf_counter() - start_time
+        del result
+
+        # tracing slows allocation down, so peak memory is measured on a second read
+        tracemalloc.start()
+        try:
+            await read()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return rows, seconds, peak / 1024 ** 2
+
+    async def run() -> None:
+        sink = create_sink(args.sink)
+        stat_repository, game_repository = StatRepository(sink), GameRepository(sink)
+        stat_columns = ", ".join(StatRepository.STAT_COLUMN_TYPES)
+        reads = [
+            ("stats as rows", lambda: stat_repository.fetch_all(f"SELECT {stat_columns} FROM stats ORDER BY GameId, PlayerId")),
+            ("stats as columns", lambda: stat_repository.get_stat_columns(chunk_size=args.chunk_size)),
+            ("results as rows", lambda: game_repository.get_results()),
+            ("results as columns", lambda: game_repository.get_result_columns(chunk_size=args.chunk_size)),
+        ]
+        try:
+            await sink.fetch_one("SELECT 1") # open the connection before anything is timed
+            for name, read in reads:
+                rows, seconds, peak = await measure(read)
+                print(f"{name:<20}{rows:>10} rows in {seconds:6.2f} seconds "
+                      f"({rows / max(seconds, 1e-9):>10,.0f} rows/sec), peak {peak:8.1f} MB")
+        finally:
+            await sink.close()
+
+    asyncio.run(run())
+    return 0
+
+
+def _bench_extract(args: argparse.Namespace) -> int:
+    """Compare the table extractor with the BeautifulSoup per cell loop it replaced on archived match pages"""
+    from bs4 import BeautifulSoup
+
+    from archive import PageArchive
+    from helpers import field_names
+    from scrapers.table_extractor import extract_match_stats_tables
+
+    def per_cell(page):
+        soup = BeautifulSoup(page, "html.parser")
+        tables = [
+            table for table in soup.find_all("table", class_="sortable")
+            if "Match Statistics" in table.find("th").get_text(strip=True)
+        ]
+        stats = []
+        for table in tables:
+            for row in table.find_all("tr")[2:]:
+                cells = row.find_all("td")
+                if len(cells) < 25 or cells[1].find("a") is None:
+                    continue
+                stats.append([int(cells[i + 2].get_text(strip=True) or 0) for i in range(len(field_names))])
+        return stats
+
+    def extractor(page):
+        return [row for table in extract_match_stats_tables(page) for row in table.values.tolist()]
+
+    with PageArchive(args.archive) as page_archive:
+        pages = [page for page in page_archive.pages() if "Match Statistics" in page][:args.pages]
+
+    if not pages:
+        print(f"No match pages in {args.archive}")
+        return 1
+
+    for page in pages:
+        if extractor(page) != per_cell(page):
+            print("Extractor and per cell loop disagree")
+            return 1
+
+    for name, extract in (("per cell loop", per_cell), ("table extractor", extractor)):
+        start_time = time.perf_counter()
+        for _ in range(args.repeat):
+            for page in pages:
+                extract(page)
+        elapsed = (time.perf_counter() - start_time) / (args.repeat * len(pages))
+        print(f"{name:<16} {elapsed * 1000:8.3f} ms per page over {len(pages)} pages")
+
+    return 0
+
+
+def _bench(args: argparse.Namespace) -> int:
+    if args.store:
+        return _bench_store(args)
+    if args.extract:
+        return _bench_extract(args)
+    if args.read:
+        return _bench_read(args)
+
+    subcommands = args.subcommands or [name for name in SUBCOMMAND_MODULES if name != "bench"]
+    for name in subcommands:
+        if name not in SUBCOMMAND_MODULES:
+            print(f"{name:<10} is not a subcommand")
+            continue
+
+        try:
+            timings = _measure_import_time(SUBCOMMAND_MODULES[name])
+        except RuntimeError as e:
+            print(f"{name:<10} failed to import: {e}")
+            continue
+
+        wall = timings.pop("wall")
+        slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        print(f"{name:<10} cold start {wall:8.1f} ms, imports {sum(timings.values()):8.1f} ms")
+        for module, ms in slowest:
+            print(f"{'':<12}{module:<40}{ms:8.1f} ms")
+
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Scrape afl stats and predict results")
+    parser.add_argument("--log-file", default="scraper.log")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="apply the schema migrations the postgres db doesn't have yet")
+    migrate.set_defaults(handler=_migrate)
+
+    scrape = subparsers.add_parser("scrape", help="scrape a season and write it to the db")
+    scrape.add_argument("--year", type=int, default=2025)
+    scrape.add_argument("--archive", default="page_archive")
+    scrape.add_argument("--no-archive", action="store_true", help="don't write fetched pages to the archive")
+    scrape.add_argument("--memory-budget", type=float, default=None, help="MB of scraped records kept in memory")
+    scrape.add_argument("--sink", default="postgres", help="postgres, memory or sqlite:<path>")
+    scrape.add_argument("--weather", default=None, help="daily weather csv used to fill in each game's weather")
+    scrape.add_argument(
+        "--profile", nargs="?", const="profile.folded", default=None,
+        help="report the call sites blocking the event loop and write its stack samples as collapsed stacks"
+    )
+    scrape.set_defaults(handler=_scrape)
+
+    backfill = subparsers.add_parser("backfill", help="scrape a range of seasons")
+    backfill.add_argument("start_year", type=int)
+    backfill.add_argument("end_year", type=int)
+    backfill.add_argument("--archive", default="page_archive")
+    backfill.add_argument("--replay", action="store_true", help="read pages from the archive instead of the network")
+    backfill.add_argument("--workers", type=int, default=None)
+    backfill.add_argument("--memory-budget", type=float, default=None, help="MB of scraped records kept in memory")
+    backfill.add_argument("--sink", default="postgres", help="postgres, memory or sqlite:<path>")
+    backfill.add_argument("--weather", default=None, help="daily weather csv used to fill in each game's weather")
+    backfill.add_argument(
+        "--profile", nargs="?", const="profile.folded", default=None,
+        help="report the call sites blocking the event loop and write its stack samples as collapsed stacks"
+    )
+    backfill.set_defaults(handler=_backfill)
+
+    export = subparsers.add_parser("export", help="export a table to csv")
+    export.add_argument("table")
+    export.add_argument("output")
+    export.add_argument("--year", type=int, default=None)
+    export.set_defaults(handler=_export)
+
+    import_ = subparsers.add_parser("import", help="bulk load historical csv files, e.g. the kaggle afl data")
+    import_.add_argument("--players", default=None, help="players csv")
+    import_.add_argument("--games", default=None, help="games csv")
+    import_.add_argument("--stats", default=None, help="stats csv")
+    import_.add_argument("--sink", default="postgres", help="postgres, memory or sqlite:<path>")
+    import_.add_argument("--chunk-size", type=int, default=5000)
+    import_.set_defaults(handler=_import)
+
+    weather = subparsers.add_parser("weather", help="fill in the weather of games already stored")
+    weather.add_argument("csv", help="daily weather csv, see weather.py for the columns")
+    weather.add_argument("--year", type=int, default=None)
+    weather.add_argument("--sink", default="postgres", help="postgres, memory or sqlite:<path>")
+    weather.set_defaults(handler=_weather)
+
+    backtest = subparsers.add_parser("backtest", help="walk forward backtest of the result prediction model")
+    backtest.add_argument("--start-year", type=int, required=True, help="first season predicted")
+    backtest.add_argument("--end-year", type=int, required=True, help="last season predicted")
+    backtest.add_argument("--workers", type=int, default=None)
+    backtest.add_argument("--train-seasons", type=int, default=None, help="seasons trained on, defaults to all earlier ones")
+    backtest.add_argument("--sink", default="postgres", help="postgres, memory or sqlite:<path>")
+    backtest.set_defaults(handler=_backtest)
+
+    simulate = subparsers.add_parser("simulate", help="monte carlo simulation of the rest of a season and its finals")
+    simulate.add_argument("--year", type=int, required=True)
+    simulate.add_argument("--fixtures", default=None, help="csv of the fixtures left, with Round, Date, HomeTeam and AwayTeam columns")
+    simulate.add_argument("--after-round", type=int, default=None, help="replay a stored season from after this round instead")
+    simulate.add_argument("--simulations", type=int, default=100_000)
+    simulate.add_argument("--workers", type=int, default=1, help="worker processes, 0 for one per core")
+    simulate.add_argument("--seed", type=int, default=None)
+    simulate.add_argument("--sink", default="postgres", help="postgres, memory or sqlite:<path>")
+    simulate.set_defaults(handler=_simulate)
+
+    refresh = subparsers.add_parser("refresh", help="ingest the games played since the last refresh and predict the next round")
+    refresh.add_argument("--year", type=int, default=2025)
+    refresh.add_argument("--archive", default="page_archive")
+    refresh.add_argument("--replay", action="store_true", help="read pages from the archive instead of the network")
+    refresh.add_argument("--lookback-days", type=int, default=7, help="match pages this long before the latest stored game are re-checked")
+    refresh.add_argument("--concurrency", type=int, default=8, help="match pages processed at once")
+    refresh.add_argument("--sink", default="postgres", help="postgres, memory or sqlite:<path>")
+    refresh.add_argument("--output", default=None, help="csv the predictions are written to")
+    refresh.set_defaults(handler=_refresh)
+
+    predict = subparsers.add_parser("predict", help="predict the next round from the stored results")
+    predict.add_argument("--year", type=int, default=2025)
+    predict.add_argument("--fixtures", default=None, help="csv of upcoming fixtures, defaults to the footy wire fixture")
+    predict.add_argument("--sink", default="postgres", help="postgres, memory or sqlite:<path>")
+    predict.add_argument("--output", default=None, help="csv the predictions are written to")
+    predict.set_defaults(handler=_predict)
+
+    bench = subparsers.add_parser("bench", help="measure the cold start time of each subcommand")
+    bench.add_argument("subcommands", nargs="*", help="subcommands to measure, defaults to all of them")
+    bench.add_argument("--top", type=int, default=5, help="number of slowest imports to show")
+    bench.add_argument("--store", action="store_true", help="measure sink write throughput instead of cold start")
+    bench.add_argument("--sink", default="memory", help="sink used by --store and --read")
+    bench.add_argument("--games", type=int, default=207, help="synthetic games written by --store")
+    bench.add_argument("--chunk-size", type=int, default=5000)
+    bench.add_argument("--read", action="store_true", help="measure full history reads into rows and into column arrays")
+    bench.add_argument("--extract", action="store_true", help="measure match stats table extraction on archived pages")
+    bench.add_argument("--archive", default="page_archive", help="page archive used by --extract")
+    bench.add_argument("--pages", type=int, default=200, help="number of archived match pages used by --extract")
+    bench.add_argument("--repeat", type=int, default=5)
+    bench.set_defaults(handler=_bench)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.command != "bench" or args.store or args.read:
+        from logger import setup_logging
+
+        setup_logging(args.log_file)
+
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Read large result sets into NumPy column arrays.
+
+Bulk reads for analysis (every stat of a range of seasons, every game with a score)
+would otherwise build one Python row object per row and keep all of them alive at
+once. Here the rows are streamed through the sink's cursor a fixed size chunk at a
+time and each chunk is copied into the columns, so only one chunk of row objects is
+alive at a time. The columns double in length whenever a chunk doesn't fit and are
+trimmed to the rows read at the end, so the query only runs once.
+"""
+
+import time
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from logger import logger
+from storage import StorageSink
+
+TEXT = np.dtype(object) # text columns hold python strings
+DATE = np.dtype("datetime64[D]") # postgres dates and sqlite iso strings both convert
+
+DEFAULT_CHUNK_SIZE = 20_000
+
+
+def _allocate(dtypes: Dict[str, Any], rows: int) -> Dict[str, np.ndarray]:
+    return {name: np.empty(rows, dtype=dtype) for name, dtype in dtypes.items()}
+
+
+async def read_columns(
+        sink: StorageSink,
+        query: str,
+        params: Tuple[Any, ...],
+        dtypes: Dict[str, Any],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, np.ndarray]:
+    """Stream a query into one array per column
+
+    Args:
+        sink (StorageSink): Sink the query runs against
+        query (str): Query selecting the columns in the order of dtypes
+        params (Tuple[Any, ...]): Query parameters
+        dtypes (Dict[str, Any]): Name and NumPy dtype of each selected column
+        chunk_size (int, optional): Rows fetched and copied at a time. Defaults to DEFAULT_CHUNK_SIZE.
+
+    Returns:
+        Dict[str, np.ndarray]: The columns, by name
+    """
+    start_time = time.perf_counter()
+    capacity = chunk_size
+    columns = _allocate(dtypes, capacity)
+    names = list(dtypes)
+    text_columns = {name for name, dtype in dtypes.items() if np.dtype(dtype) == TEXT}
+    strings: Dict[str, str] = {}
+
+    filled = 0
+    async for rows in sink.fetch_chunks(query, params, chunk_size):
+        end = filled + len(rows)
+        if end > capacity:
+            capacity = max(end, capacity * 2)
+            grown = _allocate(dtypes, capacity)
+            for name in names:
+                grown[name][:filled] = columns[name][:filled]
+            columns = grown
+
+        for name, values in zip(names, zip(*rows)):
+            if name in text_columns:
+                values = [strings.setdefault(value, value) for value in values]
+            columns[name][filled:end] = values
+        filled = end
+
+    for column in columns.values():
+        # shrink in place rather than keep a view of the oversized array
+        column.resize(filled, refcheck=False)
+    seconds = time.perf_counter() - start_time
+    megabytes = sum(column.nbytes for column in columns.values()) / 1024 ** 2
+    logger.info(
+        f"Read {filled} rows into {len(names)} columns ({megabytes:.1f} MB) in {seconds:.2f} seconds "
+        f"({filled / max(seconds, 1e-9):,.0f} rows/sec)"
+    )
+
+    return columns
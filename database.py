@@ -5,7 +5,7 @@ import os
 from asyncpg import pool
 from dotenv import load_dotenv
 
-from logger import logger
+from logger import logger, setup_logging
 
 load_dotenv()
 
@@ -53,6 +53,8 @@ class AsyncDatabaseConnection():
 
 
 if __name__ == "__main__":
+    setup_logging()
+
     async def main():
         async_db = AsyncDatabaseConnection()
         await async_db.create_connection_pool()
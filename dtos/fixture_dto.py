@@ -0,0 +1,19 @@
+import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+class FixtureDTO(BaseModel):
+    year: int
+    round_id: str # round number, or QF, EF, SF, PF and GF for finals
+    date: datetime.date
+    start_time: Optional[datetime.time] = None
+    home_team: str
+    away_team: str
+    venue: Optional[str] = None
+    home_score: Optional[int] = None # scores are only filled in once the game has been played
+    away_score: Optional[int] = None
+
+    @property
+    def played(self) -> bool:
+        return self.home_score is not None and self.away_score is not None
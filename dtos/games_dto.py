@@ -1,3 +1,5 @@
+import datetime
+
 from pydantic import BaseModel, Field
 
 class MatchMetadataDTO(BaseModel):
@@ -5,55 +7,81 @@ class MatchMetadataDTO(BaseModel):
     year: int
     round_id: str
     venue: str
-    attendance: int # convert to int before inserting into db?
-    date: str
-    start_time: str
+    attendance: int
+    date: datetime.date
+    start_time: datetime.time
 
 class MatchScoreDTO(BaseModel):
     home_team: str
-    home_team_score_qt: str
-    home_team_score_ht: str
-    home_team_score_3qt: str
-    home_team_score_ft: str
-    home_team_score: str
+    home_team_goals_qt: int
+    home_team_behinds_qt: int
+    home_team_points_qt: int
+    home_team_goals_ht: int
+    home_team_behinds_ht: int
+    home_team_points_ht: int
+    home_team_goals_3qt: int
+    home_team_behinds_3qt: int
+    home_team_points_3qt: int
+    home_team_goals_ft: int
+    home_team_behinds_ft: int
+    home_team_points_ft: int
+    home_team_score: int
     away_team: str
-    away_team_score_qt: str
-    away_team_score_ht: str
-    away_team_score_3qt: str
-    away_team_score_ft: str
-    away_team_score: str
+    away_team_goals_qt: int
+    away_team_behinds_qt: int
+    away_team_points_qt: int
+    away_team_goals_ht: int
+    away_team_behinds_ht: int
+    away_team_points_ht: int
+    away_team_goals_3qt: int
+    away_team_behinds_3qt: int
+    away_team_points_3qt: int
+    away_team_goals_ft: int
+    away_team_behinds_ft: int
+    away_team_points_ft: int
+    away_team_score: int
 
-class ReducedGameDTO(BaseModel):
-    game_id: str
-    home_team: str
-    away_team: str
-    round_id: str
-    
 class GameDTO(BaseModel):
     game_id: str = Field(alias="GameId")
     year: int = Field(alias="Year")
     round_id: str = Field(alias="Round")
     venue: str = Field(alias="Venue")
     attendance: int = Field(alias="Attendance")
-    date: str = Field(alias="Date")
-    start_time: str = Field(alias="StartTime")
+    date: datetime.date = Field(alias="Date")
+    start_time: datetime.time = Field(alias="StartTime")
     home_team: str = Field(alias="HomeTeam")
-    home_team_score_qt: str = Field(alias="HomeTeamScoreQt")
-    home_team_score_ht: str = Field(alias="HomeTeamScoreHT")
-    home_team_score_3qt: str = Field(alias="HomeTeamScore3QT")
-    home_team_score_ft: str = Field(alias="HomeTeamScoreFT")
-    home_team_score: str = Field(alias="HomeTeamScore")
+    home_team_goals_qt: int = Field(alias="HomeTeamGoalsQT")
+    home_team_behinds_qt: int = Field(alias="HomeTeamBehindsQT")
+    home_team_points_qt: int = Field(alias="HomeTeamPointsQT")
+    home_team_goals_ht: int = Field(alias="HomeTeamGoalsHT")
+    home_team_behinds_ht: int = Field(alias="HomeTeamBehindsHT")
+    home_team_points_ht: int = Field(alias="HomeTeamPointsHT")
+    home_team_goals_3qt: int = Field(alias="HomeTeamGoals3QT")
+    home_team_behinds_3qt: int = Field(alias="HomeTeamBehinds3QT")
+    home_team_points_3qt: int = Field(alias="HomeTeamPoints3QT")
+    home_team_goals_ft: int = Field(alias="HomeTeamGoalsFT")
+    home_team_behinds_ft: int = Field(alias="HomeTeamBehindsFT")
+    home_team_points_ft: int = Field(alias="HomeTeamPointsFT")
+    home_team_score: int = Field(alias="HomeTeamScore")
     away_team: str = Field(alias="AwayTeam")
-    away_team_score_qt: str = Field(alias="AwayTeamScoreQT")
-    away_team_score_ht: str = Field(alias="AwayTeamScoreHT")
-    away_team_score_3qt: str = Field(alias="AwayTeamScore3QT")
-    away_team_score_ft: str = Field(alias="AwayTeamScoreFT")
-    away_team_score: str = Field(alias="AwayTeamScore")
+    away_team_goals_qt: int = Field(alias="AwayTeamGoalsQT")
+    away_team_behinds_qt: int = Field(alias="AwayTeamBehindsQT")
+    away_team_points_qt: int = Field(alias="AwayTeamPointsQT")
+    away_team_goals_ht: int = Field(alias="AwayTeamGoalsHT")
+    away_team_behinds_ht: int = Field(alias="AwayTeamBehindsHT")
+    away_team_points_ht: int = Field(alias="AwayTeamPointsHT")
+    away_team_goals_3qt: int = Field(alias="AwayTeamGoals3QT")
+    away_team_behinds_3qt: int = Field(alias="AwayTeamBehinds3QT")
+    away_team_points_3qt: int = Field(alias="AwayTeamPoints3QT")
+    away_team_goals_ft: int = Field(alias="AwayTeamGoalsFT")
+    away_team_behinds_ft: int = Field(alias="AwayTeamBehindsFT")
+    away_team_points_ft: int = Field(alias="AwayTeamPointsFT")
+    away_team_score: int = Field(alias="AwayTeamScore")
     max_temp: float = Field(alias="MaxTemp", default=None)
     min_temp: float = Field(alias="MinTemp", default=None)
     rainfall: float = Field(alias="Rainfall", default=None)
+    content_hash: str = Field(alias="ContentHash", default=None) # hash of the match page the game was read from
     
     class Config:
         validate_by_name = True
         frozen=True
-
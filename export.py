@@ -0,0 +1,47 @@
+"""Export tables from the database to csv files for model training and analysis."""
+
+from typing import Optional
+
+from database import AsyncDatabaseConnection
+from logger import logger
+
+# tables which can be exported and whether they can be filtered by season
+EXPORTABLE_TABLES = {
+    "games": True,
+    "players": False,
+    "stats": True,
+    "player_season_stats": True,
+    "team_season_stats": True,
+    "team_round_stats": True,
+}
+
+
+async def export_table(table: str, output: str, year: Optional[int] = None) -> None:
+    """Stream a table to a csv file using COPY so rows never pass through python objects
+
+    Args:
+        table (str): Name of the table to export
+        output (str): Path of the csv file to write
+        year (Optional[int], optional): Only export this season. Defaults to None.
+
+    Raises:
+        ValueError: The table can't be exported, or can't be filtered by season
+    """
+    if table not in EXPORTABLE_TABLES:
+        raise ValueError(f"{table} can't be exported, choose from {', '.join(EXPORTABLE_TABLES)}")
+    if year is not None and not EXPORTABLE_TABLES[table]:
+        raise ValueError(f"{table} can't be filtered by season")
+
+    db_manager = AsyncDatabaseConnection()
+    try:
+        async with db_manager.connection_from_pool() as conn:
+            if year is None:
+                await conn.copy_from_table(table, output=output, format="csv", header=True)
+            else:
+                await conn.copy_from_query(
+                    f"SELECT * FROM {table} WHERE Year = $1", year,
+                    output=output, format="csv", header=True
+                )
+        logger.info(f"Exported {table} to {output}")
+    finally:
+        await db_manager.close_all()
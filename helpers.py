@@ -1,4 +1,6 @@
 import datetime
+import hashlib
+from typing import Tuple
 
 
 field_names = [
@@ -14,37 +16,71 @@ name_corrections = {
     "OSullivan": ["o", "sullivan"]
 }
 
-def convert_date_format(date_str):
+# footy wire team names which differ from the afl tables names stored in the db
+team_name_corrections = {
+    "Brisbane": "Brisbane Lions",
+    "GWS": "Greater Western Sydney",
+    "GWS Giants": "Greater Western Sydney",
+}
+
+# round names of the finals on the footy wire fixture, mapped to the round ids used for finals
+finals_round_ids = {
+    "qualifying final": "QF",
+    "elimination final": "EF",
+    "semi final": "SF",
+    "preliminary final": "PF",
+    "grand final": "GF",
+}
+
+def parse_match_date(date_str: str) -> datetime.date:
     """
-    Convert date from DD-MMM-YYYY format to YYYY-MM-DD format
+    Parse a date in DD-MMM-YYYY format, as shown on afl tables
     
     Args:
         date_str (str): Date in format like '16-Mar-2025'
         
     Returns:
-        str: Date in format 'YYYY-MM-DD'
+        datetime.date: Parsed date
     """
-    # Parse the date string using datetime
-    date_obj = datetime.datetime.strptime(date_str, '%d-%b-%Y')
-    
-    # Format the date object to the desired format
-    formatted_date = date_obj.strftime('%Y-%m-%d')
+    return datetime.datetime.strptime(date_str, '%d-%b-%Y').date()
+
+def parse_start_time(time_str: str) -> datetime.time:
+    """
+    Parse a start time in 12 hour format, as shown on afl tables
     
-    return formatted_date
+    Args:
+        time_str (str): Time in format like '7:40 PM'
+        
+    Returns:
+        datetime.time: Parsed time
+    """
+    return datetime.datetime.strptime(time_str, '%I:%M %p').time()
 
-def before_second_dot(value: str) -> str:
-    """Helper function which extracts relevant data from afl tables website.
-    Scores from each quarter are listed in the following format G.B.T
-    G stands for goals (6 points), B is for Behinds (1 point), and T is the total
-    The original kaggle data ommited the total score from each quarter so to keep the data consistent
-    I am ommiting it as well.
+def split_score(value: str) -> Tuple[int, int, int]:
+    """Split a score in G.B or G.B.T format into goals, behinds and points.
+    Points are calculated from the goals (6 points) and behinds (1 point) so
+    G.B strings from the kaggle data give the same result as afl tables' G.B.T.
 
     Args:
-        value (str): quarter score in B.G.T format
+        value (str): score string such as '3.2' or '3.2.20'
 
     Returns:
-        str: score string with total score removed
+        Tuple[int, int, int]: goals, behinds and total points
     """
     parts = value.split(".")
-    return ".".join(parts[:2]) if len(parts) >= 2 else value
+    goals = int(parts[0] or 0)
+    behinds = int(parts[1] or 0) if len(parts) >= 2 else 0
+
+    return goals, behinds, goals * 6 + behinds
 
+def page_hash(page: str) -> str:
+    """
+    Fingerprint of a page's content, used to tell whether a page changed since it was stored
+    
+    Args:
+        page (str): Html of the page
+        
+    Returns:
+        str: Hex digest of the page
+    """
+    return hashlib.blake2b(page.encode(), digest_size=16).hexdigest()
@@ -0,0 +1,380 @@
+"""Seed the database from historical csv datasets, such as the kaggle afl stats data.
+
+The kaggle files (games.csv, players.csv and stats.csv) use the same column names as
+the DTO aliases, give or take case, so columns are matched to DTO fields by name.
+Quarter scores in G.B text columns (e.g. ``homeTeamScoreQT``) are split into goals,
+behinds and points. Files are read a chunk of rows at a time and written through the
+repositories, so memory stays flat however many rows a file has.
+
+Players are resolved against the rows already stored by name and date of birth, and
+games by date and teams, so importing over scraped data doesn't duplicate anyone and
+the imported stats point at the stored ids.
+"""
+
+import asyncio
+import csv
+import datetime
+import re
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from dtos.games_dto import GameDTO
+from dtos.player_profile_dto import PlayerProfileDTO
+from dtos.stats_dto import PlayerMatchStatsDTO
+from helpers import split_score
+from logger import logger
+from repositories.game_repository import GameRepository
+from repositories.player_repository import PlayerRepository
+from repositories.stats_repository import StatRepository
+from storage import StorageSink
+
+DATE_FORMATS = ["%Y-%m-%d", "%d-%b-%Y", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S"]
+TIME_FORMATS = ["%I:%M %p", "%H:%M", "%H:%M:%S"]
+
+
+def _normalise(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _free_game_id(game_dto: GameDTO, taken: set) -> str:
+    """First GameId of the game's round, in the scraper's format, which isn't already taken"""
+    round_id = f"{int(game_dto.round_id):02d}" if game_dto.round_id.isdigit() else game_dto.round_id
+    index = 1
+    while f"{game_dto.year}R{round_id}{index:02d}" in taken:
+        index += 1
+
+    return f"{game_dto.year}R{round_id}{index:02d}"
+
+
+def _parse_date(value: str) -> datetime.date:
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date {value}")
+
+
+def _parse_time(value: str) -> datetime.time:
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value.upper(), time_format).time()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time {value}")
+
+
+def _afl_tables_dob(value: str) -> str:
+    """Dob in the format the scraper reads from afl tables (e.g. 6-Jul-1999), so imported
+    players are found by the scraper's name and dob lookup"""
+    date = _parse_date(value)
+    return f"{date.day}-{date.strftime('%b-%Y')}"
+
+
+def _parse_int(value: str) -> int | str:
+    if value.isdigit():
+        return value # plain digits are left for pydantic to convert, which is quicker
+    return int(float(value.replace(",", ""))) # e.g. "45,123" attendances or "80.0"
+
+
+def _converter(annotation: Any, blank: Any) -> Callable[[str], Any]:
+    """Function converting a csv value to the type of a DTO field, with blank values mapped to blank"""
+    if annotation is int:
+        convert = _parse_int
+    elif annotation is float:
+        convert = float
+    elif annotation is datetime.date:
+        convert = _parse_date
+    elif annotation is datetime.time:
+        convert = _parse_time
+    else:
+        convert = str
+
+    def to_field(value: str) -> Any:
+        value = value.strip()
+        return convert(value) if value else blank
+
+    return to_field
+
+
+class ColumnMapping():
+    def __init__(self, model: Type[BaseModel], header: List[str], blank_ints: Any = None):
+        """Map the columns of a csv header onto the fields of a DTO. A column matches a field
+        when its name equals the field's alias or name, ignoring case and punctuation.
+
+        Args:
+            model (Type[BaseModel]): DTO the rows are converted to
+            header (List[str]): Column names of the csv
+            blank_ints (Any, optional): Value given to blank integer columns. Defaults to None.
+        """
+        self.model = model
+        fields_by_name = {}
+        for name, field in model.model_fields.items():
+            fields_by_name[_normalise(name)] = name
+            fields_by_name[_normalise(field.alias or name)] = name
+
+        # (column index, field name, converter)
+        self.columns: List[Tuple[int, str, Callable[[str], Any]]] = []
+        self.score_columns: List[Tuple[int, str]] = [] # (column index, field prefix) of G.B quarter scores
+        for index, column in enumerate(header):
+            key = _normalise(column)
+            if key in fields_by_name:
+                name = fields_by_name[key]
+                annotation = model.model_fields[name].annotation
+                blank = blank_ints if annotation is int else None
+                self.columns.append((index, name, _converter(annotation, blank)))
+                continue
+
+            score = re.fullmatch(r"(home|away)teamscore(qt|ht|3qt|ft)", key)
+            if score and f"{score.group(1)}_team_goals_{score.group(2)}" in model.model_fields:
+                self.score_columns.append((index, f"{score.group(1)}_team_{{}}_{score.group(2)}"))
+
+        mapped = {name for _, name, _ in self.columns}
+        mapped.update(prefix.format(kind) for _, prefix in self.score_columns for kind in ("goals", "behinds", "points"))
+        self.missing = [name for name, field in model.model_fields.items() if name not in mapped and field.is_required()]
+
+    def to_fields(self, row: List[str]) -> Dict[str, Any]:
+        fields = {}
+        for index, name, convert in self.columns:
+            value = convert(row[index])
+            if value is not None: # blank optional columns fall back to the DTO's default
+                fields[name] = value
+        for index, prefix in self.score_columns:
+            if row[index].strip():
+                goals, behinds, points = split_score(row[index].strip())
+                fields[prefix.format("goals")] = goals
+                fields[prefix.format("behinds")] = behinds
+                fields[prefix.format("points")] = points
+
+        return fields
+
+
+def read_chunks(path: str, chunk_size: int) -> Iterator[Tuple[List[str], List[List[str]]]]:
+    """Read a csv file a chunk of rows at a time
+
+    Args:
+        path (str): Path of the csv file
+        chunk_size (int): Rows per chunk
+
+    Yields:
+        Iterator[Tuple[List[str], List[List[str]]]]: The header and the next chunk of rows
+    """
+    with open(path, newline="", encoding="utf-8-sig") as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, [])
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield header, chunk
+                chunk = []
+        if chunk:
+            yield header, chunk
+
+
+class CsvImporter():
+    def __init__(self, sink: StorageSink, chunk_size: int = 5000):
+        """Bulk load historical csv files through the repositories
+
+        Args:
+            sink (StorageSink): Storage the rows are written to
+            chunk_size (int, optional): Rows read and written at a time. Defaults to 5000.
+        """
+        self.game_repository = GameRepository(sink)
+        self.player_repository = PlayerRepository(sink)
+        self.stat_repository = StatRepository(sink)
+        self.chunk_size = chunk_size
+        # source id -> stored id, filled as players and games are resolved
+        self.player_ids: Dict[str, str] = {}
+        self.game_ids: Dict[str, str] = {}
+        self.rejected = 0
+
+    def _parse_rows(self, path: str, model: Type[BaseModel], mapping: ColumnMapping, rows: List[List[str]]) -> List[BaseModel]:
+        dtos = []
+        for row in rows:
+            try:
+                dtos.append(model(**mapping.to_fields(row)))
+            except ValidationError as e:
+                self.rejected += 1
+                invalid = ", ".join(str(error["loc"][0]) for error in e.errors())
+                logger.warning(f"Skipping row of {path}, invalid {invalid}")
+            except (ValueError, IndexError) as e:
+                self.rejected += 1
+                logger.warning(f"Skipping row of {path}: {e}")
+
+        return dtos
+
+    async def _import(
+            self,
+            path: str,
+            model: Type[BaseModel],
+            resolve: Callable[[List[BaseModel]], Any],
+            blank_ints: Any = None,
+    ) -> int:
+        start_time = time.perf_counter()
+        imported = 0
+        mapping = None
+        pending: Optional[asyncio.Task] = None # write of the previous chunk, overlapped with parsing this one
+
+        for header, rows in read_chunks(path, self.chunk_size):
+            if mapping is None:
+                mapping = ColumnMapping(model, header, blank_ints)
+                if mapping.missing:
+                    raise ValueError(f"{path} has no column for {', '.join(mapping.missing)}")
+
+            # parsing runs on a worker thread so the loop keeps driving the previous chunk's write
+            dtos = await asyncio.to_thread(self._parse_rows, path, model, mapping, rows)
+
+            if pending is not None:
+                imported += await pending
+            pending = asyncio.ensure_future(resolve(dtos))
+
+        if pending is not None:
+            imported += await pending
+
+        seconds = time.perf_counter() - start_time
+        logger.info(f"Imported {imported} rows from {path} in {seconds:.1f} seconds ({imported / max(seconds, 1e-9):,.0f} rows/sec)")
+        return imported
+
+    async def import_players(self, path: str) -> int:
+        """Import a players csv. Players already stored keep their id and aren't written again.
+
+        Args:
+            path (str): Path of the csv file
+
+        Returns:
+            int: Number of players read from the file
+        """
+        stored = {
+            (display_name.lower(), dob): player_id
+            for player_id, display_name, dob in await self.player_repository.get_identities()
+        }
+
+        async def resolve(player_dtos: List[PlayerProfileDTO]) -> int:
+            new_players = []
+            for dto in player_dtos:
+                try:
+                    dto = dto.model_copy(update={"dob": _afl_tables_dob(dto.dob)})
+                except ValueError as e:
+                    self.rejected += 1
+                    logger.warning(f"Skipping player {dto.display_name}: {e}")
+                    continue
+                key = (dto.display_name.lower(), dto.dob)
+                if key in stored:
+                    self.player_ids[dto.player_id] = stored[key]
+                else:
+                    stored[key] = self.player_ids[dto.player_id] = dto.player_id
+                    new_players.append(dto)
+
+            # anyone stored since the identities were read keeps their stored id
+            stored_ids = await self.player_repository.insert_players(new_players)
+            for dto in new_players:
+                key = (dto.display_name.lower(), dto.dob)
+                stored[key] = self.player_ids[dto.player_id] = stored_ids[dto.player_id]
+            return len(player_dtos)
+
+        return await self._import(path, PlayerProfileDTO, resolve)
+
+    async def import_games(self, path: str) -> int:
+        """Import a games csv. Games already stored keep their id and are updated where they differ.
+        A new game whose id belongs to a different stored game is given an unused id instead.
+
+        Args:
+            path (str): Path of the csv file
+
+        Returns:
+            int: Number of games read from the file
+        """
+        game_keys = await self.game_repository.get_game_keys()
+        stored = {
+            # postgres returns dates and sqlite returns iso strings, compare them as strings
+            (str(date), home_team, away_team): game_id
+            for game_id, date, home_team, away_team in game_keys
+        }
+        taken = {game_id for game_id, *_ in game_keys}
+
+        async def resolve(game_dtos: List[GameDTO]) -> int:
+            resolved = []
+            for dto in game_dtos:
+                key = (str(dto.date), dto.home_team, dto.away_team)
+                game_id = stored.get(key)
+                if game_id is None:
+                    # the upsert is on GameId, so reusing a taken id would overwrite another game
+                    game_id = dto.game_id if dto.game_id not in taken else _free_game_id(dto, taken)
+                    if game_id != dto.game_id:
+                        logger.warning(
+                            f"GameId {dto.game_id} of {dto.home_team} v {dto.away_team} on {dto.date} "
+                            f"belongs to another game, importing it as {game_id}"
+                        )
+                    stored[key] = game_id
+                    taken.add(game_id)
+                self.game_ids[dto.game_id] = game_id
+                resolved.append(dto.model_copy(update={"game_id": game_id}))
+
+            await self.game_repository.insert_games(resolved)
+            return len(game_dtos)
+
+        return await self._import(path, GameDTO, resolve)
+
+    async def import_stats(self, path: str) -> int:
+        """Import a stats csv, pointing each row at the stored ids of its game and player.
+        Blank stats are read as 0, the same as the scraper does. The aggregate tables are
+        rebuilt once every row is written.
+
+        Args:
+            path (str): Path of the csv file
+
+        Returns:
+            int: Number of stats read from the file
+        """
+        async def resolve(stat_dtos: List[PlayerMatchStatsDTO]) -> int:
+            await self.stat_repository.insert_stats([
+                dto.model_copy(update={
+                    "game_id": self.game_ids.get(dto.game_id, dto.game_id),
+                    "player_id": self.player_ids.get(dto.player_id, dto.player_id),
+                })
+                for dto in stat_dtos
+            ], refresh_aggregates=False)
+            return len(stat_dtos)
+
+        imported = await self._import(path, PlayerMatchStatsDTO, resolve, blank_ints=0)
+        # one pass over the stats table is far cheaper than refreshing the touched rows of every chunk
+        await self.stat_repository.aggregates.rebuild()
+
+        return imported
+
+
+async def import_csv_files(
+        sink: StorageSink,
+        players: Optional[str] = None,
+        games: Optional[str] = None,
+        stats: Optional[str] = None,
+        chunk_size: int = 5000,
+) -> Dict[str, int]:
+    """Import any of the players, games and stats files, in that order so the stats can be
+    pointed at the stored players and games
+
+    Args:
+        sink (StorageSink): Storage the rows are written to
+        players (Optional[str], optional): Players csv. Defaults to None.
+        games (Optional[str], optional): Games csv. Defaults to None.
+        stats (Optional[str], optional): Stats csv. Defaults to None.
+        chunk_size (int, optional): Rows read and written at a time. Defaults to 5000.
+
+    Returns:
+        Dict[str, int]: Rows read from each file, plus the number of rows rejected
+    """
+    importer = CsvImporter(sink, chunk_size)
+    counts = {}
+    if players:
+        counts["players"] = await importer.import_players(players)
+    if games:
+        counts["games"] = await importer.import_games(games)
+    if stats:
+        counts["stats"] = await importer.import_stats(stats)
+    counts["rejected"] = importer.rejected
+
+    return counts
+
@@ -1,19 +1,35 @@
 import logging
 import sys
 
-sys.stdout.reconfigure(encoding='utf-8')
-
-# create the logger
+# create the logger. Handlers are only attached by setup_logging so importing
+# this module doesn't open the log file or touch stdout
 logger = logging.getLogger("scraper_logger")
-logger.setLevel(level=logging.DEBUG)#
+logger.setLevel(level=logging.DEBUG)
+
+
+def setup_logging(filename: str = "scraper.log") -> logging.Logger:
+    """Attach the file and console handlers to the scraper logger. Safe to call more than once.
+
+    Args:
+        filename (str, optional): File the log is written to. Defaults to "scraper.log".
+
+    Returns:
+        logging.Logger: The configured logger
+    """
+    if logger.handlers:
+        return logger
+
+    sys.stdout.reconfigure(encoding='utf-8')
+
+    # create a file handler
+    file_handler = logging.FileHandler(filename=filename)
+    file_handler.setLevel(level=logging.DEBUG)
 
-# create a file handler
-file_handler = logging.FileHandler(filename="scraper.log")
-file_handler.setLevel(level=logging.DEBUG)
+    # create a stream handler
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(level=logging.DEBUG)
 
-# create a stream handler
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(level=logging.DEBUG)
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
 
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
\ No newline at end of file
+    return logger
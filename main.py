@@ -1,8 +1,9 @@
 import time
 import asyncio
-from typing import Tuple
+from contextlib import nullcontext
+from typing import Dict, Optional, Tuple
 
-from database import AsyncDatabaseConnection
+from archive import PageArchive
 from dtos.games_dto import GameDTO
 from repositories.game_repository import GameRepository
 from repositories.player_repository import PlayerRepository
@@ -12,20 +13,26 @@ from scrapers.footy_wire_scraper import FootyWireScraper
 from services.game_service import GameService
 from services.player_service import PlayerService
 from services.stat_service import StatService
-from logger import logger
+from logger import logger, setup_logging
+from memory import MemoryMonitor, SpillBuffer
+from profiler import LoopProfiler
+from storage import StorageSink, create_sink
 
 
-def initialise_repositories(db_manager: AsyncDatabaseConnection) -> Tuple[GameRepository, PlayerRepository, StatRepository]:
+def initialise_repositories(sink: StorageSink) -> Tuple[GameRepository, PlayerRepository, StatRepository]:
     """Initialise the game, player and stat repository
 
+    Args:
+        sink (StorageSink): Storage the repositories read from and write to
+
     Returns:
         Tuple[GameRepository, PlayerRepository, StatRepository]: Return a tuple containing the
         repositories.
     """
     logger.info("Initialising repositories...")
-    game_repository = GameRepository(db_manager)
-    player_repository = PlayerRepository(db_manager)
-    stat_repository = StatRepository(db_manager)
+    game_repository = GameRepository(sink)
+    player_repository = PlayerRepository(sink)
+    stat_repository = StatRepository(sink)
 
     return game_repository, player_repository, stat_repository
 
@@ -55,6 +62,9 @@ def initialise_scrapers(
         game_service: GameService,
         player_service: PlayerService, 
         stat_service: StatService,
+        page_archive: Optional[PageArchive] = None,
+        replay: bool = False,
+        memory_monitor: Optional[MemoryMonitor] = None,
 ) -> AflTablesScraper:
     """Initalise the afl tables and footy wire scrapers
 
@@ -62,82 +72,230 @@ def initialise_scrapers(
         game_service (GameService): Initialisation requires this service
         player_service (PlayerService): Initialisation requires this service
         stat_service (StatService): Initialisation requires this service
+        page_archive (Optional[PageArchive]): Archive every fetched page is written to
+        replay (bool): Read pages from the archive instead of the network
+        memory_monitor (Optional[MemoryMonitor]): Spills the scraped records to disk when over budget
 
     Returns:
         AflTablesScraper: The scraper class
     """
     # create scrapers
     logger.info("Initialising scrapers...")
-    footy_wire_scraper = FootyWireScraper("https://www.footywire.com/afl/footy")
+    footy_wire_scraper = FootyWireScraper(
+        "https://www.footywire.com/afl/footy",
+        page_archive=page_archive,
+        replay=replay,
+    )
     afl_tables_scraper = AflTablesScraper(
         base_url="https://afltables.com/afl/stats/",
         game_service=game_service,
         player_service=player_service,
         stat_service=stat_service,
         footy_wire_scraper=footy_wire_scraper,
+        page_archive=page_archive,
+        replay=replay,
+        memory_monitor=memory_monitor,
     )
 
     return afl_tables_scraper
 
-async def scrape_data_from_afl_tables(afl_tables_scraper: AflTablesScraper) -> Tuple[set, set, set]:
-    """Scrape the data from afl tables and footy wire and store in sets
+async def process_match(afl_tables_scraper: AflTablesScraper, link: str) -> GameDTO | None:
+    """Scrape one match page into the scraper's game, player and stat buffers
+
+    Args:
+        afl_tables_scraper (AflTablesScraper): Scraper object
+        link (str): Endpoint of the match page
+
+    Returns:
+        GameDTO | None: The game, or None if its page is unchanged or couldn't be read
+    """
+    game_dto = await afl_tables_scraper.get_match_related_data(link)
+    if game_dto is None:
+        return None
+
+    afl_tables_scraper.scraped_games.add(game_dto)
+
+    await afl_tables_scraper.get_player_stats_for_match(
+        match_endpoint=link,
+        game_id=game_dto.game_id,
+        home_team=game_dto.home_team,
+        away_team=game_dto.away_team,
+        round_id = game_dto.round_id,
+    )
+
+    return game_dto
+
+async def write_scraped_records(
+        afl_tables_scraper: AflTablesScraper,
+        game_service: GameService,
+        player_service: PlayerService,
+        stat_service: StatService,
+        memory_monitor: MemoryMonitor,
+        write_chunk_size: int = 5000,
+        weather_index=None,
+) -> Tuple[int, int, int]:
+    """Write the scraper's buffered games, players and stats to the db, in that order. The hash of
+    each game's match page is recorded last, so a page whose records didn't all get written
+    is scraped again on the next run.
+
+    Args:
+        afl_tables_scraper (AflTablesScraper): Scraper holding the buffered records
+        game_service (GameService): Service the games are written through
+        player_service (PlayerService): Service the players are written through
+        stat_service (StatService): Service the stats are written through
+        memory_monitor (MemoryMonitor): Traces the memory of each write stage
+        write_chunk_size (int, optional): Number of records written at a time. Defaults to 5000.
+        weather_index (Optional[WeatherIndex], optional): Fills in the weather of each game. Defaults to None.
+
+    Returns:
+        Tuple[int, int, int]: Number of games, players and stats written
+    """
+    game_dtos = afl_tables_scraper.scraped_games
+    player_dtos = afl_tables_scraper.scraped_players
+    stat_dtos = afl_tables_scraper.scraped_stats
+    if weather_index is not None:
+        from weather import enrich_games
+
+    # spilled records are read back a chunk at a time so the write stays within the budget
+    with memory_monitor.stage("write games"):
+        for chunk in game_dtos.chunks(write_chunk_size):
+            if weather_index is not None:
+                chunk = enrich_games(chunk, weather_index)
+            await game_service.insert_games(chunk)
+    # a player stored meanwhile by another worker keeps their stored id, the stats follow it
+    player_ids: Dict[str, str] = {}
+    with memory_monitor.stage("write players"):
+        for chunk in player_dtos.chunks(write_chunk_size):
+            stored_ids = await player_service.insert_players(chunk)
+            player_ids.update(
+                (player_id, stored_id) for player_id, stored_id in stored_ids.items() if player_id != stored_id
+            )
+    with memory_monitor.stage("write stats"):
+        for chunk in stat_dtos.chunks(write_chunk_size):
+            if player_ids:
+                chunk = [
+                    dto.model_copy(update={"player_id": player_ids[dto.player_id]}) if dto.player_id in player_ids else dto
+                    for dto in chunk
+                ]
+            await stat_service.insert_stats(chunk)
+    with memory_monitor.stage("record page hashes"):
+        for chunk in game_dtos.chunks(write_chunk_size):
+            await game_service.set_content_hashes(chunk)
+
+    return len(game_dtos), len(player_dtos), len(stat_dtos)
+
+async def scrape_data_from_afl_tables(
+        afl_tables_scraper: AflTablesScraper,
+        year: int = 2025
+) -> Tuple[SpillBuffer, SpillBuffer, SpillBuffer]:
+    """Scrape the data from afl tables and footy wire and store in buffers
 
     Args:
         afl_tables_scraper (AflTablesScraper): Scraper object
+        year (int, optional): Season to scrape. Defaults to 2025.
+
+    Returns:
+        Tuple[SpillBuffer, SpillBuffer, SpillBuffer]: Buffered records for each table in the db
+    """
+    await afl_tables_scraper.load_stored_games(year)
+    match_links = await afl_tables_scraper.get_match_links(year=year) or []
+
+    tasks = [process_match(afl_tables_scraper, link) for link in match_links]
+    await asyncio.gather(*tasks)
+    afl_tables_scraper.log_fetch_summary()
+    logger.info(f"{afl_tables_scraper.unchanged_pages} of {len(match_links)} match pages unchanged since they were stored")
+
+    return (
+        afl_tables_scraper.scraped_games,
+        afl_tables_scraper.scraped_players,
+        afl_tables_scraper.scraped_stats,
+    )
+
+async def scrape_stats(
+        year: int = 2025,
+        page_archive: Optional[PageArchive] = None,
+        replay: bool = False,
+        memory_budget_mb: Optional[float] = None,
+        write_chunk_size: int = 5000,
+        sink_url: str = "postgres",
+        weather_csv: Optional[str] = None,
+        profile_output: Optional[str] = None,
+) -> Tuple[int, int, int]:
+    """Scrape a season and write the games, players and stats to the db
+
+    Args:
+        year (int, optional): Season to scrape. Defaults to 2025.
+        page_archive (Optional[PageArchive]): Archive every fetched page is written to
+        replay (bool): Read pages from the archive instead of the network
+        memory_budget_mb (Optional[float]): Spill scraped records to disk once traced memory
+        goes over this many MB. Memory is only traced when a budget is given, otherwise just the
+        duration of each stage and the max resident set size are reported.
+        write_chunk_size (int): Number of records written to the db at a time
+        sink_url (str): Where the records are written, see storage.create_sink
+        weather_csv (Optional[str]): Daily weather dataset used to fill in the weather of each game
+        profile_output (Optional[str]): Profile the event loop, report the call sites which block it
+        and write its stack samples to this file as collapsed stacks
 
     Returns:
-        Tuple[set, set, set]: Sets for each table in the db
+        Tuple[int, int, int]: Number of games, players and stats written
     """
-    year = 2025
-    match_links = await afl_tables_scraper.get_match_links(year=year)
-    game_dtos = set()
-    stat_dtos = set()
-    player_dtos = set()
-
-    async def process_match(link):
-        game_dto = await afl_tables_scraper.get_match_related_data(link)
-        if isinstance(game_dto, GameDTO):
-            afl_tables_scraper.scraped_games.add(game_dto)
-        
-        await afl_tables_scraper.get_player_stats_for_match(
-            match_endpoint=link,
-            game_id=game_dto.game_id, 
-            home_team=game_dto.home_team, 
-            away_team=game_dto.away_team,
-            round_id = game_dto.round_id,
-            player_match_stats_dtos=stat_dtos
-        )
-
-        return game_dto, player_stat_dtos, player_dtos
-
-    tasks = [process_match(link) for link in match_links]
-    results = await asyncio.gather(*tasks)
-
-    for game_dto, player_stat_dtos, player_dtos in results:
-        if isinstance(game_dto, GameDTO):
-            game_dtos.add(game_dto)
-        stat_dtos.update(player_stat_dtos)
-        player_dtos.update(player_dtos)
-    
-    return game_dtos, player_dtos, stat_dtos
-
-async def scrape_stats():
-    db_manager = AsyncDatabaseConnection()
-    game_repository, player_repository, stat_repository = initialise_repositories(db_manager)
+    memory_monitor = MemoryMonitor(memory_budget_mb)
+    if memory_budget_mb:
+        # tracing slows parsing several times over, so it's only on when there's a budget to enforce
+        memory_monitor.start()
+
+    weather_index = None
+    if weather_csv:
+        # numpy is only imported when weather is being filled in
+        from weather import WeatherIndex
+
+        weather_index = WeatherIndex.from_csv(weather_csv)
+
+    sink = create_sink(sink_url)
+    game_repository, player_repository, stat_repository = initialise_repositories(sink)
     game_service, player_service, stat_service = initialise_services(
         game_repository, 
         player_repository, 
         stat_repository
     )
-    afl_tables_scraper = initialise_scrapers(game_service, player_service, stat_service)
-    game_dtos, player_dtos, stat_dtos = await scrape_data_from_afl_tables(afl_tables_scraper) 
-    
-    await game_service.insert_games(game_dtos)
-    await player_service.insert_players(player_dtos)
-    await stat_service.insert_stats(stat_dtos)
-    
+    afl_tables_scraper = initialise_scrapers(
+        game_service,
+        player_service,
+        stat_service,
+        page_archive=page_archive,
+        replay=replay,
+        memory_monitor=memory_monitor,
+    )
+    profiler = LoopProfiler(profile_output) if profile_output else None
+    try:
+        with profiler or nullcontext():
+            with memory_monitor.stage("scrape"):
+                await scrape_data_from_afl_tables(afl_tables_scraper, year)
+
+            counts = await write_scraped_records(
+                afl_tables_scraper,
+                game_service,
+                player_service,
+                stat_service,
+                memory_monitor,
+                write_chunk_size,
+                weather_index,
+            )
+
+        memory_monitor.summary()
+        if profiler is not None:
+            profiler.report()
+    finally:
+        await sink.close()
+        for buffer in memory_monitor.buffers:
+            buffer.close()
+        memory_monitor.stop()
+
+    return counts
 
 if __name__ == "__main__":
+    setup_logging()
     start_time = time.time()
-    asyncio.run(scrape_stats())
+    with PageArchive() as page_archive:
+        asyncio.run(scrape_stats(page_archive=page_archive))
     print(f"Program took {time.time() - start_time} seconds to complete")
@@ -0,0 +1,211 @@
+"""Peak memory tracking and spill-to-disk buffers for long scrape runs.
+
+``MemoryMonitor`` records the tracemalloc peak of each stage of a run. When given a
+budget it also watches the traced memory as records are buffered, and once the
+budget is exceeded the registered ``SpillBuffer``s write their records to temporary
+files. The spilled records are read back in chunks when they are written to the db.
+"""
+
+import pickle
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Generic, Iterator, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from logger import logger
+
+try:
+    import resource
+except ImportError: # not available on windows
+    resource = None
+
+T = TypeVar("T", bound=BaseModel)
+
+MB = 1024 * 1024
+
+
+class SpillBuffer(Generic[T]):
+    """Set of DTOs which can move its contents to a temporary file. Records are stored
+    on disk as pickled tuples of field values and rebuilt without validation when read.
+    Records added again after being spilled are not deduplicated, the repositories'
+    ON CONFLICT clauses take care of that.
+    """
+    def __init__(self, model: Type[T], name: str, monitor: Optional["MemoryMonitor"] = None):
+        self.model = model
+        self.name = name
+        self.monitor = monitor
+        self._fields = list(model.model_fields)
+        self._items: set[T] = set()
+        self._spill_file = None
+        self._spilled = 0
+
+        if monitor is not None:
+            monitor.register(self)
+
+    def add(self, item: T) -> None:
+        self._items.add(item)
+        if self.monitor is not None:
+            self.monitor.check()
+
+    def update(self, items) -> None:
+        for item in items:
+            self.add(item)
+
+    def __len__(self) -> int:
+        return len(self._items) + self._spilled
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator[T]:
+        if self._spill_file is not None:
+            self._spill_file.seek(0)
+            while True:
+                try:
+                    rows = pickle.load(self._spill_file)
+                except EOFError:
+                    break
+                for values in rows:
+                    yield self.model.model_construct(**dict(zip(self._fields, values)))
+
+        yield from self._items
+
+    @property
+    def in_memory(self) -> int:
+        return len(self._items)
+
+    @property
+    def spilled(self) -> int:
+        return self._spilled
+
+    def spill(self) -> int:
+        """Move the in memory records to the spill file
+
+        Returns:
+            int: Number of records spilled
+        """
+        if not self._items:
+            return 0
+
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix=f"{self.name}-", suffix=".spill")
+
+        self._spill_file.seek(0, 2) # reads move the position so always append at the end
+        rows = [tuple(getattr(item, field) for field in self._fields) for item in self._items]
+        pickle.dump(rows, self._spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        count = len(self._items)
+        self._spilled += count
+        self._items.clear()
+        logger.info(f"Spilled {count} {self.name} records to disk")
+
+        return count
+
+    def chunks(self, size: int = 5000) -> Iterator[List[T]]:
+        """Iterate over every record, spilled or not, in lists of at most size records"""
+        chunk = []
+        for item in self:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def close(self) -> None:
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        self._spilled = 0
+        self._items.clear()
+
+
+class MemoryMonitor():
+    def __init__(self, budget_mb: Optional[float] = None, check_every: int = 500):
+        """Track peak memory per stage and, when a budget is set, spill buffers which push
+        traced memory over it.
+
+        Args:
+            budget_mb (Optional[float], optional): Memory budget in MB. Defaults to None.
+            check_every (int, optional): Number of buffered records between budget checks. Defaults to 500.
+        """
+        self.budget = int(budget_mb * MB) if budget_mb else None
+        self.check_every = check_every
+        self.buffers: List[SpillBuffer] = []
+        self.stage_peaks: Dict[str, int] = {}
+        self.stage_times: Dict[str, float] = {}
+        self.spills = 0
+        self._adds = 0
+        self._started_tracing = False # tracemalloc was started here rather than by the caller
+
+    def start(self) -> "MemoryMonitor":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def stop(self) -> None:
+        """Stop tracing, unless something else had started tracemalloc before start was called"""
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
+
+    def register(self, buffer: SpillBuffer) -> None:
+        self.buffers.append(buffer)
+
+    def check(self) -> None:
+        """Spill buffers, largest first, until traced memory is back under the budget"""
+        self._adds += 1
+        if self.budget is None or self._adds % self.check_every or not tracemalloc.is_tracing():
+            return
+
+        current, _ = tracemalloc.get_traced_memory()
+        if current <= self.budget:
+            return
+
+        logger.warning(f"Traced memory {current / MB:.1f} MB is over the {self.budget / MB:.1f} MB budget")
+        for buffer in sorted(self.buffers, key=lambda buffer: buffer.in_memory, reverse=True):
+            if buffer.spill():
+                self.spills += 1
+            if tracemalloc.get_traced_memory()[0] <= self.budget:
+                break
+
+    @contextmanager
+    def stage(self, name: str):
+        """Record the peak traced memory and duration of a stage of the run"""
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[name] = time.perf_counter() - start_time
+            if tracemalloc.is_tracing():
+                self.stage_peaks[name] = tracemalloc.get_traced_memory()[1]
+
+    def summary(self) -> Dict[str, float]:
+        """Log the memory used by the run
+
+        Returns:
+            Dict[str, float]: Peak MB of each stage, plus the process' max resident set size
+        """
+        summary = {f"{name}_peak_mb": peak / MB for name, peak in self.stage_peaks.items()}
+        for name, seconds in self.stage_times.items():
+            peak = self.stage_peaks.get(name)
+            traced = f"peak {peak / MB:.1f} MB traced, " if peak is not None else ""
+            logger.info(f"{name}: {traced}took {seconds:.1f} seconds")
+
+        if resource is not None:
+            # ru_maxrss is reported in KB on linux
+            summary["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            logger.info(f"Max resident set size: {summary['max_rss_mb']:.1f} MB")
+
+        spilled = sum(buffer.spilled for buffer in self.buffers)
+        if self.spills:
+            logger.info(f"Spilled {spilled} records to disk in {self.spills} spills")
+        summary["spilled_records"] = spilled
+
+        return summary
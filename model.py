@@ -0,0 +1,266 @@
+"""Result prediction model: pre-game features and a win probability + margin model.
+
+Features are built from the games table in date order, and every feature of a game only
+uses games played before it, so any prefix of the rows can be trained on without leaking
+results. The model is a ridge regularised logistic regression for the home team's win
+probability and a ridge regression for the home team's margin, both fitted with numpy.
+"""
+
+import datetime
+from collections import defaultdict, deque
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+FEATURE_NAMES = [
+    "elo_diff", # home elo minus away elo before the game, in hundreds of points
+    "form_margin_diff", # difference in the average margin of each team's last FORM_GAMES games, in tens of points
+    "form_wins_diff", # difference in the share of each team's last FORM_GAMES games won
+    "rest_days_diff", # difference in days since each team last played, capped at MAX_REST_DAYS, in weeks
+]
+
+ELO_START = 1500.0
+ELO_K = 40.0
+ELO_SEASON_CARRYOVER = 0.7 # share of a team's distance from the mean kept over the off season
+FORM_GAMES = 5
+MAX_REST_DAYS = 21
+
+
+class GameResult(NamedTuple):
+    game_id: str
+    year: int
+    round_id: str
+    date: datetime.date
+    home_team: str
+    away_team: str
+    home_score: int
+    away_score: int
+
+
+class Fixture(NamedTuple):
+    round_id: str
+    date: Optional[datetime.date] # without a date both teams are treated as fully rested
+    home_team: str
+    away_team: str
+
+
+class GameFeatures(NamedTuple):
+    games: List[GameResult] # in the order of the rows below
+    features: np.ndarray # (games, len(FEATURE_NAMES)) pre-game features
+    home_result: np.ndarray # 1 home win, 0.5 draw, 0 away win
+    margin: np.ndarray # home score minus away score
+
+
+def as_date(value: datetime.date | str) -> datetime.date:
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value))
+
+
+class FeatureState():
+    def __init__(self):
+        """Running ratings, form and last game date of every team, updated one result at a time"""
+        self.elo: Dict[str, float] = defaultdict(lambda: ELO_START)
+        self.recent: Dict[str, deque] = defaultdict(lambda: deque(maxlen=FORM_GAMES)) # (margin, won) of recent games
+        self.last_played: Dict[str, datetime.date] = {}
+        self.season: Optional[int] = None
+
+    def start_season(self, year: int) -> None:
+        """Regress every rating towards the mean when a new season starts"""
+        if year != self.season:
+            self.season = year
+            for team in self.elo:
+                self.elo[team] = ELO_START + (self.elo[team] - ELO_START) * ELO_SEASON_CARRYOVER
+
+    def features(self, home: str, away: str, date: Optional[datetime.date] = None) -> Tuple[float, ...]:
+        """Pre-game features of a game from the current state. Without a date both teams are
+        treated as fully rested."""
+        home_form, away_form = self.recent[home], self.recent[away]
+        rest = [
+            min((date - self.last_played[team]).days, MAX_REST_DAYS)
+            if date is not None and team in self.last_played else MAX_REST_DAYS
+            for team in (home, away)
+        ]
+        return (
+            (self.elo[home] - self.elo[away]) / 100,
+            (_mean(home_form, 0) - _mean(away_form, 0)) / 10,
+            _mean(home_form, 1) - _mean(away_form, 1),
+            (rest[0] - rest[1]) / 7,
+        )
+
+    def update(self, home: str, away: str, margin: float, date: datetime.date) -> None:
+        """Add a result to the ratings and form"""
+        result = 1.0 if margin > 0 else 0.0 if margin < 0 else 0.5
+        expected = 1 / (1 + 10 ** ((self.elo[away] - self.elo[home]) / 400))
+        change = ELO_K * (result - expected)
+        self.elo[home] += change
+        self.elo[away] -= change
+        self.recent[home].append((margin, float(margin > 0)))
+        self.recent[away].append((-margin, float(margin < 0)))
+        self.last_played[home] = self.last_played[away] = date
+
+
+def build_features(games: Sequence[GameResult]) -> GameFeatures:
+    """Build the pre-game features of every game. Games are sorted by date first.
+
+    Args:
+        games (Sequence[GameResult]): Completed games
+
+    Returns:
+        GameFeatures: The sorted games with their features and results
+    """
+    game_features, _ = build_features_and_state(games)
+    return game_features
+
+
+def build_features_and_state(games: Sequence[GameResult]) -> Tuple[GameFeatures, FeatureState]:
+    """Build the pre-game features of every game, and return the state after the last one
+    so features can be built for games which haven't been played yet
+
+    Args:
+        games (Sequence[GameResult]): Completed games
+
+    Returns:
+        Tuple[GameFeatures, FeatureState]: The sorted games with their features and results, and the final state
+    """
+    games = sorted(
+        (game._replace(date=as_date(game.date)) for game in games),
+        key=lambda game: (game.date, game.game_id)
+    )
+    features = np.zeros((len(games), len(FEATURE_NAMES)))
+    margin = np.array([game.home_score - game.away_score for game in games], dtype=np.float64)
+    home_result = np.where(margin > 0, 1.0, np.where(margin < 0, 0.0, 0.5))
+
+    state = FeatureState()
+    for row, game in enumerate(games):
+        state.start_season(game.year)
+        features[row] = state.features(game.home_team, game.away_team, game.date)
+        # the result is added after the features are taken
+        state.update(game.home_team, game.away_team, margin[row], game.date)
+
+    return GameFeatures(games, features, home_result, margin), state
+
+
+def build_features_as_of(games: Sequence[GameResult], cutoffs: Sequence[datetime.date]) -> np.ndarray:
+    """Build the features of every game from the state before any game dated on or after its
+    cutoff, e.g. the first day of its round, so no game sees a result it couldn't have known
+    about when it was predicted
+
+    Args:
+        games (Sequence[GameResult]): Completed games with native dates, in date order
+        cutoffs (Sequence[datetime.date]): Cutoff of each game, on or before its date
+
+    Returns:
+        np.ndarray: (games, len(FEATURE_NAMES)) features
+    """
+    # on the same day the features are taken before any result is added
+    events = sorted(
+        [(cutoff, 0, row) for row, cutoff in enumerate(cutoffs)]
+        + [(game.date, 1, row) for row, game in enumerate(games)]
+    )
+    features = np.zeros((len(games), len(FEATURE_NAMES)))
+
+    state = FeatureState()
+    for _, is_result, row in events:
+        game = games[row]
+        state.start_season(game.year)
+        if is_result:
+            state.update(game.home_team, game.away_team, game.home_score - game.away_score, game.date)
+        else:
+            features[row] = state.features(game.home_team, game.away_team, game.date)
+
+    return features
+
+
+def _mean(form: deque, index: int) -> float:
+    return sum(result[index] for result in form) / len(form) if form else 0.0
+
+
+class ResultModel(NamedTuple):
+    win_coefficients: np.ndarray # intercept followed by one weight per feature
+    margin_coefficients: np.ndarray
+
+    def predict(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Home win probability and expected home margin of each game
+
+        Args:
+            features (np.ndarray): (games, len(FEATURE_NAMES)) features
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Win probabilities and margins
+        """
+        design = _design(features)
+        return _sigmoid(design @ self.win_coefficients), design @ self.margin_coefficients
+
+
+def _design(features: np.ndarray) -> np.ndarray:
+    return np.hstack([np.ones((len(features), 1)), features])
+
+
+def _sigmoid(values: np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-np.clip(values, -30, 30)))
+
+
+def fit_model(
+        features: np.ndarray,
+        home_result: np.ndarray,
+        margin: np.ndarray,
+        ridge: float = 1.0,
+        iterations: int = 25,
+) -> ResultModel:
+    """Fit the win probability and margin models
+
+    Args:
+        features (np.ndarray): (games, len(FEATURE_NAMES)) features
+        home_result (np.ndarray): 1 home win, 0.5 draw, 0 away win
+        margin (np.ndarray): Home score minus away score
+        ridge (float, optional): L2 penalty on the feature weights, not the intercept. Defaults to 1.0.
+        iterations (int, optional): Maximum Newton steps for the logistic regression. Defaults to 25.
+
+    Returns:
+        ResultModel: Fitted coefficients
+    """
+    design = _design(features)
+    penalty = np.eye(design.shape[1]) * ridge
+    penalty[0, 0] = 0
+
+    # iteratively reweighted least squares, draws count as half a win
+    win_coefficients = np.zeros(design.shape[1])
+    for _ in range(iterations):
+        probability = _sigmoid(design @ win_coefficients)
+        weights = probability * (1 - probability)
+        gradient = design.T @ (home_result - probability) - penalty @ win_coefficients
+        hessian = (design * weights[:, None]).T @ design + penalty
+        step = np.linalg.solve(hessian, gradient)
+        win_coefficients += step
+        if np.abs(step).max() < 1e-8:
+            break
+
+    margin_coefficients = np.linalg.solve(design.T @ design + penalty, design.T @ margin)
+
+    return ResultModel(win_coefficients, margin_coefficients)
+
+
+def predict_fixtures(
+        history: Sequence[GameResult],
+        year: int,
+        fixtures: Sequence[Fixture],
+        ridge: float = 1.0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Train on every completed game and predict games which haven't been played yet
+
+    Args:
+        history (Sequence[GameResult]): Every completed game
+        year (int): Season the fixtures are in
+        fixtures (Sequence[Fixture]): Games to predict
+        ridge (float, optional): L2 penalty of the models. Defaults to 1.0.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Home win probability and expected home margin of each fixture
+    """
+    game_features, state = build_features_and_state(history)
+    model = fit_model(game_features.features, game_features.home_result, game_features.margin, ridge=ridge)
+    state.start_season(year)
+    features = np.array([
+        state.features(fixture.home_team, fixture.away_team, fixture.date) for fixture in fixtures
+    ]).reshape(len(fixtures), len(FEATURE_NAMES))
+
+    return model.predict(features)
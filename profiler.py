@@ -0,0 +1,214 @@
+"""Find the synchronous work which stalls the event loop.
+
+The scraper is async, but parts of it block: FootyWireScraper fetches profiles with
+``requests``, every page is parsed with BeautifulSoup on the loop, and log records are
+written synchronously. ``LoopProfiler`` times every callback the loop runs, and a
+sampling thread reads the loop thread's stack at a fixed interval. A sample taken
+while a callback is running is time the loop was blocked, and it is attributed to the
+innermost frame in one of the watched files, so a slow callback is reported against
+the line in the scraper which caused it rather than the task it belongs to.
+
+Every sample is also kept as a collapsed stack (``frame;frame;frame count``), the
+input format of flamegraph.pl, speedscope and inferno.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+from logger import logger
+
+WATCHED_FILES = ("afl_tables_scraper.py", "footy_wire_scraper.py")
+
+# (file:line function, call made from that line) of a blocking sample
+Site = Tuple[str, str]
+
+
+def season_profile_output(path: Optional[str], year: int) -> Optional[str]:
+    """Collapsed stacks file of one season when several are profiled, e.g. profile-2024.folded"""
+    if path is None:
+        return None
+
+    root, extension = os.path.splitext(path)
+    return f"{root}-{year}{extension}"
+
+
+def _qualname(frame: FrameType) -> str:
+    # co_qualname (3.11+) tells BeautifulSoup.__init__ apart from AsyncClient.__init__
+    return getattr(frame.f_code, "co_qualname", frame.f_code.co_name)
+
+
+def _frame_name(frame: FrameType) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{_qualname(frame)}"
+
+
+def _describe(handle: asyncio.Handle) -> str:
+    """Name of the task or function a callback runs, used when no sample landed in a watched file"""
+    callback = getattr(handle, "_callback", None)
+    task = getattr(callback, "__self__", None)
+    if isinstance(task, asyncio.Task):
+        return getattr(task.get_coro(), "__qualname__", repr(task.get_coro()))
+
+    return getattr(callback, "__qualname__", repr(callback))
+
+
+class LoopProfiler():
+    def __init__(
+            self,
+            output: Optional[str] = None,
+            interval: float = 0.005,
+            slow_callback: float = 0.05,
+            watched_files: Tuple[str, ...] = WATCHED_FILES,
+    ):
+        """Profile the event loop running in the current thread. Use as a context manager
+        around the code being profiled, then call report.
+
+        Args:
+            output (Optional[str], optional): File the collapsed stacks are written to. Defaults to None.
+            interval (float, optional): Seconds between stack samples. Defaults to 0.005.
+            slow_callback (float, optional): Callbacks running longer than this many seconds
+            are counted as slow. Defaults to 0.05.
+            watched_files (Tuple[str, ...], optional): Files blocking time is attributed to.
+            Defaults to WATCHED_FILES.
+        """
+        self.output = output
+        self.interval = interval
+        self.slow_callback = slow_callback
+        self.watched_files = watched_files
+
+        self.stacks: Counter[str] = Counter() # collapsed stack -> samples
+        self.blocking_sites: Counter[Site] = Counter() # samples taken inside a callback, per site
+        self.slow_sites: Dict[str, List[float]] = {} # durations of the slow callbacks attributed to each site
+        self.busy_samples = 0
+        self.idle_samples = 0
+        self.callback_seconds = 0.0
+        self.callbacks = 0
+
+        self._thread_id = threading.get_ident()
+        self._running: Optional[asyncio.Handle] = None
+        self._running_sites: Counter[Site] = Counter() # samples of the callback running now
+        self._original_run = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._start_time = 0.0
+        self._elapsed = 0.0
+
+    def __enter__(self) -> "LoopProfiler":
+        self._original_run = asyncio.Handle._run
+        profiler = self
+
+        def _run(handle: asyncio.Handle) -> None:
+            if threading.get_ident() != profiler._thread_id:
+                return profiler._original_run(handle)
+
+            profiler._running = handle
+            profiler._running_sites = Counter()
+            start_time = time.perf_counter()
+            try:
+                return profiler._original_run(handle)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                profiler._running = None
+                profiler._finish_callback(handle, elapsed)
+
+        # TimerHandle inherits _run, so timers are timed as well
+        asyncio.Handle._run = _run
+
+        self._start_time = time.perf_counter()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, name="loop-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._sampler.join()
+        asyncio.Handle._run = self._original_run
+        self._elapsed = time.perf_counter() - self._start_time
+        if self.output:
+            self.write_collapsed(self.output)
+
+    def _finish_callback(self, handle: asyncio.Handle, elapsed: float) -> None:
+        self.callbacks += 1
+        self.callback_seconds += elapsed
+        if elapsed < self.slow_callback:
+            return
+
+        if self._running_sites:
+            (location, call), _ = self._running_sites.most_common(1)[0]
+            site = f"{location} -> {call}"
+        else:
+            site = _describe(handle)
+        self.slow_sites.setdefault(site, []).append(elapsed)
+
+    def _site(self, frame: FrameType) -> Optional[Site]:
+        """Innermost watched frame of a stack, with the function it was calling"""
+        callee = None
+        while frame is not None:
+            filename = os.path.basename(frame.f_code.co_filename)
+            if filename in self.watched_files:
+                location = f"{filename}:{frame.f_lineno} {_qualname(frame)}"
+                return location, _qualname(callee) if callee is not None else "(self)"
+            callee = frame
+            frame = frame.f_back
+
+        return None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+
+            names = []
+            stack_frame = frame
+            while stack_frame is not None:
+                names.append(_frame_name(stack_frame))
+                stack_frame = stack_frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+            if self._running is None:
+                self.idle_samples += 1
+                continue
+
+            self.busy_samples += 1
+            site = self._site(frame)
+            if site is not None:
+                self.blocking_sites[site] += 1
+                self._running_sites[site] += 1
+
+    def write_collapsed(self, path: str) -> None:
+        """Write the samples as collapsed stacks, e.g. for flamegraph.pl path > profile.svg"""
+        with open(path, "w", encoding="utf-8") as collapsed_file:
+            for stack, samples in self.stacks.most_common():
+                collapsed_file.write(f"{stack} {samples}\n")
+        logger.info(f"Wrote {sum(self.stacks.values())} stack samples to {path}")
+
+    def report(self, top: int = 10) -> None:
+        """Log the loop's busy time, the call sites which blocked it longest and the slow callbacks"""
+        samples = self.busy_samples + self.idle_samples
+        logger.info(
+            f"Event loop ran {self.callbacks} callbacks for {self.callback_seconds:.2f} of {self._elapsed:.2f} seconds, "
+            f"busy in {self.busy_samples} of {samples} samples"
+        )
+
+        attributed = sum(self.blocking_sites.values())
+        logger.info(
+            f"Top blocking call sites in {', '.join(self.watched_files)} "
+            f"({attributed} of {self.busy_samples} busy samples):"
+        )
+        for (location, call), count in self.blocking_sites.most_common(top):
+            logger.info(
+                f"  {count * self.interval:8.2f}s {count / max(self.busy_samples, 1):6.1%}  {location} -> {call}"
+            )
+
+        slow_count = sum(len(durations) for durations in self.slow_sites.values())
+        logger.info(f"{slow_count} callbacks took longer than {self.slow_callback * 1000:.0f} ms:")
+        slowest = sorted(self.slow_sites.items(), key=lambda item: sum(item[1]), reverse=True)[:top]
+        for site, durations in slowest:
+            logger.info(f"  {len(durations):6} slow, {sum(durations):8.2f}s total, {max(durations) * 1000:8.0f} ms max  {site}")
@@ -0,0 +1,211 @@
+"""Fast refresh before a round: ingest the latest results and predict the next round.
+
+A full scrape gathers every match page of the season at once, so the round which just
+finished waits behind every earlier round. The fast refresh reads the season's fixture
+from footy wire alongside the afl tables match links, and only fetches the match pages
+dated after the latest game already stored, less a short lookback so the latest stored
+round is re-checked and late stat corrections are still picked up. That leaves the
+newest round or two, so once those games are written their results go straight into
+the model, which predicts the next round on the fixture.
+
+    python cli.py refresh --year 2025
+"""
+
+import asyncio
+import datetime
+import re
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from archive import PageArchive
+from backtest import load_results
+from dtos.fixture_dto import FixtureDTO
+from logger import logger
+from model import Fixture, GameResult, as_date, predict_fixtures
+from storage import create_sink
+
+LATENCY_TARGET_SECONDS = 60
+
+# afl tables match pages end in the date of the game, e.g. games/2025/031620250313.html
+MATCH_LINK_DATE = re.compile(r"(\d{4})(\d{2})(\d{2})\.html$")
+
+
+class Prediction(NamedTuple):
+    round_id: str
+    date: Optional[datetime.date]
+    home_team: str
+    away_team: str
+    home_win_probability: float
+    expected_margin: float
+
+
+class RefreshResult(NamedTuple):
+    counts: Tuple[int, int, int] # games, players and stats written
+    skipped_pages: int # match pages older than the cutoff which weren't fetched
+    predictions: List[Prediction]
+    ingest_seconds: float
+    total_seconds: float
+
+
+def match_link_date(link: str) -> Optional[datetime.date]:
+    """Date of a game from its afl tables match link, None if the link doesn't end in one"""
+    match = MATCH_LINK_DATE.search(link)
+    if match is None:
+        return None
+
+    try:
+        return datetime.date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return None
+
+
+def unplayed_fixtures(fixtures: Sequence[Fixture], history: Sequence[GameResult]) -> List[Fixture]:
+    """Fixtures which aren't already stored as a result, matched on date and teams"""
+    stored = {(as_date(game.date), game.home_team, game.away_team) for game in history}
+    return [
+        fixture for fixture in fixtures
+        if (fixture.date, fixture.home_team, fixture.away_team) not in stored
+    ]
+
+
+def upcoming_fixtures(fixtures: Sequence[FixtureDTO], history: Sequence[GameResult]) -> List[Fixture]:
+    """Games on the fixture which haven't been played, dropping any which are already stored
+    in case the fixture hasn't caught up with a result yet"""
+    return unplayed_fixtures([
+        Fixture(fixture.round_id, fixture.date, fixture.home_team, fixture.away_team)
+        for fixture in fixtures
+        if not fixture.played
+    ], history)
+
+
+def predict_next_round(history: Sequence[GameResult], year: int, fixtures: Sequence[Fixture]) -> List[Prediction]:
+    """Predict the round of the earliest upcoming fixture
+
+    Args:
+        history (Sequence[GameResult]): Every completed game
+        year (int): Season of the fixtures
+        fixtures (Sequence[Fixture]): Games still to be played
+
+    Returns:
+        List[Prediction]: Prediction of each game of the next round
+    """
+    if not fixtures:
+        return []
+
+    # fixtures without a date sort after the dated ones, in the order given
+    first = min(range(len(fixtures)), key=lambda i: (fixtures[i].date or datetime.date.max, i))
+    next_round = [fixture for fixture in fixtures if fixture.round_id == fixtures[first].round_id]
+    probability, margin = predict_fixtures(history, year, next_round)
+
+    return [
+        Prediction(fixture.round_id, fixture.date, fixture.home_team, fixture.away_team, float(p), float(m))
+        for fixture, p, m in zip(next_round, probability, margin)
+    ]
+
+
+async def refresh_season(
+        year: int,
+        page_archive: Optional[PageArchive] = None,
+        replay: bool = False,
+        sink_url: str = "postgres",
+        lookback_days: int = 7,
+        concurrency: int = 8,
+        write_chunk_size: int = 5000,
+) -> RefreshResult:
+    """Ingest the games of a season played since the latest one stored, and predict the next round
+
+    Args:
+        year (int): Season to refresh
+        page_archive (Optional[PageArchive], optional): Archive every fetched page is written to. Defaults to None.
+        replay (bool, optional): Read pages from the archive instead of the network. Defaults to False.
+        sink_url (str, optional): Where the records are written, see storage.create_sink. Defaults to "postgres".
+        lookback_days (int, optional): Match pages dated more than this many days before the latest
+        stored game aren't fetched. Defaults to 7.
+        concurrency (int, optional): Match pages processed at once. Defaults to 8.
+        write_chunk_size (int, optional): Number of records written to the db at a time. Defaults to 5000.
+
+    Returns:
+        RefreshResult: What was written, the predictions and how long it took
+    """
+    # the scrapers are imported here so predict, which only needs the helpers above, doesn't load them
+    from main import (initialise_repositories, initialise_scrapers, initialise_services, process_match,
+                      write_scraped_records)
+    from memory import MemoryMonitor
+
+    start_time = time.perf_counter()
+    memory_monitor = MemoryMonitor(None)
+    sink = create_sink(sink_url)
+    game_repository, player_repository, stat_repository = initialise_repositories(sink)
+    game_service, player_service, stat_service = initialise_services(
+        game_repository,
+        player_repository,
+        stat_repository
+    )
+    afl_tables_scraper = initialise_scrapers(
+        game_service,
+        player_service,
+        stat_service,
+        page_archive=page_archive,
+        replay=replay,
+        memory_monitor=memory_monitor,
+    )
+
+    async def get_fixtures() -> List[FixtureDTO]:
+        try:
+            # footy wire is fetched with requests, so it runs on a thread rather than blocking the match pages
+            return await asyncio.to_thread(afl_tables_scraper.footy_wire_scraper.get_fixtures, year)
+        except Exception as e:
+            logger.warning(f"Couldn't read the {year} fixture, no predictions will be made: {e}")
+            return []
+
+    try:
+        await afl_tables_scraper.load_stored_games(year)
+        latest_date = await game_repository.get_latest_date(year)
+        cutoff = latest_date - datetime.timedelta(days=lookback_days) if latest_date is not None else None
+
+        fixtures, match_links = await asyncio.gather(get_fixtures(), afl_tables_scraper.get_match_links(year=year))
+
+        recent_links = [
+            link for link in match_links or []
+            if cutoff is None or (date := match_link_date(link)) is None or date >= cutoff
+        ]
+        skipped_pages = len(match_links or []) - len(recent_links)
+        skipped = f", skipping {skipped_pages} played before {cutoff}" if cutoff is not None else ""
+        logger.info(f"Processing {len(recent_links)} match pages{skipped}")
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def process(link: str) -> None:
+            async with semaphore:
+                await process_match(afl_tables_scraper, link)
+
+        await asyncio.gather(*(process(link) for link in recent_links))
+        afl_tables_scraper.log_fetch_summary()
+        counts = await write_scraped_records(
+            afl_tables_scraper,
+            game_service,
+            player_service,
+            stat_service,
+            memory_monitor,
+            write_chunk_size,
+        )
+        ingest_seconds = time.perf_counter() - start_time
+
+        history = await load_results(game_repository, year)
+    finally:
+        await sink.close()
+        for buffer in memory_monitor.buffers:
+            buffer.close()
+
+    predictions = predict_next_round(history, year, upcoming_fixtures(fixtures, history))
+    total_seconds = time.perf_counter() - start_time
+
+    round_id = predictions[0].round_id if predictions else None
+    logger.info(
+        f"Ingested {counts[0]} games in {ingest_seconds:.1f} seconds, "
+        f"predictions for round {round_id} ready after {total_seconds:.1f} seconds"
+    )
+    if total_seconds > LATENCY_TARGET_SECONDS:
+        logger.warning(f"Refresh took longer than the {LATENCY_TARGET_SECONDS} second target")
+
+    return RefreshResult(counts, skipped_pages, predictions, ingest_seconds, total_seconds)
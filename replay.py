@@ -0,0 +1,116 @@
+"""Re-run the extraction and db write path from the page archive instead of the network.
+
+Each season is replayed in its own process so the parsing work is spread across
+cores. Seasons are kept whole within a worker because game ids are numbered by
+the order games are seen within a round.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Tuple
+
+from archive import PageArchive
+from logger import logger, setup_logging
+from profiler import season_profile_output
+
+
+def _replay_season(
+        year: int,
+        archive_directory: str,
+        memory_budget_mb: float | None = None,
+        sink_url: str = "postgres",
+        weather_csv: str | None = None,
+        profile_output: str | None = None,
+        log_file: str = "scraper.log",
+) -> Tuple[int, int, int, int]:
+    """Replay a single season inside a worker process
+
+    Args:
+        year (int): Season to replay
+        archive_directory (str): Directory holding the page archive
+        memory_budget_mb (float | None, optional): Memory budget of the worker in MB. Defaults to None.
+        sink_url (str, optional): Where the records are written. Defaults to "postgres".
+        weather_csv (str | None, optional): Daily weather dataset used to fill in game weather. Defaults to None.
+        profile_output (str | None, optional): Collapsed stacks file of the season's loop profile. Defaults to None.
+        log_file (str, optional): File the worker logs to. Defaults to "scraper.log".
+
+    Returns:
+        Tuple[int, int, int, int]: The season followed by the number of games, players and stats written
+    """
+    # imported here so the parent process doesn't pay for the scraper imports
+    from main import scrape_stats
+
+    # spawned workers start without the parent's handlers
+    setup_logging(log_file)
+
+    with PageArchive(archive_directory) as page_archive:
+        counts = asyncio.run(scrape_stats(
+            year=year,
+            page_archive=page_archive,
+            replay=True,
+            memory_budget_mb=memory_budget_mb,
+            sink_url=sink_url,
+            weather_csv=weather_csv,
+            profile_output=profile_output
+        ))
+
+    return (year, *counts)
+
+
+def replay_archive(
+        years: Iterable[int],
+        archive_directory: str = "page_archive",
+        workers: int | None = None,
+        memory_budget_mb: float | None = None,
+        sink_url: str = "postgres",
+        weather_csv: str | None = None,
+        profile_output: str | None = None,
+        log_file: str = "scraper.log",
+) -> None:
+    """Replay the archived pages for the given seasons in parallel
+
+    Args:
+        years (Iterable[int]): Seasons to replay
+        archive_directory (str, optional): Directory holding the page archive. Defaults to "page_archive".
+        workers (int | None, optional): Number of worker processes. Defaults to the number of cores.
+        memory_budget_mb (float | None, optional): Memory budget of each worker in MB. Defaults to None.
+        sink_url (str, optional): Where the records are written. Defaults to "postgres".
+        weather_csv (str | None, optional): Daily weather dataset used to fill in game weather. Defaults to None.
+        profile_output (str | None, optional): Profile each season's event loop, writing its collapsed
+        stacks to this path with the season added to the name. Defaults to None.
+        log_file (str, optional): File the workers log to. Defaults to "scraper.log".
+    """
+    years = list(years)
+    workers = min(workers or os.cpu_count() or 1, len(years))
+    logger.info(f"Replaying {len(years)} seasons from {archive_directory} with {workers} workers")
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _replay_season, year, archive_directory, memory_budget_mb, sink_url, weather_csv,
+                season_profile_output(profile_output, year), log_file
+            )
+            for year in years
+        ]
+        for future in futures:
+            year, games, players, stats = future.result()
+            logger.info(f"Replayed {year}: {games} games, {players} players, {stats} stats")
+
+    logger.info(f"Replay took {time.time() - start_time:.1f} seconds")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay archived pages through the extraction and db write path")
+    parser.add_argument("start_year", type=int)
+    parser.add_argument("end_year", type=int)
+    parser.add_argument("--archive", default="page_archive")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--log-file", default="scraper.log")
+    args = parser.parse_args()
+
+    setup_logging(args.log_file)
+    replay_archive(range(args.start_year, args.end_year + 1), args.archive, args.workers, log_file=args.log_file)
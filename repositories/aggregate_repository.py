@@ -0,0 +1,112 @@
+from typing import Dict, Iterable, List, Tuple
+
+from dtos.stats_dto import PlayerMatchStatsDTO
+from helpers import field_names
+from repositories.base_repository import BaseRepository
+
+from logger import logger
+
+# stats table column for each counting stat, e.g. free_kicks_for -> Frees
+STAT_COLUMNS = [PlayerMatchStatsDTO.model_fields[field].alias for field in field_names]
+
+KEY_TYPES = {"PlayerId": "text", "Team": "text", "Year": "smallint", "Round": "text"}
+
+# keys per refresh statement, keeps the number of parameters well under the postgres and SQLite limits
+REFRESH_CHUNK_SIZE = 1000
+
+# table, the stats columns it is grouped by and how games are counted
+AGGREGATES: Dict[str, Tuple[List[str], str]] = {
+    "player_season_stats": (["PlayerId", "Year"], "count(*)"),
+    "team_season_stats": (["Team", "Year"], "count(DISTINCT GameId)"),
+    "team_round_stats": (["Team", "Year", "Round"], "count(DISTINCT GameId)"),
+}
+
+KEY_FIELDS = {"PlayerId": "player_id", "Team": "team", "Year": "year", "Round": "round"}
+
+
+def _aggregate_select(table: str, where: str = "") -> str:
+    keys, games = AGGREGATES[table]
+    key_list = ", ".join(keys)
+    totals = ", ".join(f"sum({column})" for column in STAT_COLUMNS)
+
+    return f"""
+        SELECT {key_list}, {games}, {totals}
+        FROM stats
+        {where}
+        GROUP BY {key_list}
+    """
+
+
+def _refresh_query(table: str, key_count: int) -> str:
+    """Recompute the rows of an aggregate table for key_count keys. Keys are passed as a
+    VALUES list with explicit casts so the same query runs on postgres and SQLite.
+    """
+    keys, _ = AGGREGATES[table]
+    key_list = ", ".join(keys)
+    rows = []
+    for row in range(key_count):
+        casts = ", ".join(
+            f"CAST(${row * len(keys) + i} AS {KEY_TYPES[key]})" for i, key in enumerate(keys, start=1)
+        )
+        rows.append(f"({casts})")
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in ["Games", *STAT_COLUMNS])
+    select = _aggregate_select(table, f"WHERE ({key_list}) IN (VALUES {', '.join(rows)})")
+
+    return f"""
+        INSERT INTO {table} ({key_list}, Games, {", ".join(STAT_COLUMNS)})
+        {select}
+        ON CONFLICT ({key_list}) DO UPDATE SET {updates}
+    """
+
+
+class AggregateRepository(BaseRepository):
+    """Season and round totals kept alongside the stats table. Rows are recomputed
+    for the players and teams touched by each stats batch, so reads never scan stats.
+    """
+    async def refresh_for_stats(self, stat_dtos: Iterable[PlayerMatchStatsDTO]) -> None:
+        """Recompute the aggregate rows affected by a batch of stats
+
+        Args:
+            stat_dtos (Iterable[PlayerMatchStatsDTO]): Stats which were just written
+        """
+        stat_dtos = list(stat_dtos)
+        if not stat_dtos:
+            return
+
+        for table, (keys, _) in AGGREGATES.items():
+            affected = list({tuple(getattr(dto, KEY_FIELDS[key]) for key in keys) for dto in stat_dtos})
+            for start in range(0, len(affected), REFRESH_CHUNK_SIZE):
+                chunk = affected[start:start + REFRESH_CHUNK_SIZE]
+                params = tuple(value for key in chunk for value in key)
+                await self.execute(_refresh_query(table, len(chunk)), params)
+            logger.info(f"Refreshed {len(affected)} rows in {table}")
+
+    async def rebuild(self) -> None:
+        """Rebuild every aggregate table from the full stats table"""
+        statements = []
+        for table, (keys, _) in AGGREGATES.items():
+            logger.info(f"Rebuilding {table}")
+            statements.append((f"DELETE FROM {table}", ()))
+            statements.append((
+                f"INSERT INTO {table} ({', '.join(keys)}, Games, {', '.join(STAT_COLUMNS)}) {_aggregate_select(table)}",
+                ()
+            ))
+        await self.execute_transaction(statements)
+
+    async def get_player_season(self, player_id: str, year: int):
+        return await self.fetch_one(
+            "SELECT * FROM player_season_stats WHERE PlayerId = $1 AND Year = $2",
+            (player_id, year)
+        )
+
+    async def get_team_season(self, team: str, year: int):
+        return await self.fetch_one(
+            "SELECT * FROM team_season_stats WHERE Team = $1 AND Year = $2",
+            (team, year)
+        )
+
+    async def get_team_round(self, team: str, year: int, round_id: str):
+        return await self.fetch_one(
+            "SELECT * FROM team_round_stats WHERE Team = $1 AND Year = $2 AND Round = $3",
+            (team, year, round_id)
+        )
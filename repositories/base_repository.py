@@ -1,41 +1,96 @@
-from typing import Any, List, Optional, Tuple
-from logger import logger
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-import asyncpg
+import numpy as np
 
+from column_reader import DEFAULT_CHUNK_SIZE, read_columns
 from database import AsyncDatabaseConnection
+from storage import PostgresSink, Statement, StorageSink
 
 class BaseRepository():
-    def __init__(self, db_manager: Optional[AsyncDatabaseConnection]):
-        self.db_manager = db_manager
+    def __init__(self, sink: StorageSink | AsyncDatabaseConnection):
+        # a bare connection manager is wrapped so existing callers keep writing to postgres
+        self.sink = sink if isinstance(sink, StorageSink) else PostgresSink(sink)
 
     async def fetch_one(self, query: str, params: Tuple[Any, ...] = ()):
-        try:            
-            async with self.db_manager.connection_from_pool() as conn:
-                result = await conn.fetchrow(query, *params)
-                return result
-        except (Exception, asyncpg.InterfaceError) as e:
-            logger.error(f"Failed to retrieve row: {e}")
-            raise
+        return await self.sink.fetch_one(query, params)
 
+    async def fetch_all(self, query: str, params: Tuple[Any, ...] = ()):
+        return await self.sink.fetch_all(query, params)
+
+    async def fetch_columns(
+            self,
+            query: str,
+            params: Tuple[Any, ...],
+            dtypes: Dict[str, Any],
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Dict[str, np.ndarray]:
+        return await read_columns(self.sink, query, params, dtypes, chunk_size)
+
+    async def execute(self, query: str, params: Tuple[Any, ...] = ()):
+        return await self.sink.execute(query, params)
         
     async def execute_batch(self, query: str, params: List[Tuple[Any, ...]]):
-        try:
-            async with self.db_manager.connection_from_pool() as conn:
-                result = await conn.executemany(query, params)
-                return result
-        except (Exception, asyncpg.InterfaceError) as e:
-            logger.error(f"Failed to execute batch: {e}")
-            raise
+        return await self.sink.execute_batch(query, params)
+
+    async def execute_transaction(self, statements: List[Statement]):
+        return await self.sink.execute_transaction(statements)
     
-    def get_columns_placeholders_and_values(self, dtos: set[Any]):
+    def get_columns_placeholders_and_values(self, dtos: set[Any], exclude: Iterable[str] = ()):
         if not dtos:
             raise ValueError("DTO set is empty")
+        exclude = set(exclude) # dto field names left out of the insert
         sample_dto = next(iter(dtos)) # can't index sets so use this instead
-        fields = sample_dto.model_dump(by_alias=True).keys()
-        placeholders = ", ".join([r"%s"] * len(fields))
+        fields = sample_dto.model_dump(by_alias=True, exclude=exclude).keys()
+        placeholders = ", ".join(f"${i}" for i in range(1, len(fields) + 1)) # numbered placeholders, see storage.py
         columns = ", ".join(fields)
-        values = [tuple(dto.model_dump().values()) for dto in dtos]
+        values = [tuple(dto.model_dump(exclude=exclude).values()) for dto in dtos]
 
         return columns, placeholders, values
-    
\ No newline at end of file
+    
+
+    def get_year_range(self, start_year: Optional[int], end_year: Optional[int]) -> Tuple[List[str], Tuple[int, ...]]:
+        """Conditions and parameters limiting a query to a range of seasons, either end can be open"""
+        conditions, params = [], []
+        for operator, year in ((">=", start_year), ("<=", end_year)):
+            if year is not None:
+                params.append(year)
+                conditions.append(f"Year {operator} ${len(params)}")
+
+        return conditions, tuple(params)
+
+    def get_upsert_clause(
+            self,
+            table: str,
+            columns: str,
+            conflict_columns: List[str],
+            keep_existing: Iterable[str] = (),
+    ) -> str:
+        """ON CONFLICT clause which updates a conflicting row only when its values have changed,
+        so re-writing unchanged rows costs no writes
+
+        Args:
+            table (str): Table being inserted into
+            columns (str): Comma separated columns being inserted
+            conflict_columns (List[str]): Columns of the unique index the conflict is detected on
+            keep_existing (Iterable[str], optional): Columns filled in by other jobs (e.g. weather).
+            Their stored value is kept unless the new one is non null, and they don't count as a change.
+
+        Returns:
+            str: The clause, to be appended to an INSERT
+        """
+        keep_existing = set(keep_existing)
+        updated = [column.strip() for column in columns.split(",") if column.strip() not in conflict_columns]
+        compared = [column for column in updated if column not in keep_existing]
+
+        assignments = ", ".join(
+            f"{column} = COALESCE(EXCLUDED.{column}, {table}.{column})" if column in keep_existing
+            else f"{column} = EXCLUDED.{column}"
+            for column in updated
+        )
+        current = ", ".join(f"{table}.{column}" for column in compared)
+        incoming = ", ".join(f"EXCLUDED.{column}" for column in compared)
+
+        return f"""
+            ON CONFLICT ({", ".join(conflict_columns)}) DO UPDATE SET {assignments}
+            WHERE ({current}) IS DISTINCT FROM ({incoming})
+        """
@@ -1,33 +1,190 @@
-from typing import List
+import datetime
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+
+from column_reader import DATE, DEFAULT_CHUNK_SIZE, TEXT
 from repositories.base_repository import BaseRepository
 from dtos.games_dto import GameDTO
 
 from logger import logger
 
 class GameRepository(BaseRepository): 
-    async def check_game_exists(self, date: str, home_team: str, away_team: str) -> bool:
+    CHECK_GAME_EXISTS_QUERY = """
+        SELECT GameId
+        FROM games
+        WHERE Date = $1 AND HomeTeam = $2 AND AwayTeam = $3
+        LIMIT 1
+    """
+
+    GET_CONTENT_HASHES_QUERY = """
+        SELECT GameId, ContentHash
+        FROM games
+        WHERE Year = $1
+    """
+
+    # scraped values are written as they are, weather is filled in separately and only ever added
+    WEATHER_COLUMNS = ("MaxTemp", "MinTemp", "Rainfall")
+
+    # dtype of each column read by get_result_columns
+    RESULT_COLUMN_TYPES = {
+        "GameId": TEXT,
+        "Year": np.int16,
+        "Round": TEXT,
+        "Date": DATE,
+        "HomeTeam": TEXT,
+        "AwayTeam": TEXT,
+        "HomeTeamScore": np.int16,
+        "AwayTeamScore": np.int16,
+    }
+
+    async def check_game_exists(self, date: datetime.date, home_team: str, away_team: str) -> bool:
+        return await self.get_game_id(date, home_team, away_team) is not None
+
+    async def get_game_id(self, date: datetime.date, home_team: str, away_team: str) -> str | None:
+        logger.info(f"date: {date}, home_team: {home_team}, away_team: {away_team}")
+        result = await self.fetch_one(self.CHECK_GAME_EXISTS_QUERY, (date, home_team, away_team))
+
+        return result[0] if result is not None else None
+
+    async def get_content_hashes(self, year: int) -> List[Tuple[str, str | None]]:
+        """GameId and page content hash of every game stored for a season
+
+        Args:
+            year (int): Season
+
+        Returns:
+            List[Tuple[str, str | None]]: GameId and ContentHash of each game, the hash is
+            None for games stored before hashes were recorded
+        """
+        rows = await self.fetch_all(self.GET_CONTENT_HASHES_QUERY, (year,))
+
+        return [(row[0], row[1]) for row in rows]
+
+    async def get_latest_date(self, year: int) -> datetime.date | None:
+        """Date of the last game stored for a season, or None if none are stored"""
+        result = await self.fetch_one("SELECT max(Date) FROM games WHERE Year = $1", (year,))
+        if result is None or result[0] is None:
+            return None
+
+        # sqlite returns dates as iso strings
+        return result[0] if isinstance(result[0], datetime.date) else datetime.date.fromisoformat(result[0])
+
+    async def get_game_keys(self) -> List[Tuple[str, datetime.date, str, str]]:
+        """GameId, Date, HomeTeam and AwayTeam of every stored game, used to match imported games"""
+        rows = await self.fetch_all("SELECT GameId, Date, HomeTeam, AwayTeam FROM games")
+
+        return [tuple(row) for row in rows]
+
+    async def get_results(self, end_year: int | None = None):
+        """Teams and final scores of every game, in date order
+
+        Args:
+            end_year (int | None, optional): Last season returned. Defaults to every season.
+
+        Returns:
+            List of rows holding GameId, Year, Round, Date, HomeTeam, AwayTeam, HomeTeamScore and AwayTeamScore
+        """
         query = """
-            SELECT 1
+            SELECT GameId, Year, Round, Date, HomeTeam, AwayTeam, HomeTeamScore, AwayTeamScore
             FROM games
-            WHERE Date = $1 AND HomeTeam = $2 AND AwayTeam = $3
-            LIMIT 1
+            WHERE HomeTeamScore IS NOT NULL AND AwayTeamScore IS NOT NULL
+        """
+        if end_year is None:
+            return await self.fetch_all(f"{query} ORDER BY Date, GameId")
+
+        return await self.fetch_all(f"{query} AND Year <= $1 ORDER BY Date, GameId", (end_year,))
+
+    async def get_result_columns(
+            self,
+            start_year: Optional[int] = None,
+            end_year: Optional[int] = None,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Dict[str, np.ndarray]:
+        """Teams and final scores of every game of a range of seasons as one array per column, in date order
+
+        Args:
+            start_year (Optional[int], optional): First season read. Defaults to the first stored.
+            end_year (Optional[int], optional): Last season read. Defaults to the last stored.
+            chunk_size (int, optional): Rows streamed at a time. Defaults to DEFAULT_CHUNK_SIZE.
+
+        Returns:
+            Dict[str, np.ndarray]: Columns of RESULT_COLUMN_TYPES, by name
+        """
+        conditions, params = self.get_year_range(start_year, end_year)
+        query = f"""
+            SELECT {", ".join(self.RESULT_COLUMN_TYPES)}
+            FROM games
+            WHERE {" AND ".join(["HomeTeamScore IS NOT NULL", "AwayTeamScore IS NOT NULL", *conditions])}
+            ORDER BY Date, GameId
         """
-        logger.info(f"date: {date}, home_team: {home_team}, away_team: {away_team}")
-        result = await self.fetch_one(query, (date, home_team, away_team))
 
-        return result is not None
+        return await self.fetch_columns(query, params, self.RESULT_COLUMN_TYPES, chunk_size)
 
     async def insert_games(self, game_dtos: List[GameDTO]) -> None:
         if not game_dtos:
             return
         
-        columns, placeholders, values = self.get_columns_placeholders_and_values(game_dtos)
+        # the page hash is only recorded by set_content_hashes, once the game's players and stats are written
+        columns, placeholders, values = self.get_columns_placeholders_and_values(game_dtos, exclude={"content_hash"})
 
+        upsert = self.get_upsert_clause("games", columns, ["GameId"], keep_existing=self.WEATHER_COLUMNS)
         query = f"""
             INSERT INTO games
             ({columns}) VALUES ({placeholders})
-            ON CONFLICT (GameId) DO NOTHING
+            {upsert}
         """
         await self.execute_batch(query, values)
-        
\ No newline at end of file
+
+    async def set_content_hashes(self, game_dtos: List[GameDTO]) -> None:
+        """Record the hash of the match page each game was read from
+
+        Args:
+            game_dtos (List[GameDTO]): Games whose players and stats have been written
+        """
+        hashes = [(game_dto.game_id, game_dto.content_hash) for game_dto in game_dtos if game_dto.content_hash]
+        if not hashes:
+            return
+
+        query = """
+            UPDATE games
+            SET ContentHash = $2
+            WHERE GameId = $1 AND ContentHash IS DISTINCT FROM $2
+        """
+        await self.execute_batch(query, hashes)
+
+    async def get_games_missing_weather(self, year: int | None = None):
+        """Games which don't have any weather filled in yet
+
+        Args:
+            year (int | None, optional): Only return games from this season. Defaults to None.
+
+        Returns:
+            List of rows holding GameId, Venue and Date
+        """
+        query = """
+            SELECT GameId, Venue, Date
+            FROM games
+            WHERE MaxTemp IS NULL AND MinTemp IS NULL AND Rainfall IS NULL
+        """
+        if year is None:
+            return await self.fetch_all(query)
+
+        return await self.fetch_all(f"{query} AND Year = $1", (year,))
+
+    async def update_weather(self, weather: List[Tuple[str, float | None, float | None, float | None]]) -> None:
+        """Set the weather of existing games
+
+        Args:
+            weather (List[Tuple[str, float | None, float | None, float | None]]): GameId, MaxTemp, MinTemp
+            and Rainfall of each game
+        """
+        if not weather:
+            return
+
+        query = """
+            UPDATE games
+            SET MaxTemp = $2, MinTemp = $3, Rainfall = $4
+            WHERE GameId = $1
+        """
+        await self.execute_batch(query, weather)
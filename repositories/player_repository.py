@@ -1,28 +1,68 @@
-from typing import List
+from typing import Dict, List, Tuple
 from dtos.player_profile_dto import PlayerProfileDTO
 from repositories.base_repository import BaseRepository
 
 
 class PlayerRepository(BaseRepository):
+    # rows per insert_players statement, keeps the parameters under sqlite's limit of 32766
+    INSERT_ROWS = 1000
+
+    # matches the players_name_dob_idx expression index, so the lookup stays case insensitive
+    CHECK_PLAYER_EXISTS_QUERY = """
+        SELECT PlayerId
+        FROM players
+        WHERE lower(DisplayName) = lower($1) AND Dob = $2
+        LIMIT 1
+    """
+
     async def check_player_exists(self, display_name: str, dob: str):
-        query = """
-            SELECT *
-            FROM players
-            WHERE DisplayName ILIKE $1 AND Dob = $2
-            LIMIT 1
-        """
-        return await self.fetch_one(query, (display_name, dob,))
+        return await self.fetch_one(self.CHECK_PLAYER_EXISTS_QUERY, (display_name, dob,))
     
-    async def insert_players(self, player_dtos: List[PlayerProfileDTO]):
-        if not player_dtos:
-            return
-        
-        columns, placeholders, values = self.get_columns_placeholders_and_values(player_dtos)
-
-        query = f"""
-            INSERT INTO players
-            ({columns}) VALUES ({placeholders})
-            ON CONFLICT (PlayerId) DO NOTHING
+    async def get_identities(self) -> List[Tuple[str, str, str]]:
+        """PlayerId, DisplayName and Dob of every stored player, used to match imported players"""
+        rows = await self.fetch_all("SELECT PlayerId, DisplayName, Dob FROM players")
+
+        return [tuple(row) for row in rows]
+
+    async def insert_players(self, player_dtos: List[PlayerProfileDTO]) -> Dict[str, str]:
+        """Insert players, keeping the stored PlayerId of anyone already stored under the same name
+        and dob. Parallel replay workers each give a new player their own id, only one is stored.
+
+        Args:
+            player_dtos (List[PlayerProfileDTO]): Players to insert
+
+        Returns:
+            Dict[str, str]: The stored PlayerId of each given PlayerId
         """
+        if not player_dtos:
+            return {}
+
+        # a statement can't update the same row twice, so each player is inserted once
+        players: Dict[Tuple[str, str], PlayerProfileDTO] = {}
+        for dto in player_dtos:
+            players.setdefault((dto.display_name.lower(), dto.dob), dto)
+        unique = list(players.values())
+
+        stored_ids: Dict[Tuple[str, str], str] = {}
+        for start in range(0, len(unique), self.INSERT_ROWS):
+            chunk = unique[start:start + self.INSERT_ROWS]
+            columns, _, values = self.get_columns_placeholders_and_values(chunk)
+            width = len(values[0])
+            rows = ", ".join(
+                "(" + ", ".join(f"${row * width + column}" for column in range(1, width + 1)) + ")"
+                for row in range(len(chunk))
+            )
+            query = f"""
+                INSERT INTO players
+                ({columns}) VALUES {rows}
+                ON CONFLICT (lower(DisplayName), Dob) DO UPDATE SET DisplayName = EXCLUDED.DisplayName
+                RETURNING PlayerId, DisplayName, Dob
+            """
+            for player_id, display_name, dob in await self.fetch_all(query, tuple(value for row in values for value in row)):
+                stored_ids[(display_name, dob)] = player_id
 
-        await self.execute_batch(query, values) 
+        return {
+            dto.player_id: stored_ids[(players[key].display_name, players[key].dob)]
+            for dto in player_dtos
+            for key in [(dto.display_name.lower(), dto.dob)]
+        }
@@ -1,27 +1,89 @@
-from typing import List
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from column_reader import DEFAULT_CHUNK_SIZE, TEXT
+from database import AsyncDatabaseConnection
 from dtos.stats_dto import PlayerMatchStatsDTO
+from repositories.aggregate_repository import STAT_COLUMNS, AggregateRepository
 from repositories.base_repository import BaseRepository
+from storage import StorageSink
 
 
 class StatRepository(BaseRepository):
-    def check_stat_exists(self, game_id: str, player_id: str) -> bool:
-        query = """
-            SELECT 1
-            FROM stats
-            WHERE GameId ILIKE $1 and PlayerId ILIKE $2
-            LIMIT 1
-        """
-        return self.fetch_one(query, (game_id, player_id))
+    def __init__(self, sink: StorageSink | AsyncDatabaseConnection):
+        super().__init__(sink)
+        self.aggregates = AggregateRepository(self.sink)
+
+    # ids are generated by the scraper so an exact match on the primary key is enough
+    CHECK_STAT_EXISTS_QUERY = """
+        SELECT 1
+        FROM stats
+        WHERE GameId = $1 AND PlayerId = $2
+        LIMIT 1
+    """
+
+    # dtype of each column read by get_stat_columns
+    STAT_COLUMN_TYPES = {
+        "GameId": TEXT,
+        "Team": TEXT,
+        "Year": np.int16,
+        "Round": TEXT,
+        "PlayerId": TEXT,
+        **{column: np.int16 for column in STAT_COLUMNS},
+    }
+
+    async def check_stat_exists(self, game_id: str, player_id: str) -> bool:
+        result = await self.fetch_one(self.CHECK_STAT_EXISTS_QUERY, (game_id, player_id))
+
+        return result is not None
     
-    def insert_stats(self, stat_dtos: List[PlayerMatchStatsDTO]) -> None:
+    async def insert_stats(self, stat_dtos: List[PlayerMatchStatsDTO], refresh_aggregates: bool = True) -> None:
+        """Upsert stats and refresh the aggregate rows they touch
+
+        Args:
+            stat_dtos (List[PlayerMatchStatsDTO]): Stats to write
+            refresh_aggregates (bool, optional): Bulk loads turn this off and rebuild the
+            aggregates once they're done. Defaults to True.
+        """
         if not stat_dtos:
             return
         
         columns, placeholders, values = self.get_columns_placeholders_and_values(stat_dtos)
         
+        upsert = self.get_upsert_clause("stats", columns, ["GameId", "PlayerId"])
         query = f"""
             INSERT INTO stats
             ({columns}) VALUES ({placeholders})
-            ON CONFLICT (GameId, PlayerId) DO NOTHING
+            {upsert}
+        """
+        await self.execute_batch(query, values)
+        if refresh_aggregates:
+            await self.aggregates.refresh_for_stats(stat_dtos)
+
+    async def get_stat_columns(
+            self,
+            start_year: Optional[int] = None,
+            end_year: Optional[int] = None,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Dict[str, np.ndarray]:
+        """Every stat of a range of seasons as one array per column, in primary key order
+
+        Args:
+            start_year (Optional[int], optional): First season read. Defaults to the first stored.
+            end_year (Optional[int], optional): Last season read. Defaults to the last stored.
+            chunk_size (int, optional): Rows streamed at a time. Defaults to DEFAULT_CHUNK_SIZE.
+
+        Returns:
+            Dict[str, np.ndarray]: Columns of STAT_COLUMN_TYPES, by name
         """
-        self.execute_batch(query, values)
\ No newline at end of file
+        conditions, params = self.get_year_range(start_year, end_year)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT {", ".join(self.STAT_COLUMN_TYPES)}
+            FROM stats
+            {where}
+            ORDER BY GameId, PlayerId
+        """
+
+        return await self.fetch_columns(query, params, self.STAT_COLUMN_TYPES, chunk_size)
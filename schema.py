@@ -0,0 +1,369 @@
+"""Database schema owned by the project.
+
+Migrations are applied in order and recorded in ``schema_migrations`` so running
+``python schema.py migrate`` against an existing database only applies the new ones.
+``python schema.py check`` runs EXPLAIN on the repositories' lookup queries and
+confirms each one is served by its index, and ``python schema.py rebuild-aggregates``
+recomputes the aggregate tables from the stats table.
+"""
+
+import asyncio
+import datetime
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+from database import AsyncDatabaseConnection
+from logger import logger, setup_logging
+from repositories.aggregate_repository import AggregateRepository
+from repositories.game_repository import GameRepository
+from repositories.player_repository import PlayerRepository
+from repositories.stats_repository import StatRepository
+
+QUARTERS = ["QT", "HT", "3QT", "FT"]
+
+
+def _score_decomposition_statements() -> List[str]:
+    """Statements which replace the G.B text score columns with integer goals, behinds
+    and points columns per quarter. Existing rows are converted in one UPDATE per table.
+    """
+    added, converted, dropped = [], [], []
+    for team in ("HomeTeam", "AwayTeam"):
+        for quarter in QUARTERS:
+            old_column = f"{team}Score{quarter}"
+            goals, behinds, points = (f"{team}{kind}{quarter}" for kind in ("Goals", "Behinds", "Points"))
+            added.extend(f"ADD COLUMN IF NOT EXISTS {column} smallint" for column in (goals, behinds, points))
+            old_goals = f"NULLIF(split_part({old_column}, '.', 1), '')::smallint"
+            old_behinds = f"NULLIF(split_part({old_column}, '.', 2), '')::smallint"
+            converted.extend([
+                f"{goals} = {old_goals}",
+                f"{behinds} = {old_behinds}",
+                f"{points} = {old_goals} * 6 + {old_behinds}",
+            ])
+            dropped.append(f"DROP COLUMN {old_column}")
+
+    return [
+        f"ALTER TABLE games {', '.join(added)}",
+        f"UPDATE games SET {', '.join(converted)}",
+        f"ALTER TABLE games {', '.join(dropped)}",
+        r"""
+        ALTER TABLE games
+            ALTER COLUMN HomeTeamScore TYPE smallint USING HomeTeamScore::smallint,
+            ALTER COLUMN AwayTeamScore TYPE smallint USING AwayTeamScore::smallint,
+            ALTER COLUMN Date TYPE date USING CASE
+                WHEN Date ~ '^\d{4}-' THEN Date::date
+                ELSE to_date(Date, 'DD-Mon-YYYY')
+            END,
+            ALTER COLUMN StartTime TYPE time USING to_timestamp(StartTime, 'HH12:MI AM')::time
+        """,
+    ]
+
+
+# (version, description, statements). Statements are written out rather than built from the
+# repositories' constants, so a column added later goes in a new migration
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "create games, players and stats tables", [
+        """
+        CREATE TABLE IF NOT EXISTS games (
+            GameId text PRIMARY KEY,
+            Year smallint NOT NULL,
+            Round text NOT NULL,
+            Venue text NOT NULL,
+            Attendance integer,
+            Date text NOT NULL,
+            StartTime text,
+            HomeTeam text NOT NULL,
+            HomeTeamScoreQt text,
+            HomeTeamScoreHT text,
+            HomeTeamScore3QT text,
+            HomeTeamScoreFT text,
+            HomeTeamScore text,
+            AwayTeam text NOT NULL,
+            AwayTeamScoreQT text,
+            AwayTeamScoreHT text,
+            AwayTeamScore3QT text,
+            AwayTeamScoreFT text,
+            AwayTeamScore text,
+            MaxTemp real,
+            MinTemp real,
+            Rainfall real
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS players (
+            PlayerId text PRIMARY KEY,
+            DisplayName text NOT NULL,
+            Height smallint,
+            Weight smallint,
+            Dob text NOT NULL,
+            Position text,
+            Origin text
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS stats (
+            GameId text NOT NULL,
+            Team text NOT NULL,
+            Year smallint NOT NULL,
+            Round text NOT NULL,
+            PlayerId text NOT NULL,
+            DisplayName text NOT NULL,
+            Kicks smallint NOT NULL,
+            Marks smallint NOT NULL,
+            Handballs smallint NOT NULL,
+            Disposals smallint NOT NULL,
+            Goals smallint NOT NULL,
+            Behinds smallint NOT NULL,
+            Tackles smallint NOT NULL,
+            Hitouts smallint NOT NULL,
+            Clearances smallint NOT NULL,
+            Clangers smallint NOT NULL,
+            Frees smallint NOT NULL,
+            FreesAgainst smallint NOT NULL,
+            Rebounds smallint NOT NULL,
+            Inside50s smallint NOT NULL,
+            BrownlowVotes smallint NOT NULL,
+            ContestedPossessions smallint NOT NULL,
+            UncontestedPossessions smallint NOT NULL,
+            ContestedMarks smallint NOT NULL,
+            MarksInside50 smallint NOT NULL,
+            OnePercenters smallint NOT NULL,
+            Bounces smallint NOT NULL,
+            GoalAssists smallint NOT NULL,
+            PercentPlayed smallint NOT NULL,
+            PRIMARY KEY (GameId, PlayerId)
+        )
+        """,
+    ]),
+    (2, "index the repositories' lookup queries", [
+        # GameRepository.check_game_exists
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS games_date_teams_idx
+        ON games (Date, HomeTeam, AwayTeam) INCLUDE (GameId)
+        """,
+        # PlayerRepository.check_player_exists. Covering so the lookup is an index only scan
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS players_name_dob_idx
+        ON players (lower(DisplayName), Dob) INCLUDE (PlayerId)
+        """,
+        # StatRepository.check_stat_exists is served by the primary key, this one is for per player reads
+        """
+        CREATE INDEX IF NOT EXISTS stats_player_idx
+        ON stats (PlayerId)
+        """,
+    ]),
+    (3, "store scores as integer goals, behinds and points and dates and times natively",
+        _score_decomposition_statements()),
+    (4, "create player and team aggregate tables", [
+        """
+        CREATE TABLE IF NOT EXISTS player_season_stats (
+            PlayerId text NOT NULL,
+            Year smallint NOT NULL,
+            Games integer NOT NULL DEFAULT 0,
+            Kicks integer NOT NULL DEFAULT 0,
+            Marks integer NOT NULL DEFAULT 0,
+            Handballs integer NOT NULL DEFAULT 0,
+            Disposals integer NOT NULL DEFAULT 0,
+            Goals integer NOT NULL DEFAULT 0,
+            Behinds integer NOT NULL DEFAULT 0,
+            Hitouts integer NOT NULL DEFAULT 0,
+            Tackles integer NOT NULL DEFAULT 0,
+            Rebounds integer NOT NULL DEFAULT 0,
+            Inside50s integer NOT NULL DEFAULT 0,
+            Clearances integer NOT NULL DEFAULT 0,
+            Clangers integer NOT NULL DEFAULT 0,
+            Frees integer NOT NULL DEFAULT 0,
+            FreesAgainst integer NOT NULL DEFAULT 0,
+            BrownlowVotes integer NOT NULL DEFAULT 0,
+            ContestedPossessions integer NOT NULL DEFAULT 0,
+            UncontestedPossessions integer NOT NULL DEFAULT 0,
+            ContestedMarks integer NOT NULL DEFAULT 0,
+            MarksInside50 integer NOT NULL DEFAULT 0,
+            OnePercenters integer NOT NULL DEFAULT 0,
+            Bounces integer NOT NULL DEFAULT 0,
+            GoalAssists integer NOT NULL DEFAULT 0,
+            PercentPlayed integer NOT NULL DEFAULT 0,
+            PRIMARY KEY (PlayerId, Year)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS team_season_stats (
+            Team text NOT NULL,
+            Year smallint NOT NULL,
+            Games integer NOT NULL DEFAULT 0,
+            Kicks integer NOT NULL DEFAULT 0,
+            Marks integer NOT NULL DEFAULT 0,
+            Handballs integer NOT NULL DEFAULT 0,
+            Disposals integer NOT NULL DEFAULT 0,
+            Goals integer NOT NULL DEFAULT 0,
+            Behinds integer NOT NULL DEFAULT 0,
+            Hitouts integer NOT NULL DEFAULT 0,
+            Tackles integer NOT NULL DEFAULT 0,
+            Rebounds integer NOT NULL DEFAULT 0,
+            Inside50s integer NOT NULL DEFAULT 0,
+            Clearances integer NOT NULL DEFAULT 0,
+            Clangers integer NOT NULL DEFAULT 0,
+            Frees integer NOT NULL DEFAULT 0,
+            FreesAgainst integer NOT NULL DEFAULT 0,
+            BrownlowVotes integer NOT NULL DEFAULT 0,
+            ContestedPossessions integer NOT NULL DEFAULT 0,
+            UncontestedPossessions integer NOT NULL DEFAULT 0,
+            ContestedMarks integer NOT NULL DEFAULT 0,
+            MarksInside50 integer NOT NULL DEFAULT 0,
+            OnePercenters integer NOT NULL DEFAULT 0,
+            Bounces integer NOT NULL DEFAULT 0,
+            GoalAssists integer NOT NULL DEFAULT 0,
+            PercentPlayed integer NOT NULL DEFAULT 0,
+            PRIMARY KEY (Team, Year)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS team_round_stats (
+            Team text NOT NULL,
+            Year smallint NOT NULL,
+            Round text NOT NULL,
+            Games integer NOT NULL DEFAULT 0,
+            Kicks integer NOT NULL DEFAULT 0,
+            Marks integer NOT NULL DEFAULT 0,
+            Handballs integer NOT NULL DEFAULT 0,
+            Disposals integer NOT NULL DEFAULT 0,
+            Goals integer NOT NULL DEFAULT 0,
+            Behinds integer NOT NULL DEFAULT 0,
+            Hitouts integer NOT NULL DEFAULT 0,
+            Tackles integer NOT NULL DEFAULT 0,
+            Rebounds integer NOT NULL DEFAULT 0,
+            Inside50s integer NOT NULL DEFAULT 0,
+            Clearances integer NOT NULL DEFAULT 0,
+            Clangers integer NOT NULL DEFAULT 0,
+            Frees integer NOT NULL DEFAULT 0,
+            FreesAgainst integer NOT NULL DEFAULT 0,
+            BrownlowVotes integer NOT NULL DEFAULT 0,
+            ContestedPossessions integer NOT NULL DEFAULT 0,
+            UncontestedPossessions integer NOT NULL DEFAULT 0,
+            ContestedMarks integer NOT NULL DEFAULT 0,
+            MarksInside50 integer NOT NULL DEFAULT 0,
+            OnePercenters integer NOT NULL DEFAULT 0,
+            Bounces integer NOT NULL DEFAULT 0,
+            GoalAssists integer NOT NULL DEFAULT 0,
+            PercentPlayed integer NOT NULL DEFAULT 0,
+            PRIMARY KEY (Team, Year, Round)
+        )
+        """,
+        # used to find the stats rows behind the team aggregates
+        "CREATE INDEX IF NOT EXISTS stats_team_year_round_idx ON stats (Team, Year, Round)",
+        "CREATE INDEX IF NOT EXISTS stats_player_year_idx ON stats (PlayerId, Year)",
+        "DROP INDEX IF EXISTS stats_player_idx", # superseded by stats_player_year_idx
+    ]),
+    (5, "record the content hash of each game's match page", [
+        "ALTER TABLE games ADD COLUMN IF NOT EXISTS ContentHash text",
+        # GameRepository.get_content_hashes, read once per season before scraping
+        "CREATE INDEX IF NOT EXISTS games_year_idx ON games (Year) INCLUDE (GameId, ContentHash)",
+    ]),
+]
+
+# name, query, sample parameters and the index that should serve it
+INDEX_CHECKS: List[Tuple[str, str, Tuple[Any, ...], str]] = [
+    ("check_game_exists", GameRepository.CHECK_GAME_EXISTS_QUERY, (datetime.date(2025, 3, 16), "Carlton", "Richmond"), "games_date_teams_idx"),
+    ("check_player_exists", PlayerRepository.CHECK_PLAYER_EXISTS_QUERY, ("Draper, Sid", "2004-01-01"), "players_name_dob_idx"),
+    ("check_stat_exists", StatRepository.CHECK_STAT_EXISTS_QUERY, ("2025R0101", "abcdefghij"), "stats_pkey"),
+    ("get_content_hashes", GameRepository.GET_CONTENT_HASHES_QUERY, (2025,), "games_year_idx"),
+]
+
+
+async def apply_migrations(db_manager: AsyncDatabaseConnection) -> List[int]:
+    """Apply any migrations which haven't been applied to the database yet
+
+    Args:
+        db_manager (AsyncDatabaseConnection): Connection manager for the database
+
+    Returns:
+        List[int]: Versions of the migrations which were applied
+    """
+    applied = []
+    async with db_manager.connection_from_pool() as conn:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                Version integer PRIMARY KEY,
+                Description text NOT NULL,
+                AppliedAt timestamptz NOT NULL DEFAULT now()
+            )
+        """)
+        rows = await conn.fetch("SELECT Version FROM schema_migrations")
+        current = {row[0] for row in rows}
+
+        for version, description, statements in MIGRATIONS:
+            if version in current:
+                continue
+
+            logger.info(f"Applying migration {version}: {description}")
+            async with conn.transaction():
+                for statement in statements:
+                    await conn.execute(statement)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (Version, Description) VALUES ($1, $2)",
+                    version, description
+                )
+            applied.append(version)
+
+    return applied
+
+
+def _plan_indexes(plan: Dict[str, Any]) -> List[str]:
+    """Collect the names of every index used anywhere in an EXPLAIN plan"""
+    indexes = [plan["Index Name"]] if "Index Name" in plan else []
+    for child in plan.get("Plans", []):
+        indexes.extend(_plan_indexes(child))
+
+    return indexes
+
+
+async def check_index_usage(db_manager: AsyncDatabaseConnection) -> Dict[str, bool]:
+    """EXPLAIN each repository lookup and confirm it is served by the expected index.
+    Sequential scans are disabled for the check, otherwise the planner prefers them
+    on small tables and the result says nothing about the index.
+
+    Args:
+        db_manager (AsyncDatabaseConnection): Connection manager for the database
+
+    Returns:
+        Dict[str, bool]: Whether each query used its index
+    """
+    results = {}
+    async with db_manager.connection_from_pool() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            for name, query, params, index in INDEX_CHECKS:
+                plan = json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *params))
+                used = _plan_indexes(plan[0]["Plan"])
+                results[name] = index in used
+                if results[name]:
+                    logger.info(f"✅ {name} uses {index}")
+                else:
+                    logger.warning(f"❌ {name} does not use {index}, plan used: {used or 'no index'}")
+
+    return results
+
+
+async def _run(command: str) -> int:
+    db_manager = AsyncDatabaseConnection()
+    try:
+        if command == "migrate":
+            applied = await apply_migrations(db_manager)
+            logger.info(f"Applied migrations: {applied or 'none'}")
+            return 0
+        if command == "rebuild-aggregates":
+            await AggregateRepository(db_manager).rebuild()
+            return 0
+        results = await check_index_usage(db_manager)
+        return 0 if all(results.values()) else 1
+    finally:
+        await db_manager.close_all()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command not in ("migrate", "check", "rebuild-aggregates"):
+        print("Usage: python schema.py [migrate|check|rebuild-aggregates]")
+        sys.exit(2)
+    sys.exit(asyncio.run(_run(command)))
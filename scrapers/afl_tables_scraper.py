@@ -1,4 +1,3 @@
-import asyncio
 import re
 from urllib.parse import urljoin
 from collections import defaultdict
@@ -8,15 +7,19 @@ from typing import List, Optional, Tuple
 import httpx
 from bs4 import BeautifulSoup, ResultSet
 
+from archive import PageArchive
 from database import AsyncDatabaseConnection
-from dtos.games_dto import GameDTO, MatchMetadataDTO, MatchScoreDTO, ReducedGameDTO
+from dtos.games_dto import GameDTO, MatchMetadataDTO, MatchScoreDTO
 from dtos.player_profile_dto import PlayerProfileDTO
 from dtos.stats_dto import PlayerMatchStatsDTO
-from helpers import before_second_dot, convert_date_format, field_names
+from helpers import field_names, page_hash, parse_match_date, parse_start_time, split_score
+from memory import MemoryMonitor, SpillBuffer
 from repositories.game_repository import GameRepository
 from repositories.player_repository import PlayerRepository
 from repositories.stats_repository import StatRepository
 from scrapers.footy_wire_scraper import FootyWireScraper
+from scrapers.table_extractor import MatchStatsTable, extract_match_stats_tables
+from single_flight import SingleFlight
 from services.game_service import GameService
 from services.player_service import PlayerService
 from services.stat_service import StatService
@@ -30,6 +33,9 @@ class AflTablesScraper():
         stat_service: StatService,
         base_url: str,
         footy_wire_scraper: FootyWireScraper,
+        page_archive: Optional[PageArchive] = None,
+        replay: bool = False,
+        memory_monitor: Optional[MemoryMonitor] = None,
     ):
         self.player_service = player_service
         self.game_service = game_service
@@ -37,11 +43,69 @@ class AflTablesScraper():
         self.footy_wire_scraper = footy_wire_scraper
         self.base_url = base_url
         self.game_index_counter = defaultdict(int)
-        self.player_tracker: set[Tuple[str, str]] = set()
-        self.scraped_players: set[PlayerProfileDTO] = set()
-        self.scraped_stats: set[PlayerMatchStatsDTO] = set()
-        self.scraped_games: set[GameDTO] = set()
-        self._player_lock = asyncio.Lock()
+        self.stored_game_ids: set[str] = set() # ids already taken in the db, new games skip over them
+        self.stored_hashes: set[str] = set() # content hashes of the match pages already stored
+        self.unchanged_pages = 0
+        self.scraped_players = SpillBuffer(PlayerProfileDTO, "players", memory_monitor)
+        self.scraped_stats = SpillBuffer(PlayerMatchStatsDTO, "stats", memory_monitor)
+        self.scraped_games = SpillBuffer(GameDTO, "games", memory_monitor)
+        self.page_archive = page_archive
+        self.replay = replay
+        # concurrent match tasks share fetches of the same page, player dob or player profile.
+        # match pages are read twice back to back so only a few are kept, dobs are small and reused all season
+        self._pages = SingleFlight(
+            "pages", ttl=60, max_entries=128,
+            should_cache=lambda response: response.status_code == httpx.codes.OK
+        )
+        self._dobs = SingleFlight("player dobs", ttl=3600, max_entries=8192, should_cache=bool)
+        # the player id of every (display_name, dob) is kept for the whole run so a new player
+        # isn't given a second id before the scraped profiles are written
+        self._players = SingleFlight("player profiles", ttl=None, max_entries=None)
+
+    async def load_stored_games(self, year: int) -> None:
+        """Load the ids and page hashes of the games already stored for a season, so unchanged
+        match pages can be skipped and new games aren't given an id which is already taken.
+        Pages are only skipped when fetching, never when replaying the archive.
+
+        Args:
+            year (int): Season being scraped
+        """
+        content_hashes = await self.game_service.get_content_hashes(year)
+        self.stored_game_ids = set(content_hashes)
+        self.stored_hashes = {content_hash for content_hash in content_hashes.values() if content_hash}
+        logger.info(f"{len(content_hashes)} games already stored for {year}")
+
+    def log_fetch_summary(self) -> None:
+        for flight in (self._pages, self._dobs, self._players):
+            flight.log_summary()
+
+    async def _get_page(self, client: httpx.AsyncClient, url: str) -> httpx.Response:
+        """Get a page from the website, or from the page archive when replaying.
+        Successful responses are written to the archive so they can be replayed later.
+        Tasks asking for a page which is already being fetched share that fetch.
+
+        Args:
+            client (httpx.AsyncClient): Client used to make the request
+            url (str): Url of the page
+
+        Returns:
+            httpx.Response: Response for the page
+        """
+        return await self._pages.do(url, self._fetch_page, client, url)
+
+    async def _fetch_page(self, client: httpx.AsyncClient, url: str) -> httpx.Response:
+        if self.replay:
+            text = self.page_archive.get(url)
+            if text is None:
+                logger.warning(f"{url} not found in page archive")
+                return httpx.Response(httpx.codes.NOT_FOUND)
+            return httpx.Response(httpx.codes.OK, text=text)
+
+        response = await client.get(url)
+        if self.page_archive is not None and response.status_code == httpx.codes.OK:
+            self.page_archive.put(url, response.text)
+
+        return response
 
     async def get_match_links(self, year: int = 2025) -> List[str]:
         """Get a list of endpoints which refer to specific match stats for a given year
@@ -55,7 +119,7 @@ class AflTablesScraper():
         """
         logger.info("Getting a list of endpoints which refer to stats from specific games")
         async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}{year}t.html")
+            response = await self._get_page(client, f"{self.base_url}{year}t.html")
 
             if response.status_code == httpx.codes.OK:
                 soup = BeautifulSoup(response.text, "html.parser")
@@ -68,22 +132,30 @@ class AflTablesScraper():
                 logger.error(f"❌ Failed to fetch match links for {year}. Status: {response.status_code}")
                 logger.info(f"Response content: {response.text}")
 
-    async def get_match_related_data(self, match_endpoint: str) -> GameDTO | ReducedGameDTO:
+    async def get_match_related_data(self, match_endpoint: str) -> GameDTO | None:
         """Get game related data for a given game. THings like attendance, home team, away team etc.
+        Pages whose content hash matches a stored game haven't changed and aren't parsed at all,
+        unless the archive is being replayed.
 
         Args:
             match_endpoint (str): Endpoint url for a specific afl match
 
         Returns:
-            GameDTO | ReducedGameDTO: Either return a full GameDTO which is then added to the set, or a ReducedDTO
-            which is used to query player stats.
+            GameDTO | None: The game, or None if its page is unchanged or couldn't be read. Games
+            which are already stored keep their GameId and are updated where they differ.
         """
 
         async with httpx.AsyncClient() as client:
             logger.info("Getting game related data")
-            response = await client.get(f"{self.base_url}{match_endpoint}")
+            response = await self._get_page(client, f"{self.base_url}{match_endpoint}")
 
             if response.status_code == httpx.codes.OK:
+                content_hash = page_hash(response.text)
+                # a replay re-derives every page, so extractor fixes reach the games already stored
+                if not self.replay and content_hash in self.stored_hashes:
+                    logger.info(f"{match_endpoint} is unchanged since it was stored, skipping")
+                    self.unchanged_pages += 1
+                    return None
 
                 soup = BeautifulSoup(response.text, "html.parser")
 
@@ -93,12 +165,13 @@ class AflTablesScraper():
                 match_scores_dto = self._get_match_score_data(all_rows)
                 metadata_dto = await self._get_match_metadata(all_rows, match_scores_dto.home_team, match_scores_dto.away_team)
 
-                if isinstance(metadata_dto, ReducedGameDTO):
-                    return metadata_dto
-                
                 if metadata_dto is not None:
                     logger.info("Adding game to DTO")
-                    game_dto = GameDTO(**metadata_dto.model_dump(), **match_scores_dto.model_dump())
+                    game_dto = GameDTO(
+                        **metadata_dto.model_dump(),
+                        **match_scores_dto.model_dump(),
+                        content_hash=content_hash
+                    )
                     return game_dto
             else:
                 logger.error(f"❌ Failed to fetch match metadata and score data. Status: {response.status_code}")
@@ -126,85 +199,82 @@ class AflTablesScraper():
             of the PlayerMatchStatsDTO and a list of PlayerProfileDTO
         """
         logger.info(f"Getting player stats for game: {game_id}")
-        match_stats_tables = await self._get_table_element_from_page(match_endpoint)     
+        match_stats_tables = await self._get_match_stats_tables(match_endpoint)     
 
         if not match_stats_tables:
             # if the stats don't exist return a tuple of empty sets
             return None
         
-        for index, table in enumerate(match_stats_tables):
-            rows = table.find_all("tr")[2:]  # skip header rows
-            for row in rows:
-                cells = row.find_all("td") # get all the cells
-                if len(cells) < 25:
-                    continue  # skip malformed or empty rows
-                
-                # Get the players name
-                player_link = cells[1].find("a")["href"] # url for player profile
-                display_name = cells[1].get_text(strip=True)
+        for index, stats_table in enumerate(match_stats_tables):
+            team = home_team if index == 0 else away_team
+            player_rows = [] # (row in the table, player_id) of every player with a profile
 
+            for row, (display_name, player_link) in enumerate(zip(stats_table.display_names, stats_table.player_links)):
                 # get the D.O.B from the player profile
                 dob = await self._get_player_dob(player_link)
                 if not dob:
                     continue
 
-                key = (display_name, dob)
-
-                async with self._player_lock:
-                    if key in self.player_tracker:
-                        logger.info(f"{display_name} already scraped")
-                        continue
-                    self.player_tracker.add(key)
-
-                # check if the player exists by querying display_name and dob
-                existing_player_db = await self.player_service.get_player_from_db(display_name, dob)
-
-                if existing_player_db:
-                    player_id = existing_player_db[0] # first column is player_id. Use this value in the stats dto
-                else:
-                    # create a player profile dto which will then be inserted into the db
-                    logger.info(f"Scraping profile data for {display_name}")
-                    player_profile = self.footy_wire_scraper._get_player_profile_stats(
-                        team_name=home_team if index == 0 else away_team,
-                        display_name=display_name,
-                        dob=dob
-                    )
-
-                    if player_profile:
-                        self.scraped_players.add(player_profile)
-                        player_id = player_profile.player_id # need to set the player_id value for the next dto
-                
+                # every match a player appears in shares the one lookup of their profile
+                player_id = await self._players.do(
+                    (display_name, dob), self._resolve_player_id, display_name, dob, team
+                )
                 if not player_id:
                     continue # skip stats if no player ID
 
-                # Map field names to their corresponding int values from cells[2:25]
-                # Unpack dictionary to form DTO
-                stat_exists = await self.stat_service.check_if_stat_exists(game_id, player_id)
-                if not stat_exists:
-                    stat_values = {
-                        field: int(cells[i + 2].get_text(strip=True) or 0) 
-                        for i, field in enumerate(field_names)
-                    }
-
-                    player_stats_dto = PlayerMatchStatsDTO(
-                        player_name=display_name,
-                        player_id=player_id,
-                        game_id=game_id,
-                        team=home_team if index == 0 else away_team,
-                        year=2025,
-                        round=round_id,
-                        **stat_values
-                    )
-                    
-                    self.scraped_stats.add(player_stats_dto)
+                player_rows.append((row, player_id))
+
+            # build the stat dtos for the whole table from the extracted matrix. Rows which are
+            # already stored are only rewritten by the upsert if their values changed
+            year = int(game_id[:4])
+            for row, player_id in player_rows:
+                self.scraped_stats.add(PlayerMatchStatsDTO(
+                    player_name=stats_table.display_names[row],
+                    player_id=player_id,
+                    game_id=game_id,
+                    team=team,
+                    year=year,
+                    round=round_id,
+                    **dict(zip(field_names, stats_table.values[row].tolist()))
+                ))
             
+    async def _resolve_player_id(self, display_name: str, dob: str, team: str) -> Optional[str]:
+        """Find a player's id in the db, or scrape their profile from footy wire if they're new
+
+        Args:
+            display_name (str): Name of the player as displayed on afl tables
+            dob (str): Player's date of birth
+            team (str): Team the player played for, used to find their footy wire profile
+
+        Returns:
+            Optional[str]: Id of the player, or None if they have no profile
+        """
+        # check if the player exists by querying display_name and dob
+        existing_player_db = await self.player_service.get_player_from_db(display_name, dob)
+        if existing_player_db:
+            return existing_player_db[0] # first column is player_id. Use this value in the stats dto
+
+        # create a player profile dto which will then be inserted into the db
+        logger.info(f"Scraping profile data for {display_name}")
+        player_profile = self.footy_wire_scraper._get_player_profile_stats(
+            team_name=team,
+            display_name=display_name,
+            dob=dob
+        )
+        if not player_profile:
+            return None
+
+        self.scraped_players.add(player_profile)
+        return player_profile.player_id
+
     async def _get_match_metadata(
             self,
             all_rows: ResultSet,
             home_team: str,
             away_team: str
-    ) -> MatchMetadataDTO | ReducedGameDTO | None:
-        """Scrape metadata of a specific match from afl tables website
+    ) -> MatchMetadataDTO | None:
+        """Scrape metadata of a specific match from afl tables website. A game which is already
+        stored keeps its GameId, a new one is given the next free id in its round.
 
         Args:
             all_rows (ResultSet): A collection of all of the rows from the HTML table containing the metadata
@@ -224,43 +294,41 @@ class AflTablesScraper():
         logger.info("Checking input against regex pattern")
         if match:
             round = match.group(1) # get the round from the string
-            year = match.group(3).split("-")[2] # get the year from the string
-            date = convert_date_format(match.group(3))
-            # increment the game index counter
-            self.game_index_counter[round] += 1
-            game_index = self.game_index_counter[round]
-
-            # Build the game id string
-            game_id = f"{year}R{int(match.group(1)):02d}{game_index:02d}"
-            game_exists = await self.game_service.check_if_game_exists(date, home_team, away_team)
+            date = parse_match_date(match.group(3))
+            year = date.year
 
-            if not game_exists:
-                # only want to add the dto if it doesn't already exist in the db
-                logger.info("Game does not exist in db, extracting data into DTO")
-                metadata_dto = MatchMetadataDTO(
-                    game_id = game_id,
-                    year=year,
-                    round_id = round,
-                    venue = match.group(2).strip(),
-                    date = match.group(3),
-                    start_time = match.group(4),
-                    attendance = int(match.group(5))
-                )
+            game_id = await self.game_service.get_game_id(date, home_team, away_team)
+            if game_id is not None:
+                logger.info("Game exists in db but its page has changed, extracting data into DTO")
             else:
-                logger.info("Game exists in db")
-                # return a reduced DTO with enough data to search for player stats
-                return ReducedGameDTO(
-                    game_id=game_id,
-                    home_team=home_team,
-                    away_team=away_team,
-                    round_id=round
-                )
+                logger.info("Game does not exist in db, extracting data into DTO")
+                game_id = self._next_game_id(year, round)
+
+            metadata_dto = MatchMetadataDTO(
+                game_id = game_id,
+                year=year,
+                round_id = round,
+                venue = match.group(2).strip(),
+                date = date,
+                start_time = parse_start_time(match.group(4)),
+                attendance = int(match.group(5))
+            )
         else:
             logger.warning("No regex match found")
             return None
 
         return metadata_dto
     
+    def _next_game_id(self, year: int, round: str) -> str:
+        """Next GameId in a round which isn't taken by a stored game or another scraped game"""
+        while True:
+            # increment the game index counter
+            self.game_index_counter[round] += 1
+            game_id = f"{year}R{int(round):02d}{self.game_index_counter[round]:02d}"
+            if game_id not in self.stored_game_ids:
+                self.stored_game_ids.add(game_id)
+                return game_id
+
     def _get_match_score_data(self, all_rows: ResultSet) -> MatchScoreDTO:
         """Get the data related to the match score from the afl tables website
 
@@ -272,60 +340,39 @@ class AflTablesScraper():
         """
         remaining_rows = all_rows[1:3] # skip the header row
 
-        teams = []
-        scores_list = []
+        score_fields = {}
 
-        # loop through rows and get the game score data and store it in the respective list
-        for row in remaining_rows:
+        # loop through rows and split each quarter's score into integer goals, behinds and points
+        for side, row in zip(("home_team", "away_team"), remaining_rows):
             cells = row.find_all("td")
             team_name = cells[0].get_text(strip=True)
             logger.info(f"Getting score data for {team_name}")
+            score_fields[side] = team_name
 
-            # afl scores follow and Goal.Behind.Total format. We just want the first 2
-            score_data = [before_second_dot(cells[i].get_text(strip=True)) for i in range(1, 5)]
-            final_score = cells[4].get_text(strip=True).split(".")[2] # Get the final score of the game
-
-            teams.append(team_name)
-            scores_list.append({
-                "qt": score_data[0],
-                "ht": score_data[1],
-                "3qt": score_data[2],
-                "ft": score_data[3],
-                "final_score": final_score
-            })
-
-        return MatchScoreDTO(
-            home_team=teams[0],
-            home_team_score_qt=scores_list[0].get("qt"),
-            home_team_score_ht=scores_list[0].get("ht"),
-            home_team_score_3qt=scores_list[0].get("3qt"),
-            home_team_score_ft=scores_list[0].get("ft"),
-            home_team_score=scores_list[0].get("final_score"),
-            away_team=teams[1],
-            away_team_score_qt=scores_list[1].get("qt"),
-            away_team_score_ht=scores_list[1].get("ht"),
-            away_team_score_3qt=scores_list[1].get("3qt"),
-            away_team_score_ft=scores_list[1].get("ft"),
-            away_team_score=scores_list[1].get("final_score")
-        )
+            # afl scores follow a Goal.Behind.Total format
+            for i, quarter in enumerate(("qt", "ht", "3qt", "ft"), start=1):
+                goals, behinds, points = split_score(cells[i].get_text(strip=True))
+                score_fields[f"{side}_goals_{quarter}"] = goals
+                score_fields[f"{side}_behinds_{quarter}"] = behinds
+                score_fields[f"{side}_points_{quarter}"] = points
 
-    async def _get_table_element_from_page(self, match_endpoint) -> List | bool:
+            score_fields[f"{side}_score"] = score_fields[f"{side}_points_ft"] # final score of the game
+
+        return MatchScoreDTO(**score_fields)
+
+    async def _get_match_stats_tables(self, match_endpoint) -> List[MatchStatsTable] | bool:
         async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.base_url}{match_endpoint}")
+            response = await self._get_page(client, f"{self.base_url}{match_endpoint}")
             if response.status_code == httpx.codes.OK:
-                soup = BeautifulSoup(response.text, "html.parser")
-        
                 # Get all tables with class 'sortable' and Match Statistics in the header
                 logger.info("Getting match stats table")
-                sortable_tables = soup.find_all("table", class_="sortable")
-                match_stats_tables = [table for table in sortable_tables if "Match Statistics" in table.find("th").get_text(strip=True)]
-                return match_stats_tables
+                return extract_match_stats_tables(response.text)
             else:
                 logger.warning("Match stats table not found")
                 return False
     
     async def _get_player_dob(self, player_link: str) -> str | bool:
-        """Scrape the date of birth from the html
+        """Scrape the date of birth from the html. Tasks asking for the same player share one lookup.
 
         Args:
             player_link (str): Endpoint url for given player's profile
@@ -333,19 +380,21 @@ class AflTablesScraper():
         Returns:
             str: Dob as a string
         """
+        return await self._dobs.do(player_link, self._fetch_player_dob, player_link)
+
+    async def _fetch_player_dob(self, player_link: str) -> str | bool:
         async with httpx.AsyncClient() as client:
-            response = await client.get(urljoin(f"{self.base_url}games/2025/", player_link)) #FIXME: fudged url to work with player_link value
+            response = await self._get_page(client, urljoin(f"{self.base_url}games/2025/", player_link)) #FIXME: fudged url to work with player_link value
             if response.status_code == httpx.codes.OK:
                 soup = BeautifulSoup(response.text, "html.parser")
                 born_b_tag = soup.find("b", string=re.compile(r"Born:"))
                 # Extract the text that comes after "Born:" and format it
                 if born_b_tag:
                     # Use regex to extract the date portion
-                    dob = born_b_tag.next_sibling.replace("(", "").strip()
-                else:
-                    print("DOB not found")
+                    return born_b_tag.next_sibling.replace("(", "").strip()
 
-                return dob
+                logger.warning(f"DOB not found for {player_link}")
+                return False
             else:
                 logger.warning("Get request failed so dob not scraped")
                 logger.info("Returning False")
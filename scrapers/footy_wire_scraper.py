@@ -1,19 +1,128 @@
 """Scrape footy wire website to get afl stats data for the 2025 season"""
 
+import datetime
 import re
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from logger import logger
 
 import requests
 from bs4 import BeautifulSoup
 from nanoid import generate
 
+from archive import PageArchive
+from dtos.fixture_dto import FixtureDTO
 from dtos.player_profile_dto import PlayerProfileDTO
-from helpers import name_corrections
+from helpers import finals_round_ids, name_corrections, team_name_corrections
+
+# dates on the fixture, e.g. "Thu 13 Mar 7:30pm". The year is added from the season
+FIXTURE_DATE_FORMATS = ["%a %d %b %I:%M%p %Y", "%a %d %b %Y"]
 
 class FootyWireScraper():
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, page_archive: Optional[PageArchive] = None, replay: bool = False):
         self.base_url = base_url
+        self.page_archive = page_archive
+        self.replay = replay
+
+    def _get_page(self, url: str) -> str:
+        """Get the html for a page, reading from the page archive when replaying
+
+        Args:
+            url (str): Url of the page
+
+        Raises:
+            LookupError: Page is not in the archive during a replay
+
+        Returns:
+            str: Html of the page
+        """
+        if self.replay:
+            text = self.page_archive.get(url)
+            if text is None:
+                raise LookupError(f"{url} not found in page archive")
+            return text
+
+        response = requests.get(url)
+        response.raise_for_status()
+        if self.page_archive is not None:
+            self.page_archive.put(url, response.text)
+
+        return response.text
+
+    def get_fixtures(self, year: int) -> List[FixtureDTO]:
+        """Scrape the season's match list, which has every game of the season with the
+        scores filled in for the games already played
+
+        Args:
+            year (int): Season
+
+        Returns:
+            List[FixtureDTO]: Every game on the fixture, in the order listed
+        """
+        url = f"{self.base_url}/ft_match_list?year={year}"
+        soup = BeautifulSoup(self._get_page(url), "html.parser")
+
+        fixtures = []
+        round_id = None
+        for row in soup.find_all("tr"):
+            cells = row.find_all("td")
+            if len(cells) == 1:
+                # round headers are a single cell spanning the table
+                round_id = self._fixture_round_id(cells[0].get_text(" ", strip=True)) or round_id
+                continue
+
+            if round_id is None or len(cells) < 3:
+                continue
+            teams = cells[1].find_all("a")
+            if len(teams) != 2 or " v " not in cells[1].get_text(" ", strip=True):
+                continue # byes and the table's own header
+
+            date, start_time = self._parse_fixture_date(cells[0].get_text(" ", strip=True), year)
+            if date is None:
+                logger.warning(f"Can't read the date of {cells[1].get_text(' ', strip=True)} in round {round_id}")
+                continue
+
+            scores = [
+                re.fullmatch(r"(\d+)-(\d+)", cell.get_text(strip=True)) for cell in cells[3:]
+            ]
+            score = next((match for match in scores if match), None)
+            home_team, away_team = (
+                team_name_corrections.get(name, name) for name in (team.get_text(strip=True) for team in teams)
+            )
+            fixtures.append(FixtureDTO(
+                year=year,
+                round_id=round_id,
+                date=date,
+                start_time=start_time,
+                home_team=home_team,
+                away_team=away_team,
+                venue=cells[2].get_text(strip=True) or None,
+                home_score=int(score.group(1)) if score else None,
+                away_score=int(score.group(2)) if score else None,
+            ))
+
+        logger.info(f"Found {len(fixtures)} games on the {year} fixture, {sum(not fixture.played for fixture in fixtures)} still to be played")
+        return fixtures
+
+    def _fixture_round_id(self, title: str) -> Optional[str]:
+        """Round id of a fixture round header, e.g. 5 for "Round 5" and GF for "Grand Final" headers"""
+        title = title.lower()
+        if title in finals_round_ids:
+            return finals_round_ids[title]
+        if title == "opening round":
+            return "0"
+        match = re.fullmatch(r"round\s+(\d+)", title)
+
+        return match.group(1) if match else None
+
+    def _parse_fixture_date(self, value: str, year: int) -> Tuple[Optional[datetime.date], Optional[datetime.time]]:
+        for date_format in FIXTURE_DATE_FORMATS:
+            try:
+                parsed = datetime.datetime.strptime(f"{value} {year}", date_format)
+            except ValueError:
+                continue
+            return parsed.date(), parsed.time() if "%I" in date_format else None
+
+        return None, None
 
     def _get_player_profile_stats(
         self,
@@ -36,9 +145,7 @@ class FootyWireScraper():
         
         player_name = self._convert_display_name(display_name)
         url = f"{self.base_url}/pp-{team_name.lower()}--{player_name.lower()}"
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
+        soup = BeautifulSoup(self._get_page(url), "html.parser")
 
         if "Oops! Player Not Found ..." in soup.get_text(strip=True):
             logger.warning(f"Can't find {player_name} in FootyWire")
@@ -0,0 +1,114 @@
+"""Extract the "Match Statistics" tables from afl tables match pages in one pass.
+
+The tables are read straight from the page html instead of through a BeautifulSoup
+tree: each table is cut out of the page, its rows and cells are collected with one
+regex pass, and the stat cells are converted to integers together with numpy.
+Blank cells are read as 0, any other cell which isn't a whole number is an error.
+"""
+
+import html
+import re
+from typing import List, NamedTuple
+
+import numpy as np
+
+from helpers import field_names
+
+FIRST_STAT_CELL = 2 # cells 0 and 1 hold the jumper number and the player's name
+STAT_CELL_COUNT = len(field_names)
+
+TABLE = re.compile(r"<table[^>]*\bclass=[\"']?sortable\b[^>]*>(.*?)</table>", re.S | re.I)
+HEADER = re.compile(r"<th[^>]*>(.*?)</th>", re.S | re.I)
+ROW = re.compile(r"<tr[^>]*>(.*?)</tr>", re.S | re.I)
+CELL = re.compile(r"<td[^>]*>(.*?)</td>", re.S | re.I)
+LINK = re.compile(r"<a[^>]*\bhref=[\"']?([^\"'\s>]+)", re.I)
+TAG = re.compile(r"<[^>]+>")
+
+
+class MatchStatsTable(NamedTuple):
+    display_names: List[str]
+    player_links: List[str]
+    values: np.ndarray # (players, len(field_names)) int matrix, columns ordered like helpers.field_names
+
+
+def _text(cell: str) -> str:
+    """Text of a cell with tags removed, matching BeautifulSoup's get_text(strip=True) for simple cells"""
+    return html.unescape(TAG.sub("", cell)).strip()
+
+
+def extract_match_stats_tables(page: str) -> List[MatchStatsTable]:
+    """Find every "Match Statistics" table on a match page and extract it
+
+    Args:
+        page (str): Html of an afl tables match page
+
+    Returns:
+        List[MatchStatsTable]: One table per team, home team first
+    """
+    tables = []
+    for table in TABLE.findall(page):
+        header = HEADER.search(table)
+        if header and "Match Statistics" in _text(header.group(1)):
+            tables.append(extract_match_stats_table(table))
+
+    return tables
+
+
+def extract_match_stats_table(table: str) -> MatchStatsTable:
+    """Read a whole match statistics table into name and link columns and an integer matrix.
+    Every cell's text is collected in a single walk over the rows, then converted in one go.
+    Blank cells become 0.
+
+    Args:
+        table (str): Html of a "Match Statistics" table
+
+    Returns:
+        MatchStatsTable: Player names, profile links and the stat values of each player
+
+    Raises:
+        ValueError: If a stat cell is neither blank nor a whole number
+    """
+    display_names, player_links, raw_cells = [], [], []
+
+    for row in ROW.findall(table)[2:]: # skip header rows
+        cells = CELL.findall(row)
+        if len(cells) < FIRST_STAT_CELL + STAT_CELL_COUNT:
+            continue # skip malformed or empty rows
+
+        link = LINK.search(cells[1])
+        if link is None:
+            continue # totals and other summary rows don't link to a player
+
+        display_names.append(_text(cells[1]))
+        player_links.append(html.unescape(link.group(1)))
+        raw_cells.extend(cells[FIRST_STAT_CELL:FIRST_STAT_CELL + STAT_CELL_COUNT])
+
+    return MatchStatsTable(display_names, player_links, _to_int_matrix(raw_cells, display_names))
+
+
+def _to_int_matrix(raw_cells: List[str], display_names: List[str]) -> np.ndarray:
+    """Convert raw cell html to a (players, STAT_CELL_COUNT) int matrix, with 0 for blank cells"""
+    rows = len(display_names)
+    if rows == 0:
+        return np.zeros((0, STAT_CELL_COUNT), dtype=np.int64)
+
+    cells = np.char.strip(np.array(raw_cells, dtype=str).reshape(rows, STAT_CELL_COUNT))
+    numeric = np.char.isdigit(cells)
+
+    # cells wrapped in markup or entities are rare, only those get their text extracted
+    for index in zip(*np.nonzero(~numeric & (cells != ""))):
+        cells[index] = _text(cells[index])
+    numeric = np.char.isdigit(cells)
+
+    invalid = np.nonzero(~numeric & (cells != ""))
+    if invalid[0].size:
+        row, column = invalid[0][0], invalid[1][0]
+        raise ValueError(
+            f"{invalid[0].size} non numeric stat cells, the first is {field_names[column]} "
+            f"of {display_names[row]}: {str(cells[row, column])!r}"
+        )
+
+    values = np.zeros(cells.shape, dtype=np.int64)
+    values[numeric] = cells[numeric].astype(np.int64)
+
+    return values
@@ -1,4 +1,5 @@
-from typing import List
+import datetime
+from typing import Dict, List
 from dtos.games_dto import GameDTO
 from repositories.game_repository import GameRepository
 
@@ -7,8 +8,17 @@ class GameService():
     def __init__(self, repo: GameRepository):
         self.repo = repo
 
-    async def check_if_game_exists(self, date: str, home_team: str, away_team: str) -> bool:
+    async def check_if_game_exists(self, date: datetime.date, home_team: str, away_team: str) -> bool:
         return await self.repo.check_game_exists(date, home_team, away_team)
 
+    async def get_game_id(self, date: datetime.date, home_team: str, away_team: str) -> str | None:
+        return await self.repo.get_game_id(date, home_team, away_team)
+
+    async def get_content_hashes(self, year: int) -> Dict[str, str | None]:
+        return dict(await self.repo.get_content_hashes(year))
+
     async def insert_games(self, game_dtos: List[GameDTO]) -> None:
         await self.repo.insert_games(game_dtos)
+
+    async def set_content_hashes(self, game_dtos: List[GameDTO]) -> None:
+        await self.repo.set_content_hashes(game_dtos)
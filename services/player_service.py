@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 from dtos.player_profile_dto import PlayerProfileDTO
 from repositories.player_repository import PlayerRepository
 
@@ -10,8 +10,8 @@ class PlayerService():
     async def get_player_from_db(self, display_name: str, dob: str) -> bool:
         return await self.repo.check_player_exists(display_name, dob)
 
-    async def insert_players(self, player_dtos: List[PlayerProfileDTO]) -> None:
-        await self.repo.insert_players(player_dtos)
+    async def insert_players(self, player_dtos: List[PlayerProfileDTO]) -> Dict[str, str]:
+        return await self.repo.insert_players(player_dtos)
 
     def check_if_player_in_dto_set(self, display_name, dob, dtos: List[PlayerProfileDTO]) -> str | None:
         for dto in dtos:
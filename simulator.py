@@ -0,0 +1,356 @@
+"""Monte Carlo simulation of the rest of a season, its ladder and its finals.
+
+Each remaining fixture's margin is drawn from a normal distribution around the model's
+expected margin, and its total score from a normal around the league's average total,
+so every simulated game has a score and percentage can break ties on the ladder. All
+of it is vectorised over the simulation axis: a chunk of simulations is a matrix of
+fixture margins, and the ladder of every simulation comes from two matrix products
+with the fixtures' home and away team incidence matrices. Chunks can be spread over
+worker processes, each with its own random stream.
+
+Finals follow the AFL top eight system, with game margins drawn around the expected
+margin between the two teams.
+"""
+
+import csv
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from logger import logger
+from model import FEATURE_NAMES, Fixture, GameResult, as_date, build_features_and_state, fit_model
+
+MARGIN_SD = 36.0 # spread of afl margins around the expected margin
+TOTAL_MEAN = 165.0
+TOTAL_SD = 28.0
+
+# finals stage reached, in the order they are counted
+STAGES = ["finals", "semi_final", "preliminary_final", "grand_final", "premiers"]
+
+
+class SeasonState(NamedTuple):
+    teams: List[str]
+    points: np.ndarray # premiership points of each team from the games already played
+    points_for: np.ndarray
+    points_against: np.ndarray
+    wins: np.ndarray
+    fixture_home: np.ndarray # team index of the home team of each remaining fixture
+    fixture_away: np.ndarray
+    fixture_margin: np.ndarray # expected home margin of each remaining fixture
+    pair_margin: np.ndarray # (teams, teams) expected margin when the first team hosts the second, used for finals
+
+
+class SimulationResult(NamedTuple):
+    teams: List[str]
+    simulations: int
+    position_counts: np.ndarray # (teams, teams) times each team finished in each ladder position
+    stage_counts: np.ndarray # (teams, len(STAGES)) times each team reached each finals stage
+    total_wins: np.ndarray # summed over the simulations, for the expected number of wins
+    total_points: np.ndarray
+
+    def summary(self) -> List[Dict[str, float]]:
+        """Probabilities of each team, sorted by expected ladder position"""
+        probabilities = self.position_counts / self.simulations
+        expected_position = probabilities @ np.arange(1, len(self.teams) + 1)
+        rows = []
+        for team in np.argsort(expected_position):
+            row = {
+                "team": self.teams[team],
+                "expected_position": float(expected_position[team]),
+                "expected_wins": float(self.total_wins[team] / self.simulations),
+                "expected_points": float(self.total_points[team] / self.simulations),
+                "minor_premiers": float(probabilities[team, 0]),
+                "top_4": float(probabilities[team, :4].sum()),
+                "top_8": float(probabilities[team, :8].sum()),
+            }
+            row.update({stage: float(self.stage_counts[team, i] / self.simulations) for i, stage in enumerate(STAGES)})
+            rows.append(row)
+
+        return rows
+
+
+def margins_from_probabilities(win_probability: Sequence[float], margin_sd: float = MARGIN_SD) -> np.ndarray:
+    """Expected margins which give each win probability under the simulator's margin distribution"""
+    normal = NormalDist()
+    return np.array([
+        margin_sd * normal.inv_cdf(min(max(probability, 1e-6), 1 - 1e-6)) for probability in win_probability
+    ])
+
+
+def is_home_and_away(round_id: str) -> bool:
+    """Finals rounds (QF, EF, SF, PF, GF) aren't part of the ladder"""
+    return str(round_id).isdigit()
+
+
+def read_fixtures_csv(path: str) -> List[Fixture]:
+    """Read upcoming fixtures from a csv with Round, Date (YYYY-MM-DD, optional), HomeTeam and AwayTeam columns"""
+    with open(path, newline="", encoding="utf-8-sig") as fixtures_file:
+        return [
+            Fixture(
+                row["Round"],
+                datetime.date.fromisoformat(row["Date"]) if row.get("Date") else None,
+                row["HomeTeam"],
+                row["AwayTeam"],
+            )
+            for row in csv.DictReader(fixtures_file)
+        ]
+
+
+def split_season(games: Sequence[GameResult], year: int, after_round: int) -> Tuple[List[GameResult], List[Fixture]]:
+    """Replay a stored season from part way through: its home and away games after a round
+    become fixtures and everything else in the season is dropped
+
+    Args:
+        games (Sequence[GameResult]): Stored games up to and including the season
+        year (int): Season simulated
+        after_round (int): Last round treated as played
+
+    Returns:
+        Tuple[List[GameResult], List[Fixture]]: Games played so far and the fixtures left
+    """
+    history, fixtures = [], []
+    for game in games:
+        if game.year < year:
+            history.append(game)
+        elif game.year == year and is_home_and_away(game.round_id):
+            if int(game.round_id) <= after_round:
+                history.append(game)
+            else:
+                fixtures.append(Fixture(game.round_id, as_date(game.date), game.home_team, game.away_team))
+
+    return history, fixtures
+
+
+def build_season_state(
+        history: Sequence[GameResult],
+        year: int,
+        fixtures: Sequence[Fixture],
+        margin_sd: float = MARGIN_SD,
+        ridge: float = 1.0,
+) -> SeasonState:
+    """Ladder of a season so far plus the expected margin of each remaining fixture. The model
+    is trained on every game in history, and its win probabilities are turned into expected
+    margins so the simulated win rate of each game matches the model.
+
+    Args:
+        history (Sequence[GameResult]): Every game played so far, including earlier seasons
+        year (int): Season being simulated
+        fixtures (Sequence[Fixture]): Its home and away fixtures still to be played
+        margin_sd (float, optional): Spread of margins used by the simulation. Defaults to MARGIN_SD.
+        ridge (float, optional): L2 penalty of the model. Defaults to 1.0.
+
+    Returns:
+        SeasonState: Starting point of the simulations
+    """
+    game_features, feature_state = build_features_and_state(history)
+    model = fit_model(game_features.features, game_features.home_result, game_features.margin, ridge=ridge)
+    feature_state.start_season(year)
+
+    played = [game for game in game_features.games if game.year == year and is_home_and_away(game.round_id)]
+    teams = sorted(
+        {game.home_team for game in played} | {game.away_team for game in played}
+        | {fixture.home_team for fixture in fixtures} | {fixture.away_team for fixture in fixtures}
+    )
+    index = {team: i for i, team in enumerate(teams)}
+
+    points, points_for, points_against, wins = (np.zeros(len(teams)) for _ in range(4))
+    for game in played:
+        home, away = index[game.home_team], index[game.away_team]
+        points_for[home] += game.home_score
+        points_against[home] += game.away_score
+        points_for[away] += game.away_score
+        points_against[away] += game.home_score
+        if game.home_score == game.away_score:
+            points[home] += 2
+            points[away] += 2
+        else:
+            winner = home if game.home_score > game.away_score else away
+            points[winner] += 4
+            wins[winner] += 1
+
+    fixture_features = np.array([
+        feature_state.features(fixture.home_team, fixture.away_team, fixture.date) for fixture in fixtures
+    ]).reshape(len(fixtures), len(FEATURE_NAMES))
+    fixture_probability, _ = model.predict(fixture_features)
+
+    pair_features = np.array([feature_state.features(home, away) for home in teams for away in teams])
+    pair_probability, _ = model.predict(pair_features)
+
+    return SeasonState(
+        teams=teams,
+        points=points,
+        points_for=points_for,
+        points_against=points_against,
+        wins=wins,
+        fixture_home=np.array([index[fixture.home_team] for fixture in fixtures], dtype=np.int64),
+        fixture_away=np.array([index[fixture.away_team] for fixture in fixtures], dtype=np.int64),
+        fixture_margin=margins_from_probabilities(fixture_probability, margin_sd),
+        pair_margin=margins_from_probabilities(pair_probability, margin_sd).reshape(len(teams), len(teams)),
+    )
+
+
+def _finals_game(
+        home: np.ndarray,
+        away: np.ndarray,
+        pair_margin: np.ndarray,
+        rng: np.random.Generator,
+        margin_sd: float,
+        neutral: bool = False,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Play one final in every simulation. Finals can't be drawn, a level margin goes to the home team.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Winner and loser of each simulation
+    """
+    expected = pair_margin[home, away]
+    if neutral:
+        expected = (expected - pair_margin[away, home]) / 2
+    home_won = expected + rng.standard_normal(len(home)) * margin_sd >= 0
+    return np.where(home_won, home, away), np.where(home_won, away, home)
+
+
+def _simulate_finals(order: np.ndarray, pair_margin: np.ndarray, rng: np.random.Generator, margin_sd: float) -> List[np.ndarray]:
+    """Play the top eight finals series for every simulation
+
+    Args:
+        order (np.ndarray): (simulations, teams) team index of each ladder position
+
+    Returns:
+        List[np.ndarray]: Teams reaching each stage of STAGES, one (simulations, n) array per stage
+    """
+    seed = [order[:, position] for position in range(8)]
+    qualifying_1 = _finals_game(seed[0], seed[3], pair_margin, rng, margin_sd)
+    qualifying_2 = _finals_game(seed[1], seed[2], pair_margin, rng, margin_sd)
+    elimination_1 = _finals_game(seed[4], seed[7], pair_margin, rng, margin_sd)
+    elimination_2 = _finals_game(seed[5], seed[6], pair_margin, rng, margin_sd)
+    # qualifying final losers host the elimination final winners
+    semi_1 = _finals_game(qualifying_1[1], elimination_1[0], pair_margin, rng, margin_sd)
+    semi_2 = _finals_game(qualifying_2[1], elimination_2[0], pair_margin, rng, margin_sd)
+    preliminary_1 = _finals_game(qualifying_1[0], semi_2[0], pair_margin, rng, margin_sd)
+    preliminary_2 = _finals_game(qualifying_2[0], semi_1[0], pair_margin, rng, margin_sd)
+    grand_final = _finals_game(preliminary_1[0], preliminary_2[0], pair_margin, rng, margin_sd, neutral=True)
+
+    return [
+        order[:, :8],
+        np.column_stack([qualifying_1[1], qualifying_2[1], elimination_1[0], elimination_2[0]]),
+        np.column_stack([qualifying_1[0], qualifying_2[0], semi_1[0], semi_2[0]]),
+        np.column_stack([preliminary_1[0], preliminary_2[0]]),
+        grand_final[0][:, None],
+    ]
+
+
+def simulate_chunk(
+        state: SeasonState,
+        simulations: int,
+        seed: np.random.SeedSequence | int,
+        margin_sd: float = MARGIN_SD,
+        total_mean: float = TOTAL_MEAN,
+        total_sd: float = TOTAL_SD,
+) -> SimulationResult:
+    """Simulate the rest of the season a number of times
+
+    Args:
+        state (SeasonState): Ladder so far and the remaining fixtures
+        simulations (int): Number of simulations
+        seed (np.random.SeedSequence | int): Seed of this chunk's random stream
+
+    Returns:
+        SimulationResult: Counts over the simulations
+    """
+    rng = np.random.default_rng(seed)
+    team_count, fixture_count = len(state.teams), len(state.fixture_home)
+
+    # (fixtures, teams) incidence matrices, so per team totals are a matrix product
+    home = np.zeros((fixture_count, team_count))
+    home[np.arange(fixture_count), state.fixture_home] = 1
+    away = np.zeros((fixture_count, team_count))
+    away[np.arange(fixture_count), state.fixture_away] = 1
+
+    margin = state.fixture_margin + rng.standard_normal((simulations, fixture_count)) * margin_sd
+    total = np.maximum(rng.normal(total_mean, total_sd, (simulations, fixture_count)), np.abs(margin))
+    home_score = np.rint((total + margin) / 2)
+    away_score = np.rint((total - margin) / 2)
+
+    home_points = np.where(home_score > away_score, 4.0, np.where(home_score == away_score, 2.0, 0.0))
+    away_points = 4.0 - home_points
+    points = state.points + home_points @ home + away_points @ away
+    wins = state.wins + (home_points == 4) @ home + (away_points == 4) @ away
+    points_for = state.points_for + home_score @ home + away_score @ away
+    points_against = state.points_against + away_score @ home + home_score @ away
+
+    # ladder order is premiership points, then percentage
+    percentage = 100 * points_for / np.maximum(points_against, 1)
+    order = np.lexsort((-percentage, -points), axis=1)
+
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.arange(team_count)[None, :], axis=1)
+    position_counts = np.bincount(
+        (np.arange(team_count)[None, :] * team_count + positions).ravel(), minlength=team_count * team_count
+    ).reshape(team_count, team_count)
+
+    stage_counts = np.zeros((team_count, len(STAGES)), dtype=np.int64)
+    if team_count >= 8:
+        for stage, reached in enumerate(_simulate_finals(order, state.pair_margin, rng, margin_sd)):
+            stage_counts[:, stage] = np.bincount(reached.ravel(), minlength=team_count)
+
+    return SimulationResult(
+        state.teams, simulations, position_counts, stage_counts, wins.sum(axis=0), points.sum(axis=0)
+    )
+
+
+def _combine(results: Sequence[SimulationResult]) -> SimulationResult:
+    first = results[0]
+    return SimulationResult(
+        first.teams,
+        sum(result.simulations for result in results),
+        sum(result.position_counts for result in results),
+        sum(result.stage_counts for result in results),
+        sum(result.total_wins for result in results),
+        sum(result.total_points for result in results),
+    )
+
+
+def simulate_season(
+        state: SeasonState,
+        simulations: int = 100_000,
+        workers: Optional[int] = 1,
+        chunk_size: int = 20_000,
+        seed: Optional[int] = None,
+        margin_sd: float = MARGIN_SD,
+) -> SimulationResult:
+    """Simulate the rest of a season in chunks, spread over worker processes
+
+    Args:
+        state (SeasonState): Ladder so far and the remaining fixtures
+        simulations (int, optional): Number of simulations. Defaults to 100_000.
+        workers (Optional[int], optional): Worker processes, None for one per core. Defaults to 1.
+        chunk_size (int, optional): Simulations vectorised at once. Defaults to 20_000.
+        seed (Optional[int], optional): Seed for reproducible results. Defaults to None.
+        margin_sd (float, optional): Spread of margins around the expected margin. Defaults to MARGIN_SD.
+
+    Returns:
+        SimulationResult: Counts over every simulation
+    """
+    start_time = time.perf_counter()
+    sizes = [min(chunk_size, simulations - start) for start in range(0, simulations, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes)) # independent streams, however the chunks are spread
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sizes)))
+
+    if workers == 1:
+        results = [simulate_chunk(state, size, chunk_seed, margin_sd) for size, chunk_seed in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                simulate_chunk, [state] * len(sizes), sizes, seeds, [margin_sd] * len(sizes)
+            ))
+
+    logger.info(
+        f"Simulated {len(state.fixture_home)} fixtures {simulations} times with {workers} workers "
+        f"in {time.perf_counter() - start_time:.2f} seconds"
+    )
+    return _combine(results)
@@ -0,0 +1,110 @@
+"""Coalesce concurrent requests for the same resource.
+
+The match tasks of a season run concurrently, and many of them ask for the same page
+at the same moment: a player's profile is linked from every match they played, and
+each match page is read once for the score and again for the stats. ``SingleFlight``
+gives every caller asking for a key the same in-flight task, so the resource is
+fetched once, and keeps finished results in a bounded memo until they expire.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from logger import logger
+
+
+class SingleFlight():
+    def __init__(
+        self,
+        name: str,
+        ttl: Optional[float] = 300,
+        max_entries: Optional[int] = 1024,
+        should_cache: Optional[Callable[[Any], bool]] = None,
+    ):
+        """Share one in-flight call per key between every task which asks for it
+
+        Args:
+            name (str): Name used in the log
+            ttl (Optional[float], optional): Seconds a result is memoised for, None to keep it
+            until evicted. Defaults to 300.
+            max_entries (Optional[int], optional): Results memoised at once, the least recently
+            used are evicted first. None for no limit. Defaults to 1024.
+            should_cache (Optional[Callable[[Any], bool]], optional): Decides whether a result is
+            memoised, e.g. to skip failed responses. Defaults to memoising every result.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.should_cache = should_cache
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._memo: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self.calls = 0
+        self.memo_hits = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, function: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Return the result for key, awaiting function(*args, **kwargs) only if no other task
+        is already running it and no memoised result is still fresh.
+        Exceptions are raised to every waiting task and never memoised.
+
+        Args:
+            key (Hashable): Identity of the resource, e.g. its url
+            function (Callable[..., Awaitable[Any]]): Coroutine function which fetches the resource
+
+        Returns:
+            Any: Result of the call
+        """
+        memoised = self._memo.get(key)
+        if memoised is not None:
+            expires_at, result = memoised
+            if expires_at > time.monotonic():
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return result
+            del self._memo[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(function(*args, **kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+
+        # a waiter being cancelled mustn't cancel the call the other waiters share
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        result = task.result()
+        if self.should_cache is not None and not self.should_cache(result):
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        self._memo[key] = (expires_at, result)
+        self._memo.move_to_end(key)
+        if self.max_entries is not None:
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._memo or key in self._in_flight
+
+    def __len__(self) -> int:
+        return len(self._memo)
+
+    def clear(self) -> None:
+        self._memo.clear()
+
+    def log_summary(self) -> None:
+        logger.info(
+            f"{self.name}: {self.calls} fetched, {self.coalesced} joined an in-flight fetch, "
+            f"{self.memo_hits} served from the memo"
+        )
@@ -0,0 +1,313 @@
+"""Storage sinks the repositories read from and write to.
+
+``PostgresSink`` is the production database. ``SQLiteSink`` stores the same tables in
+a local SQLite file (or in memory) so the pipeline can be run, profiled and load
+tested without a live database. Repository queries are written with asyncpg's
+numbered ``$1`` placeholders, which the SQLite sink rewrites to ``?1``.
+"""
+
+import asyncio
+import datetime
+import re
+import sqlite3
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+import asyncpg
+
+from database import AsyncDatabaseConnection
+from logger import logger
+
+# store dates and times as ISO strings, the default adapters are deprecated
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+sqlite3.register_adapter(datetime.time, datetime.time.isoformat)
+
+Statement = Tuple[str, Tuple[Any, ...]]
+
+
+class StorageSink(ABC):
+    @abstractmethod
+    async def fetch_one(self, query: str, params: Tuple[Any, ...] = ()):
+        """Return the first row of a query, or None"""
+
+    @abstractmethod
+    async def fetch_all(self, query: str, params: Tuple[Any, ...] = ()) -> List[Any]:
+        """Return every row of a query"""
+
+    @abstractmethod
+    def fetch_chunks(self, query: str, params: Tuple[Any, ...] = (), chunk_size: int = 10_000) -> AsyncIterator[List[Any]]:
+        """Stream the rows of a query through a cursor, chunk_size rows at a time"""
+
+    @abstractmethod
+    async def execute(self, query: str, params: Tuple[Any, ...] = ()) -> Any:
+        """Execute a single statement"""
+
+    @abstractmethod
+    async def execute_batch(self, query: str, params: List[Tuple[Any, ...]]) -> Any:
+        """Execute a statement once for every set of parameters, in one transaction"""
+
+    @abstractmethod
+    async def execute_transaction(self, statements: List[Statement]) -> None:
+        """Execute several statements atomically"""
+
+    async def close(self) -> None:
+        pass
+
+
+class PostgresSink(StorageSink):
+    def __init__(self, db_manager: AsyncDatabaseConnection):
+        self.db_manager = db_manager
+
+    async def fetch_one(self, query: str, params: Tuple[Any, ...] = ()):
+        try:
+            async with self.db_manager.connection_from_pool() as conn:
+                return await conn.fetchrow(query, *params)
+        except (Exception, asyncpg.InterfaceError) as e:
+            logger.error(f"Failed to retrieve row: {e}")
+            raise
+
+    async def fetch_all(self, query: str, params: Tuple[Any, ...] = ()) -> List[Any]:
+        try:
+            async with self.db_manager.connection_from_pool() as conn:
+                return await conn.fetch(query, *params)
+        except (Exception, asyncpg.InterfaceError) as e:
+            logger.error(f"Failed to retrieve rows: {e}")
+            raise
+
+    async def fetch_chunks(self, query: str, params: Tuple[Any, ...] = (), chunk_size: int = 10_000) -> AsyncIterator[List[Any]]:
+        try:
+            async with self.db_manager.connection_from_pool() as conn:
+                # server side cursors only live inside a transaction
+                async with conn.transaction():
+                    cursor = await conn.cursor(query, *params)
+                    while rows := await cursor.fetch(chunk_size):
+                        yield rows
+        except (Exception, asyncpg.InterfaceError) as e:
+            logger.error(f"Failed to stream rows: {e}")
+            raise
+
+    async def execute(self, query: str, params: Tuple[Any, ...] = ()) -> Any:
+        try:
+            async with self.db_manager.connection_from_pool() as conn:
+                return await conn.execute(query, *params)
+        except (Exception, asyncpg.InterfaceError) as e:
+            logger.error(f"Failed to execute query: {e}")
+            raise
+
+    async def execute_batch(self, query: str, params: List[Tuple[Any, ...]]) -> Any:
+        try:
+            async with self.db_manager.connection_from_pool() as conn:
+                return await conn.executemany(query, params)
+        except (Exception, asyncpg.InterfaceError) as e:
+            logger.error(f"Failed to execute batch: {e}")
+            raise
+
+    async def execute_transaction(self, statements: List[Statement]) -> None:
+        try:
+            async with self.db_manager.connection_from_pool() as conn:
+                async with conn.transaction():
+                    for query, params in statements:
+                        await conn.execute(query, *params)
+        except (Exception, asyncpg.InterfaceError) as e:
+            logger.error(f"Failed to execute transaction: {e}")
+            raise
+
+    async def close(self) -> None:
+        await self.db_manager.close_all()
+
+
+PLACEHOLDER = re.compile(r"\$(\d+)")
+
+
+class SQLiteSink(StorageSink):
+    def __init__(self, path: str = ":memory:", create_schema: bool = True):
+        """Local SQLite store. Every call runs on a single worker thread which owns the
+        connection, so the event loop is never blocked by a write.
+
+        Args:
+            path (str, optional): Database file, or ":memory:". Defaults to ":memory:".
+            create_schema (bool, optional): Create the tables if they don't exist. Defaults to True.
+        """
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-sink")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._create_schema = create_schema
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # autocommit mode, transactions are opened explicitly around every write
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            if self._create_schema:
+                self._conn.executescript(";\n".join(sqlite_schema()))
+            logger.info(f"SQLite sink opened at {self.path}")
+
+        return self._conn
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    @staticmethod
+    def _translate(query: str) -> str:
+        return PLACEHOLDER.sub(r"?\1", query)
+
+    def _fetch_one(self, query: str, params: Tuple[Any, ...]):
+        return self._connect().execute(self._translate(query), params).fetchone()
+
+    def _fetch_all(self, query: str, params: Tuple[Any, ...]) -> List[Any]:
+        return self._connect().execute(self._translate(query), params).fetchall()
+
+    def _open_cursor(self, query: str, params: Tuple[Any, ...]) -> sqlite3.Cursor:
+        cursor = self._connect().cursor()
+        cursor.row_factory = None # plain tuples, a Row per row isn't needed to copy values out
+        return cursor.execute(self._translate(query), params)
+
+    def _execute(self, query: str, params: Tuple[Any, ...]) -> int:
+        return self._connect().execute(self._translate(query), params).rowcount
+
+    def _execute_batch(self, query: str, params: List[Tuple[Any, ...]]) -> int:
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            rowcount = conn.executemany(self._translate(query), params).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return rowcount
+
+    def _execute_transaction(self, statements: List[Statement]) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            for query, params in statements:
+                conn.execute(self._translate(query), params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def fetch_one(self, query: str, params: Tuple[Any, ...] = ()):
+        try:
+            return await self._run(self._fetch_one, query, params)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to retrieve row: {e}")
+            raise
+
+    async def fetch_all(self, query: str, params: Tuple[Any, ...] = ()) -> List[Any]:
+        try:
+            return await self._run(self._fetch_all, query, params)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to retrieve rows: {e}")
+            raise
+
+    async def fetch_chunks(self, query: str, params: Tuple[Any, ...] = (), chunk_size: int = 10_000) -> AsyncIterator[List[Any]]:
+        try:
+            cursor = await self._run(self._open_cursor, query, params)
+            try:
+                while rows := await self._run(cursor.fetchmany, chunk_size):
+                    yield rows
+            finally:
+                await self._run(cursor.close)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to stream rows: {e}")
+            raise
+
+    async def execute(self, query: str, params: Tuple[Any, ...] = ()) -> int:
+        try:
+            return await self._run(self._execute, query, params)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to execute query: {e}")
+            raise
+
+    async def execute_batch(self, query: str, params: List[Tuple[Any, ...]]) -> int:
+        try:
+            return await self._run(self._execute_batch, query, params)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to execute batch: {e}")
+            raise
+
+    async def execute_transaction(self, statements: List[Statement]) -> None:
+        try:
+            await self._run(self._execute_transaction, statements)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to execute transaction: {e}")
+            raise
+
+    async def close(self) -> None:
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        await self._run(_close)
+        self._executor.shutdown(wait=True)
+
+
+SQLITE_TYPES = {int: "INTEGER", float: "REAL", str: "TEXT", datetime.date: "TEXT", datetime.time: "TEXT"}
+
+
+def _sqlite_table(table: str, model, primary_key: List[str]) -> str:
+    columns = []
+    for field in model.model_fields.values():
+        not_null = "" if field.default is None else " NOT NULL"
+        columns.append(f"{field.alias} {SQLITE_TYPES.get(field.annotation, 'TEXT')}{not_null}")
+
+    return f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)}, PRIMARY KEY ({', '.join(primary_key)}))"
+
+
+def sqlite_schema() -> List[str]:
+    """Statements which create the current schema in SQLite. The columns come from the
+    DTOs, so the tables always match what the repositories insert.
+    """
+    # imported here because the repositories import this module
+    from dtos.games_dto import GameDTO
+    from dtos.player_profile_dto import PlayerProfileDTO
+    from dtos.stats_dto import PlayerMatchStatsDTO
+    from repositories.aggregate_repository import AGGREGATES, STAT_COLUMNS
+
+    statements = [
+        _sqlite_table("games", GameDTO, ["GameId"]),
+        _sqlite_table("players", PlayerProfileDTO, ["PlayerId"]),
+        _sqlite_table("stats", PlayerMatchStatsDTO, ["GameId", "PlayerId"]),
+        "CREATE UNIQUE INDEX IF NOT EXISTS games_date_teams_idx ON games (Date, HomeTeam, AwayTeam)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS players_name_dob_idx ON players (lower(DisplayName), Dob)",
+        "CREATE INDEX IF NOT EXISTS games_year_idx ON games (Year)",
+        "CREATE INDEX IF NOT EXISTS stats_player_year_idx ON stats (PlayerId, Year)",
+        "CREATE INDEX IF NOT EXISTS stats_team_year_round_idx ON stats (Team, Year, Round)",
+    ]
+    for table, (keys, _) in AGGREGATES.items():
+        stat_columns = ", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in STAT_COLUMNS)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(keys)}, Games INTEGER NOT NULL DEFAULT 0, "
+            f"{stat_columns}, PRIMARY KEY ({', '.join(keys)}))"
+        )
+
+    return statements
+
+
+def create_sink(url: str = "postgres") -> StorageSink:
+    """Create a sink from a short url
+
+    Args:
+        url (str, optional): "postgres", "memory" or "sqlite:<path>". Defaults to "postgres".
+
+    Raises:
+        ValueError: Unknown sink url
+
+    Returns:
+        StorageSink: The sink
+    """
+    if url == "postgres":
+        return PostgresSink(AsyncDatabaseConnection())
+    if url == "memory":
+        return SQLiteSink(":memory:")
+    if url.startswith("sqlite:"):
+        return SQLiteSink(url[len("sqlite:"):])
+
+    raise ValueError(f"Unknown sink {url}, use postgres, memory or sqlite:<path>")
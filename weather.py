@@ -0,0 +1,264 @@
+"""Fill the weather fields of games from a local daily weather dataset.
+
+The dataset is a csv of daily station observations with the columns::
+
+    station_id,latitude,longitude,date,max_temp,min_temp,rainfall
+
+Dates are YYYY-MM-DD and missing readings are left blank. Each venue is matched to
+its nearest stations, and a whole batch of games is joined against the observations
+with a single sorted search rather than one lookup per game.
+"""
+
+import csv
+import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dtos.games_dto import GameDTO
+from logger import logger
+from repositories.game_repository import GameRepository
+
+# approximate location of each venue as it is named on afl tables
+VENUE_COORDINATES: Dict[str, Tuple[float, float]] = {
+    "M.C.G.": (-37.8200, 144.9834),
+    "Docklands": (-37.8165, 144.9475),
+    "Princes Park": (-37.7840, 144.9616),
+    "Waverley Park": (-37.9253, 145.1928),
+    "Windy Hill": (-37.7496, 144.9227),
+    "Victoria Park": (-37.7895, 145.0010),
+    "Junction Oval": (-37.8580, 144.9770),
+    "Western Oval": (-37.8010, 144.8830),
+    "Glenferrie Oval": (-37.8200, 145.0350),
+    "Lake Oval": (-37.8400, 144.9600),
+    "Moorabbin Oval": (-37.9370, 145.0500),
+    "Arden St": (-37.7990, 144.9400),
+    "Punt Rd": (-37.8230, 144.9840),
+    "Brunswick St": (-37.7890, 144.9790),
+    "Kardinia Park": (-38.1579, 144.3546),
+    "Corio Oval": (-38.1470, 144.3600),
+    "Eureka Stadium": (-37.5392, 143.8483),
+    "Adelaide Oval": (-34.9156, 138.5961),
+    "Football Park": (-34.8799, 138.4960),
+    "Norwood Oval": (-34.9206, 138.6316),
+    "Summit Sports Park": (-35.0720, 138.8600),
+    "Perth Stadium": (-31.9512, 115.8891),
+    "Subiaco": (-31.9444, 115.8300),
+    "Gabba": (-27.4858, 153.0381),
+    "Carrara": (-28.0063, 153.3667),
+    "Cazaly's Stadium": (-16.9353, 145.7492),
+    "Riverway Stadium": (-19.3190, 146.7320),
+    "S.C.G.": (-33.8917, 151.2247),
+    "Stadium Australia": (-33.8470, 151.0634),
+    "Sydney Showground": (-33.8473, 151.0677),
+    "Blacktown": (-33.7690, 150.8580),
+    "Manuka Oval": (-35.3182, 149.1346),
+    "York Park": (-41.4255, 147.1389),
+    "Bellerive Oval": (-42.8770, 147.3736),
+    "Marrara Oval": (-12.3990, 130.8874),
+    "Traeger Park": (-23.7089, 133.8750),
+    "Wellington": (-41.2729, 174.7859),
+    "Jiangwan Stadium": (31.3040, 121.5100),
+}
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def _haversine_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _float_or_nan(value: str) -> float:
+    return float(value) if value.strip() else np.nan
+
+
+class WeatherIndex():
+    # keys combine the station and the day, days either side of 1970 fit comfortably under this
+    DAYS = 1_000_000
+
+    def __init__(
+        self,
+        station_ids: np.ndarray,
+        station_coordinates: np.ndarray,
+        keys: np.ndarray,
+        observations: np.ndarray,
+        fallback_stations: int = 3,
+    ):
+        """Daily observations indexed by station and date
+
+        Args:
+            station_ids (np.ndarray): Id of each station
+            station_coordinates (np.ndarray): Latitude and longitude of each station, shape (stations, 2)
+            keys (np.ndarray): Sorted station index * DAYS + days since epoch of each observation
+            observations (np.ndarray): max_temp, min_temp, rainfall for each key, shape (observations, 3)
+            fallback_stations (int, optional): Nearby stations tried when the nearest has no reading. Defaults to 3.
+        """
+        self.station_ids = station_ids
+        self.station_coordinates = station_coordinates
+        self.keys = keys
+        self.observations = observations
+        self.fallback_stations = min(fallback_stations, len(station_ids))
+        self._venue_stations: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_csv(cls, path: str, **kwargs) -> "WeatherIndex":
+        """Load the weather dataset and build the station + date index
+
+        Args:
+            path (str): Path of the csv file
+
+        Returns:
+            WeatherIndex: The index
+        """
+        station_lookup: Dict[str, int] = {}
+        coordinates: List[Tuple[float, float]] = []
+        station_index, days, values = [], [], []
+
+        with open(path, newline="") as weather_file:
+            for row in csv.DictReader(weather_file):
+                station = row["station_id"]
+                if station not in station_lookup:
+                    station_lookup[station] = len(coordinates)
+                    coordinates.append((float(row["latitude"]), float(row["longitude"])))
+
+                station_index.append(station_lookup[station])
+                days.append(row["date"])
+                values.append((
+                    _float_or_nan(row["max_temp"]),
+                    _float_or_nan(row["min_temp"]),
+                    _float_or_nan(row["rainfall"]),
+                ))
+
+        keys = np.array(station_index, dtype=np.int64) * cls.DAYS + np.array(days, dtype="datetime64[D]").astype(np.int64)
+        order = np.argsort(keys, kind="stable")
+        logger.info(f"Loaded {len(keys)} weather observations from {len(coordinates)} stations")
+
+        return cls(
+            station_ids=np.array(list(station_lookup)),
+            station_coordinates=np.array(coordinates, dtype=np.float64).reshape(-1, 2),
+            keys=keys[order],
+            observations=np.array(values, dtype=np.float64).reshape(-1, 3)[order],
+            **kwargs
+        )
+
+    def nearest_stations(self, venue: str) -> Optional[np.ndarray]:
+        """Indexes of the stations closest to a venue, nearest first
+
+        Args:
+            venue (str): Venue as named on afl tables
+
+        Returns:
+            Optional[np.ndarray]: Station indexes, or None if the venue's location is unknown
+        """
+        if venue not in self._venue_stations:
+            coordinates = VENUE_COORDINATES.get(venue)
+            if coordinates is None:
+                logger.warning(f"No coordinates for {venue}, weather won't be filled in")
+                self._venue_stations[venue] = None
+            else:
+                distances = _haversine_km(
+                    coordinates[0], coordinates[1],
+                    self.station_coordinates[:, 0], self.station_coordinates[:, 1]
+                )
+                self._venue_stations[venue] = np.argsort(distances)[:self.fallback_stations]
+
+        return self._venue_stations[venue]
+
+    def lookup(self, venues: Sequence[str], dates: Sequence[datetime.date | str]) -> np.ndarray:
+        """Weather for each venue and date. The nearest station with a reading is used,
+        falling back to the next nearest stations for readings which are missing.
+
+        Args:
+            venues (Sequence[str]): Venue of each game
+            dates (Sequence[datetime.date | str]): Date of each game
+
+        Returns:
+            np.ndarray: max_temp, min_temp and rainfall of each game, NaN where unknown. Shape (games, 3)
+        """
+        result = np.full((len(venues), 3), np.nan)
+        if len(venues) == 0 or len(self.keys) == 0:
+            return result
+
+        day_numbers = np.array([str(date) for date in dates], dtype="datetime64[D]").astype(np.int64)
+        # (games, fallback_stations) station indexes, -1 for unknown venues
+        stations = np.full((len(venues), self.fallback_stations), -1, dtype=np.int64)
+        for i, venue in enumerate(venues):
+            nearest = self.nearest_stations(venue)
+            if nearest is not None:
+                stations[i, :len(nearest)] = nearest
+
+        for rank in range(self.fallback_stations):
+            wanted = stations[:, rank] * self.DAYS + day_numbers
+            positions = np.searchsorted(self.keys, wanted).clip(max=len(self.keys) - 1)
+            found = (self.keys[positions] == wanted) & (stations[:, rank] >= 0)
+
+            candidate = np.where(found[:, None], self.observations[positions], np.nan)
+            result = np.where(np.isnan(result), candidate, result)
+            if not np.isnan(result).any():
+                break
+
+        return result
+
+
+def _none_if_nan(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def enrich_games(game_dtos: Iterable[GameDTO], weather_index: WeatherIndex) -> List[GameDTO]:
+    """Fill max_temp, min_temp and rainfall for a batch of games
+
+    Args:
+        game_dtos (Iterable[GameDTO]): Games to enrich
+        weather_index (WeatherIndex): Weather observations
+
+    Returns:
+        List[GameDTO]: Copies of the games with the weather fields filled in where known
+    """
+    game_dtos = list(game_dtos)
+    weather = weather_index.lookup([dto.venue for dto in game_dtos], [dto.date for dto in game_dtos])
+
+    return [
+        dto.model_copy(update={
+            "max_temp": _none_if_nan(max_temp),
+            "min_temp": _none_if_nan(min_temp),
+            "rainfall": _none_if_nan(rainfall),
+        })
+        for dto, (max_temp, min_temp, rainfall) in zip(game_dtos, weather)
+    ]
+
+
+async def backfill_weather(
+        game_repository: GameRepository,
+        weather_index: WeatherIndex,
+        year: Optional[int] = None,
+        chunk_size: int = 5000,
+) -> int:
+    """Fill the weather of games already in the db which don't have any
+
+    Args:
+        game_repository (GameRepository): Repository the games are read from and updated through
+        weather_index (WeatherIndex): Weather observations
+        year (Optional[int], optional): Only fill games from this season. Defaults to None.
+        chunk_size (int, optional): Number of games updated at a time. Defaults to 5000.
+
+    Returns:
+        int: Number of games which had weather filled in
+    """
+    rows = await game_repository.get_games_missing_weather(year)
+    filled = 0
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        weather = weather_index.lookup([row[1] for row in chunk], [row[2] for row in chunk])
+        known = ~np.isnan(weather).all(axis=1)
+
+        await game_repository.update_weather([
+            (row[0], *(_none_if_nan(value) for value in values))
+            for row, values, has_weather in zip(chunk, weather, known) if has_weather
+        ])
+        filled += int(known.sum())
+
+    logger.info(f"Filled weather for {filled} of {len(rows)} games")
+    return filled